@@ -1,5 +1,6 @@
-from typing import Tuple, Mapping, Any, Union
+from typing import Tuple, Mapping, Any, Union, Optional
 
+import aiohttp
 import aiohttp_client_cache
 from marshmallow import ValidationError
 from marshmallow.base import SchemaABC
@@ -99,9 +100,23 @@ class DnD5e:
     _endpoints: Mapping[str, str]
     _resource_cache: Mapping[str, Mapping[str, dict[str, Tuple[APIReference, str]]]]
 
-    def __init__(self):
+    def __init__(
+            self,
+            connector: Optional[aiohttp.BaseConnector] = None,
+            connector_owner: bool = True,
+            trace_configs: Optional[list[aiohttp.TraceConfig]] = None
+    ):
         self.cache = aiohttp_client_cache.SQLiteBackend(cache_name="./cache/dnd_cache.sqlite", expire_after=86400)
-        self.session = aiohttp_client_cache.CachedSession(base_url=BASE_URL, cache=self.cache)
+        self.session = aiohttp_client_cache.CachedSession(
+            base_url=BASE_URL,
+            cache=self.cache,
+            connector=connector,
+            connector_owner=connector_owner,
+            trace_configs=trace_configs
+        )
+
+    async def close(self) -> None:
+        await self.session.close()
 
     @async_cached_property
     async def endpoints(self) -> Mapping[str, str]:
@@ -13,7 +13,7 @@ GITHUB_BASE = f"https://github.com/{GITHUB_USER}/{PROJECT_NAME}"
 
 
 class AdminCog(Cog, name='admin'):
-    slash_commands = ['help', 'sync', 'source']
+    slash_commands = ['help', 'sync', 'source', 'httpstats']
 
     @decorators.command(
         name='help',
@@ -111,6 +111,32 @@ class AdminCog(Cog, name='admin'):
         await self.bot.tree.sync(guild=self.bot.GUILD)
         self.bot.log('Synced commands to Discord.', log_type=LogType.warning)
 
+    @app_commands.command(name='httpstats',
+                          description='\N{Bar Chart} Shows connection reuse and latency for outbound HTTP requests.')
+    @checks.is_owner()
+    async def http_stats_command(self, interaction: Interaction) -> None:
+        stats = sorted(self.bot.http_clients.stats.items(), key=lambda e: e[1].requests, reverse=True)
+        if not stats:
+            emb = self.bot.embeds.get(description='No outbound HTTP requests have been made yet.')
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        emb = self.bot.embeds.get(
+            title='Outbound HTTP Stats',
+            fields=[
+                {
+                    "name": host,
+                    "value": f'`Requests`: `{s.requests}` (`{s.errors}` errors)\n'
+                             f'`Connections`: `{s.connections_created}` new, `{s.connections_reused}` reused '
+                             f'(`{s.reuse_rate:.0%}`)\n'
+                             f'`Latency`: `{s.average_latency * 1000:.0f} ms` avg, `{s.max_latency * 1000:.0f} ms` max',
+                    "inline": False
+                }
+                for host, s in stats[:25]
+            ]
+        )
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
     @sync_commands.error
     async def sync_error(self, interaction: Interaction, error: app_commands.AppCommandError) -> None:
         if isinstance(error, app_commands.CommandInvokeError):
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Union, cast, Tuple, Mapping
 
 import aiohttp
@@ -8,27 +9,36 @@ import yaml
 from apis.dnd5e.models.general import APIReference
 from templates import GroupCog, Interaction, Bot
 from templates.errors import SchemaError
-from templates.types import DiceRoll
+from templates.types import DiceRoll, RollStream, get_dice_distribution
 from templates.views import DiceRollMenu, DiceRollPage
 from templates import decorators, transformers, checks
 from utils import EmbedFactory, Menu, MenuPageList
-from utils.images import get_roll_text
+from utils.images import get_roll_text, get_roll_histogram
 from apis.dnd5e import DnD5e
 from apis.dnd5e.models import APIReferenceList, ResourceModel
 
+# The most dice a single batch roll may throw in total, across every roll and repetition.
+BATCH_ROLL_MAX_DICE = 10_000
+# Discord's limits on the length of an embed's title and description.
+EMBED_TITLE_LIMIT = 256
+EMBED_DESCRIPTION_LIMIT = 4096
+
 
 class DnDCog(GroupCog, group_name="dnd", name="dungeons&dragons"):
     description = "Commands related to Dungeons & Dragons."
     icon = "\N{DRAGON}"
-    slash_commands = ['roll', 'lookup', 'apilookup', 'walkapi']
+    slash_commands = ['roll', 'batchroll', 'odds', 'replay', 'lookup', 'apilookup', 'walkapi']
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-        self.bot.dnd_client = DnD5e()
+        self.bot.dnd_client = DnD5e(**self.bot.http_clients.session_kwargs())
         self.embeds: EmbedFactory = self.bot.embeds.copy()
         self.embeds.update(footer=f"Data from dnd5eapi.co")
 
+        # Roll streams are kept per guild, or per user for rolls outside of a guild.
+        self.roll_streams: dict[int, RollStream] = {}
+
     async def cog_load(self) -> None:
         self.bot.log('Loading DnD API client resource cache...')
         await self.bot.dnd_client.resource_cache
@@ -36,6 +46,18 @@ class DnDCog(GroupCog, group_name="dnd", name="dungeons&dragons"):
 
         await super().cog_load()
 
+    async def cog_unload(self) -> None:
+        await self.bot.dnd_client.close()
+
+        await super().cog_unload()
+
+    def get_roll_stream(self, interaction: Interaction) -> RollStream:
+        key = interaction.guild_id or interaction.user.id
+        stream = self.roll_streams.get(key)
+        if not stream:
+            stream = self.roll_streams[key] = RollStream()
+        return stream
+
     @decorators.command(
         name="roll",
         description="Rolls dice using D&D standards.",
@@ -54,21 +76,213 @@ class DnDCog(GroupCog, group_name="dnd", name="dungeons&dragons"):
             to: discord.User = None,
     ) -> None:
         rolls: Union[DiceRoll, list[DiceRoll]] = cast(Union[DiceRoll, list[DiceRoll]], rolls)
-        if isinstance(rolls, list):
-            for r in rolls:
-                r.roll()
-        else:
-            rolls.roll()
+        if not isinstance(rolls, list):
             rolls = [rolls]
 
+        stream = self.get_roll_stream(interaction)
+        offset, rng = stream.next()
+        for r in rolls:
+            r.roll(rng)
+
+        await self.bot.db.roll_logs.log(
+            interaction.guild_id, interaction.user.id, DiceRoll.normalize_query(rolls),
+            stream.seed, offset, [r.value for r in rolls]
+        )
+        reference = RollStream.reference(stream.seed, offset)
+
         if to:
             private = True
-            menu = DiceRollMenu(DiceRollPage(rolls, self.bot.embeds), interaction)
+            menu = DiceRollMenu(DiceRollPage(rolls, self.bot.embeds, reference), interaction)
             await menu.send(to, f"{interaction.user.mention} Rolled")
 
-        menu = DiceRollMenu(DiceRollPage(rolls, self.bot.embeds), interaction, private)
+        menu = DiceRollMenu(DiceRollPage(rolls, self.bot.embeds, reference), interaction, private)
         await menu.start()
 
+    @decorators.command(
+        name="batchroll",
+        description="Rolls the same dice many times at once.",
+        help="Useful for rolling initiative or attacks for a large group. Results are shown as a single table.",
+        icon="\N{GAME DIE}"
+    )
+    @app_commands.describe(
+        rolls="The rolls that are thrown each time. More than one roll can be combined. Example: `1d20 +2`",
+        count="The number of times to roll.",
+        histogram="Whether or not to include a chart of the results.",
+        private="Whether or not the rolls will be visible to other people.",
+    )
+    async def dnd_batch_roll_command(
+            self,
+            interaction: Interaction,
+            rolls: app_commands.Transform[Union[DiceRoll, list[DiceRoll]], transformers.DiceRollTransformer],
+            count: app_commands.Range[int, 1, 200],
+            histogram: bool = False,
+            private: bool = False,
+    ) -> None:
+        rolls: Union[DiceRoll, list[DiceRoll]] = cast(Union[DiceRoll, list[DiceRoll]], rolls)
+        if not isinstance(rolls, list):
+            rolls = [rolls]
+
+        dice = count * sum(r.num_dice for r in rolls)
+        if dice > BATCH_ROLL_MAX_DICE:
+            emb = self.bot.embeds.get(
+                description=f"That would roll `{dice}` dice, but at most `{BATCH_ROLL_MAX_DICE}` can be rolled at once.",
+                color=discord.Color.orange()
+            )
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        stream = self.get_roll_stream(interaction)
+        offset, rng = stream.next()
+        totals = [0] * count
+        for roll in rolls:
+            totals = [a + b for a, b in zip(totals, roll.roll_many(count, rng))]
+
+        query = DiceRoll.normalize_query(rolls)
+        await self.bot.db.roll_logs.log(
+            interaction.guild_id, interaction.user.id, query, stream.seed, offset, totals, count=count, mode='batch'
+        )
+
+        width = len(str(count))
+        value_width = max(len(str(t)) for t in totals)
+        cells = [f"{i + 1:>{width}}: {t:>{value_width}}" for i, t in enumerate(totals)]
+        rows = ['   '.join(cells[i:i + 5]) for i in range(0, len(cells), 5)]
+
+        # Large dice can make the table too long for an embed, so cut it short by whole rows.
+        budget = EMBED_DESCRIPTION_LIMIT - len("```\n\n```")
+        table = ''
+        for i, row in enumerate(rows):
+            more = f"\n...and {count - i * 5} more."
+            if len(table) + len(row) + 1 + len(more) > budget:
+                table += more
+                break
+            table += ('\n' if table else '') + row
+
+        title = f"{count}x {query}"
+        if len(title) > EMBED_TITLE_LIMIT:
+            title = title[:EMBED_TITLE_LIMIT - 1] + '…'
+
+        emb = self.bot.embeds.get(
+            title=title,
+            description=f"```\n{table}\n```",
+            fields=[
+                {"name": "Lowest", "value": f"`{min(totals)}`"},
+                {"name": "Highest", "value": f"`{max(totals)}`"},
+                {"name": "Average", "value": f"`{sum(totals) / count:.2f}`"},
+            ],
+            footer=f"Roll {RollStream.reference(stream.seed, offset)}"
+        )
+
+        if histogram:
+            img = await asyncio.to_thread(get_roll_histogram, totals)
+            img.seek(0)
+            emb.set_image(url="attachment://histogram.png")
+            await interaction.response.send_message(
+                embed=emb,
+                file=discord.File(img, filename='histogram.png'),
+                ephemeral=private
+            )
+        else:
+            await interaction.response.send_message(embed=emb, ephemeral=private)
+
+    @decorators.command(
+        name="replay",
+        description="Replays a previous roll to verify its result.",
+        help="Every roll shows a reference in its footer. Replaying it re-rolls the exact same dice from the "
+             "logged seed, and compares the outcome to the logged result.",
+        icon="\N{CLOCKWISE RIGHTWARDS AND LEFTWARDS OPEN CIRCLE ARROWS}"
+    )
+    @app_commands.describe(reference="The roll reference, found in the footer of the roll. Example: `1f2e3d-4`")
+    async def dnd_replay_command(self, interaction: Interaction, reference: str) -> None:
+        try:
+            seed, offset = RollStream.parse_reference(reference)
+        except ValueError:
+            emb = self.bot.embeds.get(description=f"`{reference}` is not a valid roll reference.")
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        # The roll may still be waiting in the write-behind queue.
+        await self.bot.db.roll_logs.flush()
+        log = await self.bot.db.roll_logs.get_by_seed(seed, offset, interaction.guild_id, interaction.user.id)
+        if not log:
+            emb = self.bot.embeds.get(description=f"No roll was found for reference `{reference}`.")
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        rolls = DiceRoll.from_query(log.query)
+        if not isinstance(rolls, list):
+            rolls = [rolls]
+
+        rng = RollStream.generator(log.seed, log.seed_offset)
+        # Batch rolls draw their dice differently, so they are replayed the same way even when rolled once.
+        if log.mode == 'roll':
+            for r in rolls:
+                r.roll(rng)
+            results = [r.value for r in rolls]
+        else:
+            results = [0] * log.count
+            for roll in rolls:
+                results = [a + b for a, b in zip(results, roll.roll_many(log.count, rng))]
+
+        matches = results == log.results
+        emb = self.bot.embeds.get(
+            title=f"Roll {reference}: {'Verified' if matches else 'Mismatch'}",
+            description=f"`{log.count}x {log.query}`" if log.count > 1 else f"`{log.query}`",
+            color=None if matches else discord.Color.brand_red(),
+            fields=[
+                {"name": "Rolled By", "value": f"<@{log.user_id}>"},
+                {"name": "Rolled", "value": discord.utils.format_dt(log.ts, 'R')},
+                {"name": "Logged Result", "value": f"`{', '.join(str(r) for r in log.results)[:1000]}`", "inline": False},
+                {"name": "Replayed Result", "value": f"`{', '.join(str(r) for r in results)[:1000]}`", "inline": False},
+            ]
+        )
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
+    @decorators.command(
+        name="odds",
+        description="Calculates the exact odds of a dice roll.",
+        help="Shows the average, spread, and percentiles of the total of a roll, "
+             "and optionally the chance of meeting a DC.",
+        icon="\N{BAR CHART}"
+    )
+    @app_commands.describe(
+        rolls="The rolls to calculate the odds of. More than one roll can be combined. Example: `2d20 kh1 +2`",
+        dc="The difficulty class to calculate the chance of meeting or beating.",
+        private="Whether or not the odds will be visible to other people.",
+    )
+    async def dnd_odds_command(
+            self,
+            interaction: Interaction,
+            rolls: app_commands.Transform[Union[DiceRoll, list[DiceRoll]], transformers.DiceRollTransformer],
+            dc: int = None,
+            private: bool = False,
+    ) -> None:
+        query = DiceRoll.normalize_query(cast(Union[DiceRoll, list[DiceRoll]], rolls))
+
+        try:
+            # Even bounded, an exact distribution can take a moment, so keep it off the event loop.
+            dist = await asyncio.to_thread(get_dice_distribution, query)
+        except ValueError as e:
+            emb = self.bot.embeds.get(description=str(e), color=discord.Color.orange())
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        percentiles = (10, 25, 50, 75, 90)
+        fields = [
+            {"name": "Average", "value": f"`{dist.mean:.2f}`"},
+            {"name": "Std. Deviation", "value": f"`{dist.stdev:.2f}`"},
+            {"name": "Range", "value": f"`{dist.minimum} - {dist.maximum}`"},
+            {
+                "name": "Percentiles",
+                "value": '\n'.join(f"`{p}th`: `{dist.percentile(p)}`" for p in percentiles),
+                "inline": False
+            },
+        ]
+        if dc is not None:
+            fields.append({"name": f"Chance to Meet DC {dc}", "value": f"`{dist.at_least(dc):.2%}`", "inline": False})
+
+        emb = self.bot.embeds.get(title=f"Odds: {query}", fields=fields)
+        await interaction.response.send_message(embed=emb, ephemeral=private)
+
     @decorators.command(
         name='lookup',
         description="Look up standard information from the DnD 5e API.",
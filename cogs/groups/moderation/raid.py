@@ -0,0 +1,294 @@
+import asyncio
+import time
+from datetime import timedelta
+from typing import Optional, Coroutine, Any, cast
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from database.models.configs import GuildConfig
+from database.models.jobs import Job
+from templates import GroupCog, Interaction, RaidActionOption
+from templates import decorators, transformers
+from utils import LogType, SlidingWindow, run_bounded, str_from_tdelta
+
+# Joins remembered per guild, which bounds memory and the largest usable join threshold.
+RAID_MAX_TRACKED = 250
+# Timeouts and bans share a per-guild rate limit bucket, which discord.py already waits on.
+RAID_CONCURRENCY = 5
+# The permission the bot needs for each response.
+RAID_ACTION_PERMISSIONS = {
+    RaidActionOption.lockdown: 'manage_guild',
+    RaidActionOption.timeout: 'moderate_members',
+    RaidActionOption.ban: 'ban_members',
+}
+
+
+class RaidState:
+    """Recent joins to a guild, and whether it is currently being raided."""
+    __slots__ = ('joins', 'young_joins', 'raid_until')
+
+    def __init__(self, window: float) -> None:
+        self.joins: SlidingWindow[discord.Member] = SlidingWindow(window, RAID_MAX_TRACKED)
+        self.young_joins: SlidingWindow[discord.Member] = SlidingWindow(window, RAID_MAX_TRACKED)
+        # Monotonic time until which new joins are treated as part of the raid.
+        self.raid_until = 0.0
+
+
+@app_commands.guild_only()
+class Raid(GroupCog, group_name='raid', name='raid'):
+    description = 'Commands for configuring raid protection.'
+    help = 'Raid protection watches the rate of new members joining the server, and responds automatically when it ' \
+           'spikes, either by raising the server\'s verification level or by timing out or banning the new accounts.'
+    slash_commands = ['settings', 'end']
+    nested = True
+
+    states: dict[int, RaidState]
+    tasks: set[asyncio.Task]
+
+    LOCKDOWN_JOB_TYPE = 'raid_lockdown_end'
+
+    async def cog_load(self) -> None:
+        self.states = {}
+        self.tasks = set()
+        self.bot.scheduler.register(self.LOCKDOWN_JOB_TYPE, self.lockdown_end_job)
+
+        await super().cog_load()
+
+    async def cog_unload(self) -> None:
+        self.bot.scheduler.unregister(self.LOCKDOWN_JOB_TYPE)
+        for task in self.tasks:
+            task.cancel()
+
+        await super().cog_unload()
+
+    @staticmethod
+    def lockdown_job_key(guild_id: int) -> str:
+        return f'raid_lockdown:{guild_id}'
+
+    @staticmethod
+    def settings_embed_fields(config: GuildConfig) -> list[dict[str, Any]]:
+        return [
+            {'name': 'Enabled', 'value': f'`{config.raid_enabled}`'},
+            {'name': 'Action', 'value': f'`{config.raid_action.capitalize()}`'},
+            {'name': 'Window', 'value': f'`{config.raid_window}` seconds'},
+            {'name': 'Join Threshold', 'value': f'`{config.raid_join_threshold}` joins'},
+            {'name': 'New Account Threshold', 'value': f'`{config.raid_young_threshold}` joins'},
+            {'name': 'New Account Age', 'value': f'`{str_from_tdelta(timedelta(seconds=config.raid_account_age))}`'},
+            {'name': 'Duration', 'value': f'`{str_from_tdelta(timedelta(seconds=config.raid_duration))}`'},
+        ]
+
+    # ---------- App Commands ----------
+    @decorators.command(
+        name='settings',
+        description='Views or updates the raid protection settings.',
+        icon='\N{GEAR}',
+        help='A raid is detected when the join threshold is reached within the window, or when the new account '
+             'threshold is reached by accounts younger than the new account age. Timeouts and bans only target new '
+             'accounts, unless the new account age is zero. The duration is how long a raid lasts once detected, and '
+             'how long lockdowns and timeouts are kept in place.'
+    )
+    @app_commands.describe(
+        enabled='Whether to watch for raids.',
+        action='What to do when a raid is detected.',
+        window='The number of seconds over which joins are counted.',
+        join_threshold='The number of joins within the window that counts as a raid.',
+        young_threshold='The number of joins by new accounts within the window that counts as a raid.',
+        account_age='How old an account can be to count as new, such as `7 days`.',
+        duration='How long a raid and its response last, such as `10 minutes`.'
+    )
+    @decorators.enum_choices(action=RaidActionOption)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def raid_settings_command(
+            self,
+            interaction: Interaction,
+            enabled: bool = None,
+            action: app_commands.Choice[int] = None,
+            window: app_commands.Range[int, 1, 300] = None,
+            join_threshold: app_commands.Range[int, 2, RAID_MAX_TRACKED] = None,
+            young_threshold: app_commands.Range[int, 2, RAID_MAX_TRACKED] = None,
+            account_age: app_commands.Transform[timedelta, transformers.TimeDurationTransformer] = None,
+            duration: app_commands.Transform[timedelta, transformers.TimeDurationTransformer] = None
+    ) -> None:
+        values = {
+            'raid_enabled': enabled,
+            'raid_action': RaidActionOption(action.value).name if action is not None else None,
+            'raid_window': window,
+            'raid_join_threshold': join_threshold,
+            'raid_young_threshold': young_threshold,
+            'raid_account_age': int(cast(timedelta, account_age).total_seconds()) if account_age is not None else None,
+            'raid_duration': int(cast(timedelta, duration).total_seconds()) if duration is not None else None,
+        }
+        values = {k: v for k, v in values.items() if v is not None}
+        config = await self.bot.db.guild_configs.update(interaction.guild.id, **values)
+
+        emb = self.bot.embeds.get(
+            title='Raid Protection Settings' + (' Updated' if values else ''),
+            fields=self.settings_embed_fields(config)
+        )
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
+    @decorators.command(
+        name='end',
+        description='Ends the current raid response, lifting any lockdown.',
+        icon='\N{WHITE HEAVY CHECK MARK}'
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def raid_end_command(self, interaction: Interaction) -> None:
+        state = self.states.get(interaction.guild.id)
+        if state is not None:
+            state.raid_until = 0.0
+            state.joins.clear()
+            state.young_joins.clear()
+
+        await self.bot.scheduler.cancel(self.lockdown_job_key(interaction.guild.id))
+        try:
+            lifted = await self.end_lockdown(interaction.guild)
+        except discord.HTTPException:
+            emb = self.bot.embeds.get(
+                description='Ended the raid response, but could not lift the lockdown. Check that I have the '
+                            '`manage_guild` permission, then try again.',
+                color=discord.Color.orange()
+            )
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        emb = self.bot.embeds.get(
+            description='Ended the raid response' + (', and lifted the lockdown.' if lifted else '.')
+        )
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
+    # ---------- Listeners ----------
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        config = self.bot.db.guild_configs.get(member.guild.id)
+        if not config.raid_enabled:
+            return
+
+        now = time.monotonic()
+        state = self.states.get(member.guild.id)
+        if state is None:
+            state = self.states[member.guild.id] = RaidState(config.raid_window)
+        state.joins.window = state.young_joins.window = config.raid_window
+
+        young = (discord.utils.utcnow() - member.created_at).total_seconds() < config.raid_account_age
+        joins = state.joins.add(now, member)
+        young_joins = state.young_joins.add(now, member) if young else state.young_joins.count(now)
+
+        if now < state.raid_until:
+            # Joins during a raid get the same response, other than the lockdown, which is already in place.
+            if config.raid_action != RaidActionOption.lockdown.name and (young or config.raid_account_age == 0):
+                self.spawn(self.respond(member.guild, config, [member]), 'raid response')
+            return
+
+        if joins >= config.raid_join_threshold or young_joins >= config.raid_young_threshold:
+            state.raid_until = now + config.raid_duration
+            targets = list(state.joins if config.raid_account_age == 0 else state.young_joins)
+            self.bot.log(
+                f'Raid detected in "{member.guild}": {joins} joins ({young_joins} new accounts) within '
+                f'{config.raid_window} seconds. Responding with "{config.raid_action}".',
+                log_type=LogType.warning,
+                urgent=True
+            )
+            self.spawn(self.respond(member.guild, config, targets), 'raid response')
+
+    # ---------- Responses ----------
+    def spawn(self, coro: Coroutine[Any, Any, None], name: str) -> None:
+        """Runs a response in the background, so that join events are never held up by API calls."""
+        async def run() -> None:
+            try:
+                await coro
+            except Exception as error:
+                self.bot.log(
+                    f'Unhandled "{type(error).__name__}" in background task "{name}"',
+                    log_type=LogType.error,
+                    error=error,
+                    divider=True
+                )
+
+        task = asyncio.create_task(run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def respond(self, guild: discord.Guild, config: GuildConfig, members: list[discord.Member]) -> None:
+        action = RaidActionOption[config.raid_action]
+        reason = 'Raid protection.'
+
+        permission = RAID_ACTION_PERMISSIONS[action]
+        if not getattr(guild.me.guild_permissions, permission):
+            self.bot.log(
+                f'Raid protection in "{guild}" needs the "{permission}" permission to respond with "{action.name}".',
+                log_type=LogType.warning,
+                urgent=True
+            )
+            return
+
+        if action == RaidActionOption.lockdown:
+            await self.start_lockdown(guild, config)
+        elif action == RaidActionOption.timeout:
+            until = timedelta(seconds=config.raid_duration)
+            await run_bounded(
+                lambda m: m.timeout(until, reason=reason), members, RAID_CONCURRENCY, self.record_failure
+            )
+        elif action == RaidActionOption.ban:
+            banned: list[discord.Member] = []
+
+            def record(member: discord.Member, error: Optional[Exception]) -> None:
+                if error is None:
+                    banned.append(member)
+                else:
+                    self.record_failure(member, error)
+
+            await run_bounded(lambda m: guild.ban(m, reason=reason), members, RAID_CONCURRENCY, record)
+            if banned:
+                await self.bot.db.bans.insert_multi(users=banned, guild=guild, banner=self.bot.user, reason=reason)
+
+    def record_failure(self, member: discord.Member, error: Optional[Exception]) -> None:
+        if error is None:
+            return
+        if not isinstance(error, discord.HTTPException):
+            raise error
+        self.bot.log(
+            f'Raid protection could not act on "{member}" in "{member.guild}": {error}',
+            log_type=LogType.warning
+        )
+
+    async def start_lockdown(self, guild: discord.Guild, config: GuildConfig) -> None:
+        # A guild already locked down keeps the level to restore, and the job that restores it.
+        if config.raid_lockdown_level is not None:
+            return
+
+        # The level to restore is saved first, so that a lockdown is never left in place without it.
+        await self.bot.db.guild_configs.update(guild.id, raid_lockdown_level=guild.verification_level.value)
+        try:
+            await guild.edit(verification_level=discord.VerificationLevel.highest, reason='Raid protection lockdown.')
+        except discord.HTTPException:
+            # Nothing was locked down, so clear the level to let a later raid try again.
+            await self.bot.db.guild_configs.update(guild.id, raid_lockdown_level=None)
+            raise
+        await self.bot.scheduler.schedule(
+            self.LOCKDOWN_JOB_TYPE,
+            {'guild_id': guild.id},
+            discord.utils.utcnow() + timedelta(seconds=config.raid_duration),
+            dedupe_key=self.lockdown_job_key(guild.id)
+        )
+
+    async def end_lockdown(self, guild: discord.Guild) -> bool:
+        config = self.bot.db.guild_configs.get(guild.id)
+        if config.raid_lockdown_level is None:
+            return False
+
+        await guild.edit(
+            verification_level=discord.VerificationLevel(config.raid_lockdown_level),
+            reason='Raid protection lockdown ended.'
+        )
+        await self.bot.db.guild_configs.update(guild.id, raid_lockdown_level=None)
+        return True
+
+    # ---------- Jobs ----------
+    async def lockdown_end_job(self, job: Job) -> None:
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(job.payload['guild_id'])
+        if guild:
+            await self.end_lockdown(guild)
@@ -1,14 +1,24 @@
-from typing import cast
+from typing import cast, Optional, Union
 
+import asyncpg
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 from templates import GroupCog, Interaction, Emoji, Message
 from templates import decorators, transformers, views
+from database import ChangeEvent
 from database.models.role_reaction import RoleReaction
 
 
+EmojiKey = Union[int, str]
+
+
+def emoji_key(emoji_id: Optional[int], emoji_name: str) -> EmojiKey:
+    # Custom emojis are matched by ID, since their names are not unique. Default emojis are matched by name.
+    return emoji_id or emoji_name
+
+
 @app_commands.guild_only()
 @app_commands.checks.bot_has_permissions(moderate_members=True)
 @app_commands.checks.has_permissions(moderate_members=True)
@@ -20,6 +30,55 @@ class ReactionRole(GroupCog, group_name='rr', name='role_reaction'):
     slash_commands = ['add', 'remove', 'list']
     nested = True
 
+    # Routing table for reaction events, as message ID -> {emoji key -> role ID}. Every role reaction message has an
+    # entry, so reactions on any other message are ignored without touching the database.
+    routes: dict[int, dict[EmojiKey, int]]
+    # Role reaction message ID -> Discord message ID, for finding the routes to replace when a message changes.
+    route_messages: dict[int, int]
+
+    async def cog_load(self) -> None:
+        await self.load_routes()
+        self.bot.log(f'Loaded {len(self.routes)} role reaction message routes.', nest=1)
+
+        self.bot.db.notifications.subscribe('role_reaction_messages', self.on_routes_change)
+        self.bot.db.notifications.subscribe('role_reactions', self.on_routes_change)
+
+        await super().cog_load()
+
+    async def cog_unload(self) -> None:
+        self.bot.db.notifications.unsubscribe('role_reaction_messages', self.on_routes_change)
+        self.bot.db.notifications.unsubscribe('role_reactions', self.on_routes_change)
+
+        await super().cog_unload()
+
+    def add_routes(self, rows: list[asyncpg.Record]) -> None:
+        for row in rows:
+            self.route_messages[row['role_reaction_message_id']] = row['message_id']
+            routes = self.routes.setdefault(row['message_id'], {})
+            if row['role_id'] is not None:
+                routes[emoji_key(row['emoji_id'], row['emoji_name'])] = row['role_id']
+
+    async def load_routes(self) -> None:
+        self.routes = {}
+        self.route_messages = {}
+        self.add_routes(await self.bot.db.role_reactions.get_all_routes())
+
+    async def refresh_routes(self, role_reaction_message_id: int) -> None:
+        """Reloads the routes for a single message after its role reactions have changed."""
+        rows = await self.bot.db.role_reactions.get_routes_for_role_reaction_message(role_reaction_message_id)
+        message_id = self.route_messages.pop(role_reaction_message_id, None)
+        if message_id is not None:
+            self.routes.pop(message_id, None)
+        self.add_routes(rows)
+
+    async def on_routes_change(self, event: ChangeEvent) -> None:
+        if event.op == 'RESYNC':
+            await self.load_routes()
+        elif event.table == 'role_reaction_messages':
+            await self.refresh_routes(event.row['id'])
+        else:
+            await self.refresh_routes(event.row['role_reaction_message_id'])
+
     @decorators.command(
         name='list',
         description='Lists current role reactions for the server the command is used in.',
@@ -153,6 +212,7 @@ class ReactionRole(GroupCog, group_name='rr', name='role_reaction'):
                 return
 
         await self.bot.db.role_reactions.insert(role.id, emoji, rr_msg.id)
+        await self.refresh_routes(rr_msg.id)
 
         rrs = await self.bot.db.role_reactions.get_by_role_reaction_message_id(rr_msg.id)
         for rr in rrs:
@@ -216,6 +276,7 @@ class ReactionRole(GroupCog, group_name='rr', name='role_reaction'):
                 return
             await self.bot.db.role_reactions.delete_by_role_reaction_message_id(msg.role_reaction_msg.id)
             await self.bot.db.role_reaction_messages.delete_by_id(msg.role_reaction_msg.id)
+            await self.refresh_routes(msg.role_reaction_msg.id)
             await msg.message.clear_reactions()
 
             if msg.message.author.id == self.bot.user.id:
@@ -235,7 +296,8 @@ class ReactionRole(GroupCog, group_name='rr', name='role_reaction'):
                 for r in rrs:
                     r.populate(interaction)
                 if not rrs:
-                    self.bot.db.role_reaction_messages.delete_by_id(rr.role_reaction_message_id)
+                    await self.bot.db.role_reaction_messages.delete_by_id(rr.role_reaction_message_id)
+                await self.refresh_routes(msg.role_reaction_msg.id)
                 if msg.message.author.id == self.bot.user.id:
                     await self.update_role_reaction_message(
                         msg.message,
@@ -284,29 +346,26 @@ class ReactionRole(GroupCog, group_name='rr', name='role_reaction'):
     @commands.Cog.listener(name='on_raw_reaction_add')
     @commands.Cog.listener(name='on_raw_reaction_remove')
     async def on_raw_reaction(self, payload: discord.RawReactionActionEvent) -> None:
-        if payload.guild_id:
-            rr_msg = await self.bot.db.role_reaction_messages.get_by_message_id(payload.message_id)
-            if rr_msg:
-                rrs = await self.bot.db.role_reactions.get_by_role_reaction_message_id(rr_msg.id)
-                role = None
-                for rr in rrs:
-                    if payload.emoji.is_custom_emoji() and rr.emoji_id == payload.emoji.id:
-                        role = rr.role_id
-                    elif rr.emoji_name == payload.emoji.name:
-                        role = rr.role_id
-
-                guild = self.bot.get_guild(rr_msg.guild_id)
-
-                if role:
-                    role = guild.get_role(role)
-                    if payload.event_type == 'REACTION_ADD':
-                        if role not in payload.member.roles:
-                            await payload.member.add_roles(role, reason='Role reaction added.')
-                    elif payload.event_type == 'REACTION_REMOVE':
-                        member = guild.get_member(payload.user_id)
-                        if role in member.roles:
-                            await member.remove_roles(role, reason='Role reaction removed.')
-                elif payload.event_type == 'REACTION_ADD':
-                    channel = guild.get_channel(payload.channel_id)
-                    message = await channel.fetch_message(payload.message_id)
-                    await message.remove_reaction(payload.emoji, payload.member)
+        if not payload.guild_id:
+            return
+
+        routes = self.routes.get(payload.message_id)
+        if routes is None:
+            return
+
+        role = routes.get(payload.emoji.id if payload.emoji.is_custom_emoji() else payload.emoji.name)
+        guild = self.bot.get_guild(payload.guild_id)
+
+        if role:
+            role = guild.get_role(role)
+            if payload.event_type == 'REACTION_ADD':
+                if role not in payload.member.roles:
+                    await payload.member.add_roles(role, reason='Role reaction added.')
+            elif payload.event_type == 'REACTION_REMOVE':
+                member = guild.get_member(payload.user_id)
+                if role in member.roles:
+                    await member.remove_roles(role, reason='Role reaction removed.')
+        elif payload.event_type == 'REACTION_ADD':
+            channel = guild.get_channel(payload.channel_id)
+            message = await channel.fetch_message(payload.message_id)
+            await message.remove_reaction(payload.emoji, payload.member)
@@ -2,10 +2,13 @@ from typing import cast
 
 import discord
 from discord import app_commands
+from discord.ext import commands
 
 from templates import GroupCog, Interaction, Permission, Emoji, RoleSortOption, BulkRoleTargetOption
 from templates import decorators, transformers
+from templates.bulk import BulkRoleOperations
 from templates.views import Confirmation
+from utils import RoleMemberCounter
 
 
 @app_commands.guild_only()
@@ -15,6 +18,38 @@ class Role(GroupCog, group_name='role', name='roles'):
     slash_commands = ['give', 'take', 'bulkgive', 'bulktake', 'create', 'edit', 'delete', 'permissions', 'color']
     nested = True
 
+    bulk: BulkRoleOperations
+    member_counts: RoleMemberCounter
+
+    async def cog_load(self) -> None:
+        self.bulk = BulkRoleOperations(self.bot)
+        self.member_counts = RoleMemberCounter()
+        self.bot.scheduler.register(BulkRoleOperations.JOB_TYPE, self.bulk.run)
+
+        await super().cog_load()
+
+    async def cog_unload(self) -> None:
+        self.bot.scheduler.unregister(BulkRoleOperations.JOB_TYPE)
+
+        await super().cog_unload()
+
+    async def start_bulk_operation(
+            self,
+            interaction: Interaction,
+            role: discord.Role,
+            bulk_type: app_commands.Choice[int],
+            give: bool
+    ) -> None:
+        target = BulkRoleTargetOption(bulk_type.value)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        count = await self.bulk.start(interaction, role, give, target)
+        if count == 0:
+            type_str = 'users' if target == BulkRoleTargetOption.all_users else target.name
+            emb = self.bot.embeds.get(
+                description=f'No {type_str} {"need" if give else "have"} the {role.mention} role.'
+            )
+            await interaction.followup.send(embed=emb, ephemeral=True)
+
     # ---------- App Commands ----------
     @decorators.command(
         name='list',
@@ -29,8 +64,9 @@ class Role(GroupCog, group_name='role', name='roles'):
             sort_method = sort_method.value
         sort_method = RoleSortOption(sort_method)
 
+        counts = self.member_counts.counts(interaction.guild)
         if sort_method == RoleSortOption.member_count:
-            roles = sorted(interaction.guild.roles, key=lambda r: len(r.members), reverse=True)
+            roles = sorted(interaction.guild.roles, key=lambda r: counts.get(r.id, 0), reverse=True)
         elif sort_method == RoleSortOption.name:
             roles = sorted(interaction.guild.roles, key=lambda r: r.name.lower())
         else:
@@ -38,12 +74,12 @@ class Role(GroupCog, group_name='role', name='roles'):
             roles.reverse()
 
         max_length = max(len(r.name) for r in roles)
-        largest_group = max(len(str(len(r.members))) for r in roles)
+        largest_group = max(len(str(c)) for c in counts.values())
 
         emb = self.bot.embeds.get(
             title=f'{interaction.guild.name} Roles',
             description='```' + '\n'.join(
-                            f'{role.name:{max_length + 2}}{len(role.members):>{largest_group}}' for role in roles
+                            f'{role.name:{max_length + 2}}{counts.get(role.id, 0):>{largest_group}}' for role in roles
                         ) + '```'
         )
         await interaction.response.send_message(embed=emb)
@@ -128,46 +164,7 @@ class Role(GroupCog, group_name='role', name='roles'):
             role: discord.Role,
             bulk_type: app_commands.Choice[int]
     ) -> None:
-        bulk_type = BulkRoleTargetOption(bulk_type.value)
-
-        count_success = 0
-        count_fail = 0
-        type_str = None
-        if bulk_type == BulkRoleTargetOption.all_users:
-            type_str = 'users'
-            for member in interaction.guild.members:
-                try:
-                    if role not in member.roles:
-                        await member.add_roles(role)
-                        count_success += 1
-                except discord.Forbidden:
-                    count_fail += 1
-        elif bulk_type == BulkRoleTargetOption.bots:
-            type_str = 'bots'
-            for member in interaction.guild.members:
-                if member.bot:
-                    try:
-                        if role not in member.roles:
-                            await member.add_roles(role)
-                            count_success += 1
-                    except discord.Forbidden:
-                        count_fail += 1
-        elif bulk_type == BulkRoleTargetOption.humans:
-            type_str = 'humans'
-            for member in interaction.guild.members:
-                if not member.bot:
-                    try:
-                        if role not in member.roles:
-                            await member.add_roles(role)
-                            count_success += 1
-                    except discord.Forbidden:
-                        count_fail += 1
-
-        emb = self.bot.embeds.get(
-            description=f'Gave {role.mention} to {count_success} {type_str}.' +
-                        "" if count_fail == 0 else f"\n\nFailed to give the role to {count_fail} users."
-        )
-        await interaction.response.send_message(embed=emb, ephemeral=True)
+        await self.start_bulk_operation(interaction, role, bulk_type, give=True)
 
     @decorators.command(
         name='bulktake',
@@ -189,46 +186,7 @@ class Role(GroupCog, group_name='role', name='roles'):
             role: discord.Role,
             bulk_type: app_commands.Choice[int]
     ) -> None:
-        bulk_type = BulkRoleTargetOption(bulk_type.value)
-
-        count_success = 0
-        count_fail = 0
-        type_str = None
-        if bulk_type == BulkRoleTargetOption.all_users:
-            type_str = 'users'
-            for member in interaction.guild.members:
-                try:
-                    if role in member.roles:
-                        await member.remove_roles(role)
-                        count_success += 1
-                except discord.Forbidden:
-                    count_fail += 1
-        elif bulk_type == BulkRoleTargetOption.bots:
-            type_str = 'bots'
-            for member in interaction.guild.members:
-                if member.bot:
-                    try:
-                        if role in member.roles:
-                            await member.remove_roles(role)
-                            count_success += 1
-                    except discord.Forbidden:
-                        count_fail += 1
-        elif bulk_type == BulkRoleTargetOption.humans:
-            type_str = 'humans'
-            for member in interaction.guild.members:
-                if not member.bot:
-                    try:
-                        if role in member.roles:
-                            await member.remove_roles(role)
-                            count_success += 1
-                    except discord.Forbidden:
-                        count_fail += 1
-
-        emb = self.bot.embeds.get(
-            description=f'Took {role.mention} from {count_success} {type_str}.' +
-                        "" if count_fail == 0 else f"\n\nFailed to take the role from {count_fail} users."
-        )
-        await interaction.response.send_message(embed=emb, ephemeral=True)
+        await self.start_bulk_operation(interaction, role, bulk_type, give=False)
 
     @decorators.command(
         name='create',
@@ -432,7 +390,7 @@ class Role(GroupCog, group_name='role', name='roles'):
             interaction=interaction,
             msg=self.bot.embeds.get(
                 title=f'Delete the "{role.name}" role?',
-                description=f'This action cannot be undone.\n{role.mention} has `{len(role.members)}` members currently.'
+                description=f'This action cannot be undone.\n{role.mention} has `{self.member_counts.count(role)}` members currently.'
             )
         )
         res = await confirmation.get_response()
@@ -530,3 +488,29 @@ class Role(GroupCog, group_name='role', name='roles'):
             color=color
         )
         await interaction.response.send_message(embed=emb)
+
+    # ---------- Listeners ----------
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.member_counts.add(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.member_counts.remove(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        self.member_counts.update(before, after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        self.member_counts.remove_role(role)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        # The member cache is rebuilt when a guild becomes available again, so recount it from scratch.
+        self.member_counts.forget(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.member_counts.forget(guild.id)
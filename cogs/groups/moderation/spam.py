@@ -0,0 +1,227 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Any, cast
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from database.models.configs import GuildConfig
+from templates import GroupCog, Interaction
+from templates import decorators, transformers
+from utils import LogType, SlidingWindow, TokenBucket, simhash, hamming_distance, str_from_tdelta
+
+# Rate limit buckets kept across all guilds. The least recently active member's bucket is dropped beyond this, which
+# only ever forgets members that have gone quiet.
+SPAM_MAX_TRACKED_MEMBERS = 10_000
+# Recent message hashes per guild that new messages are compared against.
+SPAM_RECENT_MESSAGES = 50
+# Messages with fewer words are too short to compare meaningfully, and are left to the rate limit.
+SPAM_MIN_WORDS = 4
+# SimHashes of unrelated messages differ in about 32 of their 64 bits, and copies with small edits in only a few.
+SPAM_SIMHASH_DISTANCE = 12
+# Violations count towards a timeout for this many seconds.
+SPAM_STRIKE_WINDOW = 10 * 60
+# Further violations this soon after a warning are only deleted, so that a single burst earns a single warning.
+SPAM_STRIKE_COOLDOWN = 10
+# Violations waiting to be acted on. Beyond this, new violations are dropped rather than holding up message handling.
+SPAM_QUEUE_SIZE = 1000
+
+
+@app_commands.guild_only()
+class Spam(GroupCog, group_name='spam', name='spam'):
+    description = 'Commands for configuring the spam filter.'
+    help = 'The spam filter deletes messages sent too quickly, with too many mentions, or copied many times over, ' \
+           'warning the member who sent them and timing them out if they keep at it.'
+    slash_commands = ['settings']
+    nested = True
+
+    buckets: OrderedDict[tuple[int, int], TokenBucket]
+    recent: dict[int, SlidingWindow[int]]
+    strikes: dict[tuple[int, int], SlidingWindow]
+    violations: asyncio.Queue[tuple[discord.Message, str]]
+    worker: asyncio.Task
+
+    async def cog_load(self) -> None:
+        self.buckets = OrderedDict()
+        self.recent = {}
+        self.strikes = {}
+        self.violations = asyncio.Queue(SPAM_QUEUE_SIZE)
+        self.worker = asyncio.create_task(self.escalation_loop())
+
+        await super().cog_load()
+
+    async def cog_unload(self) -> None:
+        self.worker.cancel()
+
+        await super().cog_unload()
+
+    @staticmethod
+    def settings_embed_fields(config: GuildConfig) -> list[dict[str, Any]]:
+        return [
+            {'name': 'Enabled', 'value': f'`{config.spam_enabled}`'},
+            {'name': 'Rate Limit', 'value': f'`{config.spam_messages}` messages per `{config.spam_interval}` seconds'},
+            {'name': 'Mention Limit', 'value': f'`{config.spam_mentions}` mentions'},
+            {
+                'name': 'Duplicate Limit',
+                'value': f'`{config.spam_duplicates}` copies per `{config.spam_duplicate_window}` seconds'
+            },
+            {'name': 'Strikes', 'value': f'`{config.spam_strikes}`'},
+            {'name': 'Timeout', 'value': f'`{str_from_tdelta(timedelta(seconds=config.spam_timeout))}`'},
+        ]
+
+    # ---------- App Commands ----------
+    @decorators.command(
+        name='settings',
+        description='Views or updates the spam filter settings.',
+        icon='\N{GEAR}',
+        help='Members with the Manage Messages permission are never filtered. Each filtered message earns its sender '
+             'a warning, and reaching the strike count within ten minutes earns a timeout.'
+    )
+    @app_commands.describe(
+        enabled='Whether to filter spam.',
+        messages='The number of messages a member can send in a burst.',
+        interval='The number of seconds a member takes to recover from a full burst of messages.',
+        mentions='The number of mentions in one message that counts as spam.',
+        duplicates='The number of near-identical messages, from anyone, that counts as spam.',
+        duplicate_window='The number of seconds over which near-identical messages are counted.',
+        strikes='The number of warnings within ten minutes that earns a timeout.',
+        timeout='How long to time out members for, such as `10 minutes`.'
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def spam_settings_command(
+            self,
+            interaction: Interaction,
+            enabled: bool = None,
+            messages: app_commands.Range[int, 1, 100] = None,
+            interval: app_commands.Range[int, 1, 3600] = None,
+            mentions: app_commands.Range[int, 1, 100] = None,
+            duplicates: app_commands.Range[int, 2, SPAM_RECENT_MESSAGES] = None,
+            duplicate_window: app_commands.Range[int, 1, 3600] = None,
+            strikes: app_commands.Range[int, 1, 100] = None,
+            timeout: app_commands.Transform[timedelta, transformers.TimeDurationTransformer] = None
+    ) -> None:
+        values = {
+            'spam_enabled': enabled,
+            'spam_messages': messages,
+            'spam_interval': interval,
+            'spam_mentions': mentions,
+            'spam_duplicates': duplicates,
+            'spam_duplicate_window': duplicate_window,
+            'spam_strikes': strikes,
+            'spam_timeout': int(cast(timedelta, timeout).total_seconds()) if timeout is not None else None,
+        }
+        values = {k: v for k, v in values.items() if v is not None}
+        config = await self.bot.db.guild_configs.update(interaction.guild.id, **values)
+
+        emb = self.bot.embeds.get(
+            title='Spam Filter Settings' + (' Updated' if values else ''),
+            fields=self.settings_embed_fields(config)
+        )
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
+    # ---------- Listeners ----------
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        if message.guild is None or message.author.bot:
+            return
+
+        config = self.bot.db.guild_configs.get(message.guild.id)
+        if not config.spam_enabled:
+            return
+
+        reason = self.check(message, config, time.monotonic())
+        if reason is not None:
+            try:
+                self.violations.put_nowait((message, reason))
+            except asyncio.QueueFull:
+                pass
+
+    # ---------- Filtering ----------
+    def check(self, message: discord.Message, config: GuildConfig, now: float) -> Optional[str]:
+        """Checks a message against the filters, returning the reason it is spam, if it is.
+
+        This runs for every message, so it only touches in-memory state.
+        """
+        # Mentions are sent alongside the message, so they are counted even without its content.
+        mentions = len(message.mentions) + len(message.role_mentions) + message.mention_everyone
+        if mentions >= config.spam_mentions:
+            return f'Sent {mentions} mentions in one message.'
+
+        key = (message.guild.id, message.author.id)
+        rate = config.spam_messages / config.spam_interval
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, config.spam_messages, now)
+            if len(self.buckets) > SPAM_MAX_TRACKED_MEMBERS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            # Settings may have changed since the bucket was made.
+            bucket.rate, bucket.capacity = rate, config.spam_messages
+        if not bucket.take(now):
+            return 'Sent messages too quickly.'
+
+        if len(message.content.split()) >= SPAM_MIN_WORDS:
+            recent = self.recent.get(message.guild.id)
+            if recent is None:
+                recent = self.recent[message.guild.id] = SlidingWindow(
+                    config.spam_duplicate_window, SPAM_RECENT_MESSAGES
+                )
+            recent.window = config.spam_duplicate_window
+            recent.count(now)
+
+            h = simhash(message.content)
+            copies = 1 + sum(1 for other in recent if hamming_distance(h, other) <= SPAM_SIMHASH_DISTANCE)
+            recent.add(now, h)
+            if copies >= config.spam_duplicates:
+                return f'Sent a message copied {copies} times.'
+
+        return None
+
+    # ---------- Escalation ----------
+    async def escalation_loop(self) -> None:
+        while True:
+            message, reason = await self.violations.get()
+            try:
+                await self.escalate(message, reason)
+            except Exception as error:
+                self.bot.log(
+                    f'Unhandled "{type(error).__name__}" in background task "spam escalation"',
+                    log_type=LogType.error,
+                    error=error,
+                    divider=True
+                )
+
+    async def escalate(self, message: discord.Message, reason: str) -> None:
+        member = message.author
+        if not isinstance(member, discord.Member) or member.guild_permissions.manage_messages:
+            return
+
+        try:
+            await message.delete()
+        except discord.HTTPException:
+            pass
+
+        now = time.monotonic()
+        key = (message.guild.id, member.id)
+        strikes = self.strikes.get(key)
+        if strikes is None:
+            if len(self.strikes) >= SPAM_MAX_TRACKED_MEMBERS:
+                self.prune_strikes(now)
+            strikes = self.strikes[key] = SlidingWindow(SPAM_STRIKE_WINDOW, 100)
+        elif strikes.last is not None and now - strikes.last < SPAM_STRIKE_COOLDOWN:
+            return
+
+        config = self.bot.db.guild_configs.get(message.guild.id)
+        count = strikes.add(now)
+        await self.bot.db.warns.log(member, message.guild, self.bot.user, reason=f'Spam filter: {reason}')
+        if count >= config.spam_strikes:
+            strikes.clear()
+            await member.timeout(timedelta(seconds=config.spam_timeout), reason=f'Spam filter: {reason}')
+
+    def prune_strikes(self, now: float) -> None:
+        for key in [k for k, strikes in self.strikes.items() if strikes.count(now) == 0]:
+            del self.strikes[key]
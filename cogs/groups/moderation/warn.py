@@ -1,17 +1,32 @@
+from datetime import timedelta
+from typing import Optional, cast
+
 import discord
 from discord import app_commands
 
-from templates import GroupCog, decorators, Interaction
-from utils import Menu, MenuPageList
+from database.models.warn_policies import WarnPolicy
+from templates import GroupCog, decorators, transformers, Interaction, WarnActionOption
+from utils import Menu, KeysetMenuPage, str_from_tdelta
+
+# The longest timeout Discord allows.
+MAX_TIMEOUT = timedelta(days=28)
 
 
 @app_commands.guild_only()
 class Warn(GroupCog, group_name='warnings', name='warnings'):
     description = 'Commands for warning server members of misconduct.'
     help = 'These commands are for moderators to keep track of infractions of server members manually.'
-    slash_commands = ['list']
+    slash_commands = ['list', 'addpolicy', 'removepolicy', 'policies']
     nested = True
 
+    @staticmethod
+    def format_policy(policy: WarnPolicy) -> str:
+        res = f'`{policy.id}:` `{policy.warn_count}` warnings in `{str_from_tdelta(timedelta(seconds=policy.period))}`' \
+              f' - {policy.action}'
+        if policy.duration is not None and policy.action != WarnActionOption.kick.name:
+            res += f' for `{str_from_tdelta(timedelta(seconds=policy.duration))}`'
+        return res
+
     @decorators.command(
         name='list',
         description='Get a list of warnings for a specific user.',
@@ -21,17 +36,19 @@ class Warn(GroupCog, group_name='warnings', name='warnings'):
     @app_commands.checks.bot_has_permissions(moderate_members=True)
     @app_commands.checks.has_permissions(moderate_members=True)
     async def warn_list_command(self, interaction: Interaction, user: discord.User = None) -> None:
-        if user:
-            warns = await self.bot.db.warns.get_all_for_user_in_guild(user, interaction.guild)
-        else:
-            warns = await self.bot.db.warns.get_all_for_guild(interaction.guild)
+        guild = interaction.guild
+        total = await self.bot.db.warns.count(guild, user)
 
-        if len(warns) > 0:
+        if total > 0:
             menu = Menu(
-                MenuPageList(
+                KeysetMenuPage(
                     factory=self.bot.embeds,
-                    items=[f'`{w.id}:` `{w.user_name + "` - `" if not user else ""}{w.reason}`' for w in warns],
-                    title=f'{user if user else interaction.guild}\'s Warnings',
+                    fetch=lambda after, limit: self.bot.db.warns.get_page(guild, after, limit, user),
+                    seek=lambda offset: self.bot.db.warns.get_cursor(guild, offset, user),
+                    key=lambda w: w.id,
+                    total=total,
+                    format_item=lambda w: f'`{w.id}:` `{w.user_name + "` - `" if not user else ""}{w.reason}`',
+                    title=f'{user if user else guild}\'s Warnings',
                     per_page=5,
                 ),
                 interaction,
@@ -81,3 +98,102 @@ class Warn(GroupCog, group_name='warnings', name='warnings'):
                 description=f'No warning with ID `{id}` was found to delete.'
             )
             await interaction.response.send_message(embed=emb)
+
+    @decorators.command(
+        name='addpolicy',
+        description='Adds a policy that acts on members who reach a number of warnings within a period.',
+        icon='\N{HEAVY PLUS SIGN}',
+        help='Policies are checked whenever a member is warned. When several are reached at once, only the most severe '
+             'action is taken. Timeouts need a duration, and bans without one are permanent.'
+    )
+    @app_commands.describe(
+        warnings='The number of warnings that triggers the policy.',
+        period='The period the warnings must fall within, such as `7 days`.',
+        action='What to do when the policy is reached.',
+        duration='How long the timeout or ban lasts, such as `1 day`.'
+    )
+    @decorators.enum_choices(action=WarnActionOption)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def warn_addpolicy_command(
+            self,
+            interaction: Interaction,
+            warnings: app_commands.Range[int, 1, 100],
+            period: app_commands.Transform[timedelta, transformers.TimeDurationTransformer],
+            action: app_commands.Choice[int],
+            duration: app_commands.Transform[timedelta, transformers.TimeDurationTransformer] = None
+    ) -> None:
+        action = WarnActionOption(action.value)
+        period = cast(timedelta, period)
+        duration = cast(Optional[timedelta], duration)
+
+        if action == WarnActionOption.timeout and (duration is None or duration > MAX_TIMEOUT):
+            emb = self.bot.embeds.get(description='Timeouts need a duration of at most `28 days`.')
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        policy = await self.bot.db.warn_policies.insert(
+            interaction.guild.id,
+            warnings,
+            int(period.total_seconds()),
+            action.name,
+            int(duration.total_seconds()) if duration is not None and action != WarnActionOption.kick else None
+        )
+
+        emb = self.bot.embeds.get(title='Warning Policy Added', description=self.format_policy(policy))
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
+    @decorators.command(
+        name='removepolicy',
+        description='Removes a warning policy by its id.',
+        icon='\N{PUT LITTER IN ITS PLACE SYMBOL}'
+    )
+    @app_commands.describe(id='The ID of the policy to remove.')
+    @app_commands.checks.has_permissions(administrator=True)
+    async def warn_removepolicy_command(self, interaction: Interaction, id: app_commands.Range[int, 1]) -> None:
+        if await self.bot.db.warn_policies.delete(interaction.guild.id, id):
+            emb = self.bot.embeds.get(description=f'Removed warning policy `{id}`.')
+        else:
+            emb = self.bot.embeds.get(description=f'No warning policy with ID `{id}` was found to remove.')
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
+    @decorators.command(
+        name='policies',
+        description='Lists the warning policies for the server.',
+        icon='\N{SCROLL}'
+    )
+    @app_commands.checks.has_permissions(moderate_members=True)
+    async def warn_policies_command(self, interaction: Interaction) -> None:
+        policies = self.bot.db.warn_policies.get(interaction.guild.id)
+
+        if policies:
+            emb = self.bot.embeds.get(
+                title=f'{interaction.guild}\'s Warning Policies',
+                description='\n'.join(self.format_policy(p) for p in policies)
+            )
+        else:
+            emb = self.bot.embeds.get(description=f'`{interaction.guild}` has no warning policies.')
+        await interaction.response.send_message(embed=emb, ephemeral=True)
+
+    # ---------- Escalation ----------
+    async def reached_policy(self, guild: discord.Guild, user: discord.abc.User) -> Optional[WarnPolicy]:
+        """Gets the most severe of the guild's policies that a newly warned user has reached, if any.
+
+        The user's recent warnings are counted in memory. A guild's recent warnings are only loaded from the database
+        when they are first needed, or when a longer policy period is added.
+        """
+        policies = self.bot.db.warn_policies.get(guild.id)
+        if not policies:
+            return None
+
+        warns = self.bot.db.warns
+        age = timedelta(seconds=max(p.period for p in policies))
+        if not warns.has_recent(guild.id, age):
+            await warns.load_recent(guild.id, age)
+
+        reached = [
+            p for p in policies
+            if warns.count_recent(guild.id, user.id, timedelta(seconds=p.period)) >= p.warn_count
+        ]
+        if not reached:
+            return None
+        return max(reached, key=lambda p: (WarnActionOption[p.action].value, p.duration or 0))
@@ -5,6 +5,7 @@ from discord import app_commands
 
 from templates import Bot, Cog, Interaction, Emoji
 from templates import decorators, transformers
+from templates.errors import ShortenerError
 from utils import get_emoji_name
 
 
@@ -68,7 +69,15 @@ class MiscCog(Cog, name="miscellaneous"):
     )
     @app_commands.describe(url='The URL to shorten.')
     async def urlshort_command(self, interaction: Interaction, url: str) -> None:
-        short = self.bot.url_shorter.tinyurl.short(url)
+        try:
+            short = await self.bot.url_shortener.short(url)
+        except ShortenerError:
+            emb = self.bot.embeds.get(
+                description=f'Could not shorten `{url}` right now, please try again later.',
+                color=discord.Color.orange()
+            )
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
 
         emb = self.bot.embeds.get(
             title='Shortened URL',
@@ -4,30 +4,48 @@ TODO:
         - Warns:
             - Warn member
             - View member warnings
-            - Set warning limit before ban
         - Massban (?) [Takes a series of optional arguments to ban users by. I don't see a need for this rn.]
-        - Clean (?) [Removes messages from the bot by count and location.]
-        - Remove (?) [Removes messages meeting a certain criteria.]
-    Listener Implementations:
-        - Raid protection (?) [Need to look into a clean way of doing this.]
-        - Spam (?) [Same as above for this. Setting rules by @mentions or regular messages seems reasonable.]
 """
 
-from datetime import timedelta
+import re
+from datetime import datetime, timedelta
 from typing import Union, List, cast, Optional
 
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 
-from templates import Bot, Cog, Interaction
+from database.models.jobs import Job
+from database.models.warn_policies import WarnPolicy
+from templates import Bot, Cog, Interaction, WarnActionOption
 from templates import decorators, transformers
-from utils import LogType, clamp, Menu, MenuPageList
+from templates.purge import MessagePurge, PurgeFilter
+from utils import LogType, clamp, Menu, MenuPageList, KeysetMenuPage, JoinOrderIndex, run_bounded, str_from_tdelta
 
 from .groups.moderation.role import Role
 from .groups.moderation.warn import Warn
 from .groups.moderation.reactionrole import ReactionRole
 from .groups.moderation.embeds import Embeds
+from .groups.moderation.raid import Raid
+from .groups.moderation.spam import Spam
+
+# Bans in a guild share a rate limit bucket, which discord.py already waits on, so only a few are sent at once.
+BAN_CONCURRENCY = 5
+# Discord's limits on the length of an embed's description, and of all of its text together.
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000
+
+
+def mention_list(users: List[Union[discord.User, discord.Member]], max_length: int = 1024) -> str:
+    """Joins user mentions, cutting the list short to fit within `max_length`."""
+    res = ''
+    for i, user in enumerate(users):
+        more = f'\n...and {len(users) - i} more.'
+        item = f'{", " if res else ""}{user.mention}'
+        if len(res) + len(item) + len(more) > max_length:
+            return res + more
+        res += item
+    return res
 
 
 # ---------- Autocompletion functions. ----------
@@ -35,10 +53,10 @@ async def banned_users_autocomplete(
         interaction: Interaction,
         current: str
 ) -> List[app_commands.Choice[str]]:
-    opts = await interaction.client.db.bans.get_all_active_ban_users_for_guild(interaction.guild, current)
+    names = await interaction.client.db.bans.search_active_user_names(interaction.guild, current)
     return [
-        app_commands.Choice(name=opt.user_name, value=opt.user_name)
-        for opt in opts
+        app_commands.Choice(name=name, value=name)
+        for name in names
     ]
 
 
@@ -51,6 +69,8 @@ class ModerationCog(Cog, name="moderation"):
     warn: Warn
     reactionrole: ReactionRole
     embeds: Embeds
+    raid: Raid
+    spam: Spam
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -59,37 +79,111 @@ class ModerationCog(Cog, name="moderation"):
         self.warn = Warn(bot=self.bot)
         self.reactionrole = ReactionRole(bot=self.bot)
         self.embeds = Embeds(bot=self.bot)
+        self.raid = Raid(bot=self.bot)
+        self.spam = Spam(bot=self.bot)
         self.slash_commands = [
-            'setnick', 'bans', 'ban', 'unban', 'warn',
-            self.role, self.warn, self.reactionrole, self.embeds
+            'setnick', 'bans', 'ban', 'unban', 'warn', 'purge',
+            self.role, self.warn, self.reactionrole, self.embeds, self.raid, self.spam
         ]
 
-        self.moderation_task.start()
+        # Members of each guild in join order, for the newest members without sorting the whole guild.
+        self.join_order = JoinOrderIndex()
+
+        # Timed bans are lifted by the scheduler, so that they are kept across restarts.
+        self.bot.scheduler.register('unban', self.unban_job)
 
     def cog_unload(self) -> None:
         super().cog_unload()
 
-        self.moderation_task.stop()
+        self.bot.scheduler.unregister('unban')
+
+    @staticmethod
+    def unban_job_key(guild_id: int, user_id: int) -> str:
+        return f'unban:{guild_id}:{user_id}'
+
+    async def ban_user(
+            self,
+            guild: discord.Guild,
+            user: discord.abc.User,
+            banner: discord.abc.User,
+            duration: Optional[timedelta] = None,
+            reason: Optional[str] = None
+    ) -> Optional[datetime]:
+        """Bans a user and records the ban, scheduling the unban if it has a duration. Returns the unban date."""
+        await guild.ban(user, reason=f'Moderator: "{banner}" Reason: "{reason}"')
+        await self.bot.db.bans.insert(user=user, guild=guild, banner=banner, duration=duration, reason=reason)
+        if duration is None:
+            return None
+
+        unban_date = discord.utils.utcnow() + duration
+        await self.bot.scheduler.schedule(
+            'unban',
+            {'guild_id': guild.id, 'user_id': user.id},
+            unban_date,
+            dedupe_key=self.unban_job_key(guild.id, user.id)
+        )
+        return unban_date
+
+    async def escalate_warning(
+            self,
+            guild: discord.Guild,
+            user: discord.abc.User,
+            moderator: discord.abc.User,
+            policy: WarnPolicy
+    ) -> Optional[str]:
+        """Takes a reached warning policy's action, returning a description of it if it was taken."""
+        action = WarnActionOption[policy.action]
+        duration = timedelta(seconds=policy.duration) if policy.duration is not None else None
+        reason = f'Warning policy {policy.id}: {policy.warn_count} warnings in ' \
+                 f'{str_from_tdelta(timedelta(seconds=policy.period))}'
+
+        if action == WarnActionOption.ban:
+            await self.ban_user(guild, user, moderator, duration, reason)
+            return f'Banned for `{str_from_tdelta(duration)}`.' if duration is not None else 'Banned.'
+
+        # Timeouts and kicks only apply to current members.
+        member = guild.get_member(user.id)
+        if member is None:
+            return None
+
+        if action == WarnActionOption.kick:
+            await member.kick(reason=reason)
+            return 'Kicked.'
+
+        await member.timeout(duration, reason=reason)
+        return f'Timed out for `{str_from_tdelta(duration)}`.'
 
     # ---------- App Commands ----------
     @decorators.command(
         name='newmembers',
         description='Get\'s the newest members who have joined the server.',
-        help='The number of members returned must be between 5 and 25, inclusive.'
+        help='The number of members returned must be between 5 and 25, inclusive. If a time period is given, the '
+             'members who joined within it are counted, and the newest of them are listed.'
+    )
+    @app_commands.describe(
+        count='The number of users to fetch, no more than 25.',
+        within='Only include members who joined within this long, such as `1 hour`.'
     )
-    @app_commands.describe(count='The number of users to fetch, no more than 25.')
     @app_commands.guild_only()
-    async def newmembers_command(self, interaction: Interaction, count: int = 5) -> None:
+    async def newmembers_command(
+            self,
+            interaction: Interaction,
+            count: int = 5,
+            within: app_commands.Transform[timedelta, transformers.TimeDurationTransformer] = None
+    ) -> None:
         count = clamp(count, 5, 25)
 
-        members = sorted(
-            interaction.guild.members,
-            key=lambda m: m.joined_at or interaction.guild.created_at,
-            reverse=True
-        )[:count]
+        if within is not None:
+            total, members = self.join_order.joined_since(
+                interaction.guild, interaction.created_at - cast(timedelta, within), count
+            )
+            title = f'{total} Members Joined in the Last {str_from_tdelta(cast(timedelta, within))}'
+        else:
+            members = self.join_order.newest(interaction.guild, count)
+            title = f'{len(members)} Newest Members'
 
         emb = self.bot.embeds.get(
-            title=f'{len(members)} Newest Members',
+            title=title,
             description='\n'.join([f'{i+1}: {m.mention}' for i, m in enumerate(members)])
         )
 
@@ -245,6 +339,8 @@ class ModerationCog(Cog, name="moderation"):
     @app_commands.checks.bot_has_permissions(moderate_members=True)
     @app_commands.checks.has_permissions(moderate_members=True)
     async def warn_command(self, interaction: Interaction, user: discord.User, reason: str) -> None:
+        # Checking warning policies, and acting on them, can take longer than the initial response allows.
+        await interaction.response.defer(thinking=True)
         id = await self.bot.db.warns.insert(user, interaction.guild, interaction.user, reason)
 
         emb = self.bot.embeds.get(
@@ -264,7 +360,16 @@ class ModerationCog(Cog, name="moderation"):
             ]
         )
 
-        await interaction.response.send_message(embed=emb)
+        policy = await self.warn.reached_policy(interaction.guild, user)
+        if policy is not None:
+            try:
+                escalation = await self.escalate_warning(interaction.guild, user, interaction.user, policy)
+            except discord.HTTPException:
+                escalation = 'A warning policy was reached, but its action could not be taken.'
+            if escalation is not None:
+                emb.add_field(name='Escalation', value=escalation, inline=False)
+
+        await interaction.followup.send(embed=emb)
 
     @decorators.command(
         name='ban',
@@ -292,7 +397,7 @@ class ModerationCog(Cog, name="moderation"):
         if duration is not None:
             duration = cast(timedelta, duration)
 
-        await user.ban(reason=f'Moderator: "{interaction.user}" Reason: "{reason}"')
+        unban_date = await self.ban_user(interaction.guild, user, interaction.user, duration, reason)
 
         emb = self.bot.embeds.get(
             title=f'Banned {user}',
@@ -306,20 +411,12 @@ class ModerationCog(Cog, name="moderation"):
             ]
         )
 
-        if duration is not None:
-            unban_date = interaction.created_at + duration
+        if unban_date is not None:
             emb.add_field(
                 name="Unbanned",
                 value=discord.utils.format_dt(unban_date, 'R')
             )
 
-        await self.bot.db.bans.insert(
-            user=user,
-            guild=interaction.guild,
-            banner=interaction.user,
-            duration=duration,
-            reason=reason
-        )
         await interaction.response.send_message(embed=emb)
 
     @decorators.command(
@@ -335,7 +432,7 @@ class ModerationCog(Cog, name="moderation"):
     @app_commands.guild_only()
     @app_commands.checks.bot_has_permissions(ban_members=True)
     @app_commands.checks.has_permissions(ban_members=True)
-    async def ban_command(
+    async def softban_command(
             self,
             interaction: Interaction,
             user: discord.Member,
@@ -388,13 +485,29 @@ class ModerationCog(Cog, name="moderation"):
     ) -> None:
         users = cast(List[discord.Member], users)
         duration = cast(Optional[timedelta], duration)
+        users = list({user.id: user for user in users}.values())
+
+        # Raid-sized lists take a while to ban, so respond once they are done.
+        await interaction.response.defer(thinking=True)
 
-        for user in users:
-            await interaction.guild.ban(user, reason=f'Moderator: "{interaction.user}" Reason: "{reason}"')
+        banned: List[discord.Member] = []
+        failed: List[discord.Member] = []
+
+        def record(user: discord.Member, error: Optional[Exception]) -> None:
+            if error is None:
+                banned.append(user)
+            elif isinstance(error, discord.HTTPException):
+                failed.append(user)
+            else:
+                raise error
+
+        ban_reason = f'Moderator: "{interaction.user}" Reason: "{reason}"'
+        await run_bounded(
+            lambda u: interaction.guild.ban(u, reason=ban_reason), users, BAN_CONCURRENCY, record
+        )
 
         emb = self.bot.embeds.get(
-            title=f'Banned Members',
-            description=f'{", ".join([user.mention for user in users])}',
+            title=f'Banned {len(banned)} Members',
             fields=[
                 {
                     "name": "Reason",
@@ -403,22 +516,150 @@ class ModerationCog(Cog, name="moderation"):
                 }
             ]
         )
+        if failed:
+            emb.add_field(name=f'Failed to Ban {len(failed)} Members', value=mention_list(failed), inline=False)
+
+        if banned:
+            await self.bot.db.bans.insert_multi(
+                users=banned,
+                guild=interaction.guild,
+                banner=interaction.user,
+                duration=duration,
+                reason=reason
+            )
 
-        if duration is not None:
+        if duration is not None and banned:
             unban_date = interaction.created_at + duration
             emb.add_field(
                 name="Unbanned",
                 value=discord.utils.format_dt(unban_date, 'R')
             )
+            await self.bot.scheduler.schedule_many('unban', [
+                (
+                    {'guild_id': interaction.guild.id, 'user_id': user.id},
+                    unban_date,
+                    self.unban_job_key(interaction.guild.id, user.id)
+                )
+                for user in banned
+            ])
 
-        await self.bot.db.bans.insert_multi(
-            users=users,
-            guild=interaction.guild,
-            banner=interaction.user,
-            duration=duration,
-            reason=reason
+        # The banned list gets whatever room the rest of the embed leaves.
+        if banned:
+            budget = min(EMBED_DESCRIPTION_LIMIT, EMBED_TOTAL_LIMIT - len(emb))
+            emb.description = mention_list(banned, budget)
+        else:
+            emb.description = 'No members were banned.'
+        await interaction.followup.send(embed=emb)
+
+    @decorators.command(
+        name='purge',
+        description='Deletes recent messages in a channel, optionally filtered.',
+        icon='\N{WASTEBASKET}',
+        help='Scans the given number of most recent messages, deleting those that match every filter given. '
+             'Pinned messages are never deleted. Use a dry run to count the matching messages without deleting them.'
+    )
+    @app_commands.describe(
+        amount='The number of recent messages to scan.',
+        channel='The channel to purge. Defaults to this channel.',
+        user='Only delete messages sent by this user.',
+        pattern='Only delete messages matching this regular expression.',
+        contains='Only delete messages containing this text, ignoring case.',
+        links='Only delete messages containing links.',
+        attachments='Only delete messages with attachments.',
+        bots='Only delete messages sent by bots.',
+        dry_run='Count the matching messages without deleting them.'
+    )
+    @app_commands.guild_only()
+    @app_commands.checks.has_permissions(manage_messages=True)
+    @app_commands.checks.bot_has_permissions(manage_messages=True, read_message_history=True)
+    async def purge_command(
+            self,
+            interaction: Interaction,
+            amount: app_commands.Range[int, 1, 10_000],
+            channel: Union[discord.TextChannel, discord.Thread, discord.VoiceChannel] = None,
+            user: discord.User = None,
+            pattern: str = None,
+            contains: str = None,
+            links: bool = False,
+            attachments: bool = False,
+            bots: bool = False,
+            dry_run: bool = False
+    ) -> None:
+        channel = channel or interaction.channel
+
+        # The permission checks above only cover the channel the command was used in, not the one being purged.
+        needed = ('manage_messages', 'read_message_history')
+        for who, perms in (('You', channel.permissions_for(interaction.user)),
+                           ('I', channel.permissions_for(interaction.guild.me))):
+            missing = [p for p in needed if not getattr(perms, p)]
+            if missing:
+                emb = self.bot.embeds.get(
+                    description=f'{who} need the {" and ".join(f"`{p}`" for p in missing)} permission'
+                                f'{"s" if len(missing) > 1 else ""} in {channel.mention} to purge it.',
+                    color=discord.Color.orange()
+                )
+                await interaction.response.send_message(embed=emb, ephemeral=True)
+                return
+
+        # Without the message content intent, text and attachments arrive empty, and these filters could never match.
+        if (pattern or contains or links or attachments) and not self.bot.intents.message_content:
+            emb = self.bot.embeds.get(
+                description='Filtering by text, links or attachments needs the message content intent, which is '
+                            'not enabled.',
+                color=discord.Color.orange()
+            )
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        try:
+            regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+        except re.error as e:
+            emb = self.bot.embeds.get(
+                description=f'`{pattern}` is not a valid regular expression: {e}',
+                color=discord.Color.orange()
+            )
+            await interaction.response.send_message(embed=emb, ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        purge = MessagePurge(
+            channel,
+            PurgeFilter(
+                user_id=user.id if user else None,
+                pattern=regex,
+                contains=contains.lower() if contains else None,
+                links=links,
+                attachments=attachments,
+                bots=bots
+            ),
+            limit=amount,
+            # Skip the response to this command, which is already in the channel.
+            before=discord.Object(interaction.id),
+            reason=f'Purged by "{interaction.user}".',
+            dry_run=dry_run
         )
-        await interaction.response.send_message(embed=emb)
+
+        async def report(p: MessagePurge) -> None:
+            if p.dry_run:
+                description = f'{p.matched} of {p.scanned} messages scanned in {channel.mention} match.'
+                if p.matched_old:
+                    description += f'\n\n{p.matched_old} are older than 14 days, and would be deleted one at a time.'
+            else:
+                description = f'Deleted {p.deleted} of {p.matched} matching messages in {channel.mention}, ' \
+                              f'out of {p.scanned} scanned.'
+                if p.failed:
+                    description += f'\n\nFailed to delete {p.failed} messages.'
+            emb = self.bot.embeds.get(
+                title=('Purge Dry Run' if p.dry_run else 'Purge') + ('' if p.finished else ' In Progress...'),
+                description=description
+            )
+            try:
+                await interaction.edit_original_response(embed=emb)
+            except discord.HTTPException:
+                # Long purges can outlast the interaction, but should still finish.
+                pass
+
+        await purge.run(report)
 
     @decorators.command(
         name='bans',
@@ -430,19 +671,31 @@ class ModerationCog(Cog, name="moderation"):
     @app_commands.checks.has_permissions(ban_members=True)
     async def ban_list_command(self, interaction: Interaction, user: discord.User = None) -> None:
         if not user:
-            bans = await self.bot.db.bans.get_all_active_for_guild(interaction.guild)
-
-            menu = Menu(
-                MenuPageList(
-                    factory=self.bot.embeds.copy().update(thumbnail=interaction.guild.icon.url),
-                    items=[f'<@{b.user_id}>' for b in bans] if len(bans) > 0 else ['No users are banned in this server.'],
-                    title=f'Active {interaction.guild} Bans',
-                    number_items=len(bans) > 0,
+            guild = interaction.guild
+            total = await self.bot.db.bans.count_active_for_guild(guild)
+            factory = self.bot.embeds.copy().update(thumbnail=guild.icon.url)
+            title = f'Active {guild} Bans'
+
+            if total > 0:
+                pages = KeysetMenuPage(
+                    factory=factory,
+                    fetch=lambda after, limit: self.bot.db.bans.get_active_page_for_guild(guild, after, limit),
+                    seek=lambda offset: self.bot.db.bans.get_active_cursor_for_guild(guild, offset),
+                    key=lambda b: b.id,
+                    total=total,
+                    format_item=lambda b: f'<@{b.user_id}>',
+                    title=title,
+                    number_items=True,
                     per_page=15
-                ),
-                interaction=interaction,
-                delete_on_quit=False
-            )
+                )
+            else:
+                pages = MenuPageList(
+                    factory=factory,
+                    items=['No users are banned in this server.'],
+                    title=title,
+                    per_page=15
+                )
+            menu = Menu(pages, interaction=interaction, delete_on_quit=False)
 
             await menu.start()
         else:
@@ -513,7 +766,7 @@ class ModerationCog(Cog, name="moderation"):
                     await interaction.response.send_message(embed=emb, ephemeral=True)
 
                 except discord.NotFound:
-                    await self.bot.db.bans.deactivate_by_id(id=ban.ban_id)
+                    await self.bot.db.bans.deactivate_by_id(id=ban.id)
                     emb = self.bot.embeds.get(
                         description=f'Could not unban {user.mention}. They likely have already been manually unbanned.'
                     )
@@ -570,20 +823,32 @@ class ModerationCog(Cog, name="moderation"):
         self.bot.log(f'Banned {user} in "{guild}"')
         ban = await guild.fetch_ban(user)
         active_ban = await self.bot.db.bans.get_active_for_user_in_guild(user, guild)
-        if not (ban and active_ban and (active_ban.ban_ts - discord.utils.utcnow()).total_seconds() < 60):
-            await self.bot.db.bans.insert(
-                user=user,
-                guild=guild,
-                banner=None,
-                duration=None,
-                reason=ban.reason
-            )
+        if not (ban and active_ban and (discord.utils.utcnow() - active_ban.ts).total_seconds() < 60):
+            await self.bot.db.bans.insert(user=user, guild=guild, reason=ban.reason)
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild: discord.Guild, user: discord.User) -> None:
         self.bot.log(f'Unbanned {user} in "{guild}"')
+        await self.bot.scheduler.cancel(self.unban_job_key(guild.id, user.id))
         await self.bot.db.bans.deactivate_all_for_user_in_guild(user, guild)
 
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.join_order.add(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.join_order.remove(member)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        # The member cache is rebuilt when a guild becomes available again, so re-index it from scratch.
+        self.join_order.forget(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.join_order.forget(guild.id)
+
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
         if not before.is_timed_out() and after.is_timed_out():
@@ -591,33 +856,16 @@ class ModerationCog(Cog, name="moderation"):
         elif before.is_timed_out() and not after.is_timed_out():
             self.bot.log(f'"{after}" unmuted in "{after.guild}"')
 
-    # ---------- Tasks ----------
-    @tasks.loop(minutes=1)
-    async def moderation_task(self) -> None:
-        try:
-            # Handle unbanning people.
-            bans = await self.bot.db.bans.get_all_active()
-            for ban in bans:
-                if ban.actionable:
-                    guild = await self.bot.fetch_guild(ban.guild_id)
-                    if guild:
-                        user = await self.bot.fetch_user(ban.user_id)
-                        if user:
-                            try:
-                                await guild.unban(user, reason='The timer on the ban has ended.')
-                            except discord.NotFound:
-                                await self.bot.db.bans.deactivate_by_id(id=ban.ban_id)
-        except Exception as error:
-            self.bot.log(
-                f'Unhandled "{type(error).__name__}" in background task "moderation_task"',
-                log_type=LogType.error,
-                error=error,
-                divider=True
-            )
-
-    @moderation_task.before_loop
-    async def before_mod_check(self):
+    # ---------- Jobs ----------
+    async def unban_job(self, job: Job) -> None:
         await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(job.payload['guild_id'])
+        if guild:
+            user = discord.Object(job.payload['user_id'])
+            try:
+                await guild.unban(user, reason='The timer on the ban has ended.')
+            except discord.NotFound:
+                await self.bot.db.bans.deactivate_all_for_user_in_guild(user, guild)
 
 
 async def setup(bot: Bot):
@@ -627,3 +875,5 @@ async def setup(bot: Bot):
     await bot.add_cog(cog.warn, guilds=[bot.GUILD])
     await bot.add_cog(cog.reactionrole, guilds=[bot.GUILD])
     await bot.add_cog(cog.embeds, guilds=[bot.GUILD])
+    await bot.add_cog(cog.raid, guilds=[bot.GUILD])
+    await bot.add_cog(cog.spam, guilds=[bot.GUILD])
@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import TYPE_CHECKING, cast, Optional
 import os
 
+import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import tasks
@@ -12,6 +13,7 @@ from templates import Bot, GroupCog, Interaction, TwitterUserField as TUF, Twitt
 from templates import decorators, transformers
 from templates.errors import TwitterError
 from utils import LogType, EmbedFactory
+from database import ChangeEvent
 from database.models.twitter_monitors import TwitterMonitor
 
 if TYPE_CHECKING:
@@ -216,18 +218,26 @@ class TwitterCog(GroupCog, group_name='twitter', name="twitter"):
             bearer_token=bearer_token,
             wait_on_rate_limit=True
         )
+        # Without a session, tweepy opens (and closes) a new session for every request.
+        self.bot.twitter.session = self.bot.http_clients.session('twitter')
 
+        self.bot.db.notifications.subscribe('twitter_monitors', self.on_monitors_change)
         self.initialize_stream_client.start()
 
     def cog_unload(self) -> None:
         super().cog_unload()
 
+        self.bot.db.notifications.unsubscribe('twitter_monitors', self.on_monitors_change)
         self.stream.disconnect()
         self.initialize_stream_client.stop()
 
     async def update_monitors(self) -> None:
         self.bot.twitter_monitors = await self.bot.db.twitter_monitors.get_all()
 
+    async def on_monitors_change(self, event: ChangeEvent) -> None:
+        # Keeps monitors changed by other processes current.
+        await self.update_monitors()
+
     async def update_rules(self) -> None:
         # Handle ensuring the rules are up to date with the twitter stream.
         active_rules = await self.get_rules(self.bot.twitter_monitors)
@@ -436,7 +446,12 @@ class TwitterCog(GroupCog, group_name='twitter', name="twitter"):
     # ---------- Tasks ----------
     @tasks.loop(seconds=1, count=1)
     async def initialize_stream_client(self) -> None:
-        # Start the stream listener.
+        # Start the stream listener on a streaming connection. The read timeout matches tweepy's stall timeout.
+        self.stream.session = self.bot.http_clients.session(
+            'twitter_stream',
+            profile='streaming',
+            timeout=aiohttp.ClientTimeout(sock_read=90)
+        )
         self.stream.filter(
             tweet_fields=tweet_fields.query,
             user_fields=user_fields.query,
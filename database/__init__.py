@@ -1,2 +1,4 @@
-from .client import Client
+from .client import Client, ChangeEvent, NotificationBus
+from .migrations import Migration, Migrator
+from .queue import WriteBehindQueue
 from .models.bans import Bans
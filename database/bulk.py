@@ -0,0 +1,38 @@
+from itertools import count
+from typing import Iterable, Sequence
+
+import asyncpg
+
+_staging_ids = count()
+
+
+async def stage_records(
+        conn: asyncpg.Connection,
+        table: str,
+        columns: Sequence[str],
+        records: Iterable[Sequence]
+) -> str:
+    """Copies records into a temporary staging table with the given columns of `table`, returning its name.
+
+    The staging table has the column types of `table` but none of its constraints, defaults or triggers, and is
+    dropped when the transaction commits, so this must be called inside a transaction. The rows are sent with a single
+    COPY, ready to be applied to `table` with set-based statements.
+    """
+    staging = f'{table}_staging_{next(_staging_ids)}'
+    column_list = ', '.join(columns)
+
+    await conn.execute(
+        f'''CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA;'''
+    )
+    await conn.copy_records_to_table(staging, records=list(records), columns=list(columns))
+    return staging
+
+
+async def copy_insert(
+        conn: asyncpg.Connection,
+        table: str,
+        columns: Sequence[str],
+        records: Iterable[Sequence]
+) -> None:
+    """Inserts records straight into `table` with a single COPY, for inserts with no conflicts or side effects."""
+    await conn.copy_records_to_table(table, records=list(records), columns=list(columns))
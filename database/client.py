@@ -1,27 +1,187 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Optional, Any, Callable, Awaitable
+
 import asyncpg
 
+from .migrations import Migrator, Migration
+from .queue import WriteBehindQueue
 from .models.bans import Bans
 from .models.warns import Warns
 from .models.role_reaction_messages import RoleReactionMessages
 from .models.role_reaction import RoleReactions
 from .models.twitter_monitors import TwitterMonitors
+from .models.roll_logs import RollLogs
+from .models.short_urls import ShortURLs
+from .models.jobs import Jobs
+from .models.configs import GuildConfigs
+from .models.warn_policies import WarnPolicies
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """A change to a row in a table with a change trigger (see the migrations).
+
+    `op` is one of `INSERT`, `UPDATE` or `DELETE`, and `row` holds only the columns the table's trigger sends. After the
+    notification connection is re-established, a `RESYNC` event with an empty row is sent for every subscribed table,
+    since any changes made in the meantime were missed.
+    """
+    table: str
+    op: str
+    row: dict[str, Any]
+
+
+ChangeCallback = Callable[[ChangeEvent], Awaitable[None]]
+
+
+class NotificationBus:
+    """Delivers row changes made by any process to in-process caches, using Postgres LISTEN/NOTIFY.
+
+    A single pooled connection is held to listen on the `table_changes` channel. Events are delivered to subscribers
+    one at a time, in commit order, so that a cache applying them always converges on the table's state.
+    """
+    CHANNEL = 'table_changes'
+
+    def __init__(
+            self,
+            pool: asyncpg.Pool,
+            on_error: Optional[Callable[[ChangeEvent, Exception], None]] = None,
+            reconnect_delay: float = 5.0
+    ) -> None:
+        self.pool = pool
+        self.on_error = on_error
+        self.reconnect_delay = reconnect_delay
+
+        self._subscribers: dict[str, list[ChangeCallback]] = {}
+        self._events: asyncio.Queue[ChangeEvent] = asyncio.Queue()
+        self._conn: Optional[asyncpg.Connection] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._reconnect: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def subscribe(self, table: str, callback: ChangeCallback) -> None:
+        self._subscribers.setdefault(table, []).append(callback)
+
+    def unsubscribe(self, table: str, callback: ChangeCallback) -> None:
+        callbacks = self._subscribers.get(table, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    async def start(self) -> None:
+        self._closed = False
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._deliver())
+        await self._listen()
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in (self._reconnect, self._worker):
+            if task is not None:
+                task.cancel()
+        await self._release()
+
+    async def _listen(self) -> None:
+        self._conn = await self.pool.acquire()
+        self._conn.add_termination_listener(self._on_termination)
+        await self._conn.add_listener(self.CHANNEL, self._on_notification)
+
+    async def _release(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+
+        conn.remove_termination_listener(self._on_termination)
+        if not conn.is_closed():
+            await conn.remove_listener(self.CHANNEL, self._on_notification)
+        await self.pool.release(conn)
+
+    def _on_notification(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        data = json.loads(payload)
+        self._events.put_nowait(ChangeEvent(data['table'], data['op'], data['row'] or {}))
+
+    def _on_termination(self, conn: asyncpg.Connection) -> None:
+        if not self._closed and (self._reconnect is None or self._reconnect.done()):
+            self._reconnect = asyncio.create_task(self._resubscribe())
+
+    async def _resubscribe(self) -> None:
+        await self._release()
+        while not self._closed:
+            try:
+                await self._listen()
+            except (OSError, asyncpg.PostgresError):
+                await asyncio.sleep(self.reconnect_delay)
+            else:
+                break
+
+        for table in self._subscribers:
+            self._events.put_nowait(ChangeEvent(table, 'RESYNC', {}))
+
+    async def _deliver(self) -> None:
+        while True:
+            event = await self._events.get()
+            for callback in list(self._subscribers.get(event.table, [])):
+                try:
+                    await callback(event)
+                except Exception as e:
+                    if self.on_error is None:
+                        raise
+                    self.on_error(event, e)
 
 
 class Client:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: asyncpg.Pool, read_pool: Optional[asyncpg.Pool] = None):
         self.pool = pool
+        # Reads that can tolerate replication lag are routed here, if a read replica is configured.
+        self.read_pool = read_pool or pool
+        # Row changes from every process using the database, for keeping in-process caches coherent.
+        self.notifications = NotificationBus(self.pool)
+        # Batches non-critical inserts, such as logs, in the background.
+        self.write_queue = WriteBehindQueue(self.pool)
 
         # Get models.
-        self.bans = Bans(self.pool)
-        self.warns = Warns(self.pool)
-        self.role_reaction_messages = RoleReactionMessages(self.pool)
-        self.role_reactions = RoleReactions(self.pool)
-        self.twitter_monitors = TwitterMonitors(self.pool)
+        self.bans = Bans(self.pool, self.read_pool)
+        self.warns = Warns(self.pool, self.write_queue, self.read_pool)
+        self.role_reaction_messages = RoleReactionMessages(self.pool, self.read_pool)
+        self.role_reactions = RoleReactions(self.pool, self.read_pool)
+        self.twitter_monitors = TwitterMonitors(self.pool, self.read_pool)
+        self.roll_logs = RollLogs(self.pool, self.write_queue, self.read_pool)
+        self.short_urls = ShortURLs(self.pool, self.read_pool)
+        self.jobs = Jobs(self.pool, self.read_pool)
+        self.guild_configs = GuildConfigs(self.pool, self.read_pool)
+        self.warn_policies = WarnPolicies(self.pool, self.read_pool)
 
-    async def initialize(self):
+        self.notifications.subscribe('bans', self.bans.on_change)
+        self.notifications.subscribe('guild_configs', self.guild_configs.on_change)
+        self.notifications.subscribe('warns', self.warns.on_change)
+        self.notifications.subscribe('warn_policies', self.warn_policies.on_change)
+
+    async def initialize(self) -> list[Migration]:
         # Create model tables if nonexistent.
         await self.bans.create()
         await self.warns.create()
         await self.role_reaction_messages.create()
         await self.role_reactions.create()
         await self.twitter_monitors.create()
+        await self.roll_logs.create()
+        await self.short_urls.create()
+        await self.jobs.create()
+        await self.guild_configs.create()
+        await self.warn_policies.create()
+
+        # Apply any pending schema migrations, such as indexes.
+        migrations = await Migrator(self.pool).run()
+
+        # Guild configs are read on every message and join, so they are always held in memory, as are the warning
+        # policies checked on every warning.
+        await self.guild_configs.load()
+        await self.warn_policies.load()
+
+        await self.notifications.start()
+        await self.write_queue.start()
+        return migrations
+
+    async def close(self) -> None:
+        # Write out everything still queued before shutting down.
+        await self.write_queue.close()
+        await self.notifications.close()
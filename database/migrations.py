@@ -0,0 +1,239 @@
+from dataclasses import dataclass
+
+import asyncpg
+
+# Advisory lock key held while migrating, so that two bot processes starting at once can't both apply a migration.
+MIGRATION_LOCK_KEY = 5_342_118_003
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+
+
+# Ordered list of migrations. Never edit or reorder an applied migration, add a new one with the next version instead.
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        name='Indexes for hot lookups',
+        statements=(
+            '''CREATE INDEX IF NOT EXISTS bans_guild_id_active_idx ON bans (guild_id) WHERE active;''',
+            '''CREATE INDEX IF NOT EXISTS bans_user_id_guild_id_idx ON bans (user_id, guild_id, active);''',
+            '''CREATE INDEX IF NOT EXISTS bans_user_id_ts_idx ON bans (user_id, ts DESC);''',
+            '''CREATE INDEX IF NOT EXISTS bans_guild_id_user_name_active_idx ON bans (guild_id, user_name)
+            WHERE active;''',
+            '''CREATE INDEX IF NOT EXISTS warns_guild_id_user_id_idx ON warns (guild_id, user_id);''',
+            '''CREATE INDEX IF NOT EXISTS role_reaction_messages_message_id_idx
+            ON role_reaction_messages (message_id);''',
+            '''CREATE INDEX IF NOT EXISTS role_reaction_messages_guild_id_active_idx
+            ON role_reaction_messages (guild_id) WHERE active;''',
+            '''CREATE INDEX IF NOT EXISTS role_reactions_role_reaction_message_id_idx
+            ON role_reactions (role_reaction_message_id);''',
+            '''CREATE INDEX IF NOT EXISTS twitter_monitors_guild_id_idx ON twitter_monitors (guild_id);''',
+            '''CREATE INDEX IF NOT EXISTS twitter_monitors_twitter_user_id_idx ON twitter_monitors (twitter_user_id);''',
+        )
+    ),
+    Migration(
+        version=2,
+        name='Trigram index for banned user name search',
+        statements=(
+            # The extension needs privileges the bot's role may not have. Without it, searches use the guild index.
+            '''DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                    BEGIN
+                        CREATE EXTENSION pg_trgm;
+                    EXCEPTION WHEN insufficient_privilege OR undefined_file THEN
+                        RAISE NOTICE 'pg_trgm is not available, skipping the trigram index';
+                    END;
+                END IF;
+                IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                    CREATE INDEX IF NOT EXISTS bans_user_name_trgm_idx ON bans
+                    USING gin (LOWER(user_name) gin_trgm_ops) WHERE active;
+                END IF;
+            END;
+            $$;''',
+        )
+    ),
+    Migration(
+        version=3,
+        name='Change notifications for cached tables',
+        statements=(
+            # Only the columns named in a trigger's arguments are sent, keeping payloads well under the 8000 byte
+            # NOTIFY limit.
+            '''CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+            DECLARE
+                data json;
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    data := row_to_json(OLD);
+                ELSE
+                    data := row_to_json(NEW);
+                END IF;
+                SELECT json_object_agg(key, value) INTO data FROM json_each(data) WHERE key = ANY(TG_ARGV);
+                PERFORM pg_notify(
+                    'table_changes',
+                    json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', data)::text
+                );
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;''',
+            '''CREATE TRIGGER bans_notify_change AFTER INSERT OR UPDATE OR DELETE ON bans
+            FOR EACH ROW EXECUTE PROCEDURE notify_table_change('id', 'guild_id', 'user_id', 'user_name', 'active');''',
+            '''CREATE TRIGGER role_reaction_messages_notify_change
+            AFTER INSERT OR UPDATE OR DELETE ON role_reaction_messages
+            FOR EACH ROW EXECUTE PROCEDURE notify_table_change('id', 'message_id', 'guild_id');''',
+            '''CREATE TRIGGER role_reactions_notify_change AFTER INSERT OR UPDATE OR DELETE ON role_reactions
+            FOR EACH ROW EXECUTE PROCEDURE notify_table_change('id', 'role_reaction_message_id');''',
+            '''CREATE TRIGGER twitter_monitors_notify_change AFTER INSERT OR UPDATE OR DELETE ON twitter_monitors
+            FOR EACH ROW EXECUTE PROCEDURE notify_table_change('id', 'guild_id');''',
+        )
+    ),
+    Migration(
+        version=4,
+        name='ID block sequences',
+        statements=(
+            # Each nextval reserves a block of 100 IDs, see `database.utils.IdAllocator`. IDs previously generated
+            # at random span the whole bigint range, so a clash with these low sequential IDs is vanishingly unlikely.
+            '''CREATE SEQUENCE IF NOT EXISTS role_reaction_messages_id_blocks INCREMENT BY 100 MINVALUE 1;''',
+            '''CREATE SEQUENCE IF NOT EXISTS role_reactions_id_blocks INCREMENT BY 100 MINVALUE 1;''',
+            '''CREATE SEQUENCE IF NOT EXISTS twitter_monitors_id_blocks INCREMENT BY 100 MINVALUE 1;''',
+        )
+    ),
+    Migration(
+        version=5,
+        name='Keyset pagination indexes',
+        statements=(
+            # These replace the narrower indexes from migration 1, serving both the old lookups and paging by ID.
+            '''CREATE INDEX IF NOT EXISTS warns_guild_id_id_idx ON warns (guild_id, id);''',
+            '''CREATE INDEX IF NOT EXISTS warns_guild_id_user_id_id_idx ON warns (guild_id, user_id, id);''',
+            '''CREATE INDEX IF NOT EXISTS bans_guild_id_id_active_idx ON bans (guild_id, id) WHERE active;''',
+            '''DROP INDEX IF EXISTS warns_guild_id_user_id_idx;''',
+            '''DROP INDEX IF EXISTS bans_guild_id_active_idx;''',
+        )
+    ),
+    Migration(
+        version=6,
+        name='Timed ban index',
+        statements=(
+            # `ts + duration` can't be indexed directly, since adding an interval to a timestamptz depends on the time
+            # zone setting. Timed active bans are few, so a partial index over just those rows is enough.
+            '''CREATE INDEX IF NOT EXISTS bans_timed_active_idx ON bans (ts) WHERE active AND duration IS NOT NULL;''',
+        )
+    ),
+    Migration(
+        version=7,
+        name='Job scheduler',
+        statements=(
+            # The predicate must match the `ON CONFLICT` clause in `Jobs.enqueue` for the index to be inferred.
+            '''CREATE UNIQUE INDEX IF NOT EXISTS jobs_dedupe_key_idx ON jobs (dedupe_key)
+            WHERE status IN ('pending', 'running');''',
+            '''CREATE INDEX IF NOT EXISTS jobs_pending_run_at_idx ON jobs (run_at) WHERE status = 'pending';''',
+            '''CREATE INDEX IF NOT EXISTS jobs_running_locked_until_idx ON jobs (locked_until)
+            WHERE status = 'running';''',
+            # Timed bans were previously expired from the bans table itself, so carry them over as unban jobs.
+            '''INSERT INTO jobs (type, payload, run_at, dedupe_key)
+            SELECT 'unban', jsonb_build_object('guild_id', guild_id, 'user_id', user_id), ts + duration,
+                'unban:' || guild_id || ':' || user_id
+            FROM bans WHERE active AND duration IS NOT NULL
+            ON CONFLICT (dedupe_key) WHERE status IN ('pending', 'running') DO NOTHING;''',
+        )
+    ),
+    Migration(
+        version=8,
+        name='Change notifications for guild configs',
+        statements=(
+            '''CREATE TRIGGER guild_configs_notify_change AFTER INSERT OR UPDATE OR DELETE ON guild_configs
+            FOR EACH ROW EXECUTE PROCEDURE notify_table_change('guild_id');''',
+        )
+    ),
+    Migration(
+        version=9,
+        name='Spam filter settings',
+        statements=(
+            '''ALTER TABLE guild_configs
+            ADD COLUMN IF NOT EXISTS spam_enabled boolean DEFAULT false NOT NULL,
+            ADD COLUMN IF NOT EXISTS spam_messages integer DEFAULT 5 NOT NULL,
+            ADD COLUMN IF NOT EXISTS spam_interval integer DEFAULT 5 NOT NULL,
+            ADD COLUMN IF NOT EXISTS spam_mentions integer DEFAULT 5 NOT NULL,
+            ADD COLUMN IF NOT EXISTS spam_duplicates integer DEFAULT 4 NOT NULL,
+            ADD COLUMN IF NOT EXISTS spam_duplicate_window integer DEFAULT 30 NOT NULL,
+            ADD COLUMN IF NOT EXISTS spam_strikes integer DEFAULT 3 NOT NULL,
+            ADD COLUMN IF NOT EXISTS spam_timeout integer DEFAULT 600 NOT NULL;''',
+        )
+    ),
+    Migration(
+        version=10,
+        name='Warning escalation policies',
+        statements=(
+            # Serves loading a guild's recent warnings for counting against its policies.
+            '''CREATE INDEX IF NOT EXISTS warns_guild_id_ts_idx ON warns (guild_id, ts);''',
+            '''CREATE INDEX IF NOT EXISTS warn_policies_guild_id_idx ON warn_policies (guild_id);''',
+            '''CREATE TRIGGER warns_notify_change AFTER INSERT OR UPDATE OR DELETE ON warns
+            FOR EACH ROW EXECUTE PROCEDURE notify_table_change('id', 'guild_id', 'user_id', 'ts');''',
+            '''CREATE TRIGGER warn_policies_notify_change AFTER INSERT OR UPDATE OR DELETE ON warn_policies
+            FOR EACH ROW EXECUTE PROCEDURE notify_table_change('guild_id');''',
+        )
+    ),
+    Migration(
+        version=11,
+        name='Drop timed ban index',
+        statements=(
+            # Timed unbans are run by the scheduler, so nothing searches bans by expiry any more.
+            '''DROP INDEX IF EXISTS bans_timed_active_idx;''',
+        )
+    ),
+    Migration(
+        version=12,
+        name='Roll log modes',
+        statements=(
+            '''ALTER TABLE roll_logs ADD COLUMN IF NOT EXISTS mode text DEFAULT 'roll' NOT NULL;''',
+            # Before modes were logged, only batch rolls were logged with more than one repetition.
+            '''UPDATE roll_logs SET mode='batch' WHERE count > 1;''',
+        )
+    ),
+]
+
+
+class Migrator:
+    """Applies pending migrations in version order, recording each applied version in `schema_migrations`."""
+    def __init__(self, pool: asyncpg.Pool, migrations: list[Migration] = None) -> None:
+        self.pool = pool
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+
+    @staticmethod
+    def schema() -> str:
+        return '''CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            name text NOT NULL,
+            applied_at timestamp with time zone DEFAULT now() NOT NULL
+        );
+        '''
+
+    async def run(self) -> list[Migration]:
+        applied = []
+        async with self.pool.acquire() as conn:
+            await conn.execute('''SELECT pg_advisory_lock($1);''', MIGRATION_LOCK_KEY)
+            try:
+                await conn.execute(self.schema())
+                done = {r['version'] for r in await conn.fetch('''SELECT version FROM schema_migrations;''')}
+
+                for migration in self.migrations:
+                    if migration.version in done:
+                        continue
+
+                    # Each migration is applied atomically, along with the record of it being applied.
+                    async with conn.transaction():
+                        for statement in migration.statements:
+                            await conn.execute(statement)
+                        await conn.execute(
+                            '''INSERT INTO schema_migrations (version, name) VALUES ($1, $2);''',
+                            migration.version, migration.name
+                        )
+                    applied.append(migration)
+            finally:
+                await conn.execute('''SELECT pg_advisory_unlock($1);''', MIGRATION_LOCK_KEY)
+
+        return applied
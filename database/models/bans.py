@@ -1,13 +1,18 @@
+import asyncio
 import datetime
 from dataclasses import dataclass
-from typing import Optional, List, cast
+from typing import Optional, List, Callable, TYPE_CHECKING
 
 import asyncpg
 from asyncpg import Connection
 from discord import Guild, User
 from discord.utils import utcnow
 
-from ..utils import pooled_query
+from ..bulk import stage_records
+from ..utils import pooled_query, pooled_read, pooled_replica_read, RowDecoder
+
+if TYPE_CHECKING:
+    from ..client import ChangeEvent
 
 
 @dataclass
@@ -51,107 +56,263 @@ class Ban:
         return self.ts + self.duration if self.duration else None
 
 
+BAN = RowDecoder(Ban)
+BAN_INSERT_COLUMNS = ('user_id', 'user_name', 'user_avatar', 'guild_id', 'banned_by', 'ts', 'duration', 'reason', 'active')
+_BAN_INSERT_LIST = ', '.join(BAN_INSERT_COLUMNS)
+
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
 class Bans:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(
+            self,
+            pool: asyncpg.Pool,
+            read_pool: Optional[asyncpg.Pool] = None,
+            on_error: Optional[Callable[[Exception], None]] = None
+    ):
         self.pool = pool
+        self.read_pool = read_pool or pool
+        # Called with any error loading a guild's active ban names in the background.
+        self.on_error = on_error
+
+        # Active ban names per guild, as guild_id -> {user_id: (user_name, lowercase user_name)}. A guild is loaded the
+        # first time it is searched, and is then kept up to date by the write methods below.
+        self._active_names: dict[int, dict[int, tuple[str, str]]] = {}
+        self._loading: dict[int, asyncio.Task] = {}
+        self._pending_name_changes: dict[int, list[tuple[int, Optional[str]]]] = {}
+
+    def _update_active_name(self, guild_id: int, user_id: int, user_name: Optional[str]) -> None:
+        # A `user_name` of None marks the user as no longer banned.
+        if guild_id in self._loading:
+            self._pending_name_changes.setdefault(guild_id, []).append((user_id, user_name))
+
+        names = self._active_names.get(guild_id)
+        if names is None:
+            return
+        if user_name is None:
+            names.pop(user_id, None)
+        else:
+            names[user_id] = (user_name, user_name.lower())
+
+    async def _load_active_names(self, guild_id: int) -> None:
+        try:
+            rows = await self.get_active_names_for_guild(guild_id)
+            self._active_names[guild_id] = {r['user_id']: (r['user_name'], r['user_name'].lower()) for r in rows}
+
+            # Replay any changes made while the snapshot was loading, since it may or may not include them.
+            for user_id, user_name in self._pending_name_changes.pop(guild_id, []):
+                self._update_active_name(guild_id, user_id, user_name)
+        finally:
+            self._loading.pop(guild_id, None)
+            self._pending_name_changes.pop(guild_id, None)
+
+    def _on_load_done(self, task: asyncio.Task) -> None:
+        # The guild is loaded again on its next search, so a failure only needs reporting.
+        if task.cancelled() or task.exception() is None:
+            return
+        if self.on_error is None:
+            raise task.exception()
+        self.on_error(task.exception())
+
+    async def on_change(self, event: 'ChangeEvent') -> None:
+        """Applies ban changes from any process to the active ban name cache."""
+        if event.op == 'RESYNC':
+            self._active_names.clear()
+            return
+
+        row = event.row
+        active = event.op != 'DELETE' and row['active']
+        self._update_active_name(row['guild_id'], row['user_id'], row['user_name'] if active else None)
+
+    async def search_active_user_names(self, guild: Guild, query: str, limit: int = 25) -> List[str]:
+        """Searches the names of actively banned users in a guild, for autocompletion.
+
+        Answered from memory once the guild is loaded. Until then, the search falls back to the trigram index.
+        """
+        names = self._active_names.get(guild.id)
+        if names is None:
+            if guild.id not in self._loading:
+                task = self._loading[guild.id] = asyncio.create_task(self._load_active_names(guild.id))
+                task.add_done_callback(self._on_load_done)
+            return [b.user_name for b in await self.get_all_active_ban_users_for_guild(guild, query, limit)]
+
+        query = query.lower()
+        res = []
+        for user_name, lower in names.values():
+            if query in lower:
+                res.append(user_name)
+                if len(res) >= limit:
+                    break
+        return res
 
     @pooled_query
     async def create(self, conn: Connection) -> None:
         await conn.execute(Ban.schema())
 
+    # The write methods below only update the active name cache once their transaction has committed.
+    async def deactivate_by_id(self, id: int) -> None:
+        row = await self._deactivate_by_id(id)
+        if row:
+            self._update_active_name(row['guild_id'], row['user_id'], None)
+
     @pooled_query
-    async def deactivate_by_id(self, conn: Connection, id: int) -> None:
-        await conn.execute('''UPDATE bans SET active=$1 WHERE ban_id=$2;''', False, id)
+    async def _deactivate_by_id(self, conn: Connection, id: int) -> Optional[asyncpg.Record]:
+        return await conn.fetchrow('''UPDATE bans SET active=$1 WHERE id=$2 RETURNING guild_id, user_id;''', False, id)
+
+    async def deactivate_all_for_user_in_guild(self, user: User, guild: Guild) -> None:
+        await self._deactivate_all_for_user_in_guild(user, guild)
+        self._update_active_name(guild.id, user.id, None)
 
     @pooled_query
-    async def deactivate_all_for_user_in_guild(self, conn: Connection, user: User, guild: Guild) -> None:
+    async def _deactivate_all_for_user_in_guild(self, conn: Connection, user: User, guild: Guild) -> None:
         await conn.execute(
             '''UPDATE bans SET active=$1 WHERE user_id=$2 AND guild_id=$3;''',
             False, user.id, guild.id
         )
 
+    async def deactivate_all_for_users_in_guild(self, users: List[User], guild: Guild) -> None:
+        await self._deactivate_all_for_users_in_guild(users, guild)
+        for user in users:
+            self._update_active_name(guild.id, user.id, None)
+
     @pooled_query
-    async def deactivate_all_for_users_in_guild(self, conn: Connection, users: List[User], guild: Guild) -> None:
-        conn = cast(asyncpg.Connection, conn)
-        await conn.executemany(
-            '''UPDATE bans SET active=$1 WHERE user_id=$2 AND guild_id=$3;''',
-            [(False, user.id, guild.id) for user in users]
+    async def _deactivate_all_for_users_in_guild(self, conn: Connection, users: List[User], guild: Guild) -> None:
+        await conn.execute(
+            '''UPDATE bans SET active=$1 WHERE user_id = ANY($2::bigint[]) AND guild_id=$3 AND active;''',
+            False, [user.id for user in users], guild.id
         )
 
-    @pooled_query
-    async def insert(self, conn: Connection, user: User, guild: Guild, banner: User = None, duration: Optional[datetime.timedelta] = None,
+    async def insert(self, user: User, guild: Guild, banner: User = None, duration: Optional[datetime.timedelta] = None,
                      reason: Optional[str] = None, active: bool = True) -> None:
-        await self.deactivate_all_for_user_in_guild(user=user, guild=guild)
+        await self._insert(user, guild, banner, duration, reason, active)
+        self._update_active_name(guild.id, user.id, str(user) if active else None)
 
+    @pooled_query
+    async def _insert(self, conn: Connection, user: User, guild: Guild, banner: Optional[User],
+                      duration: Optional[datetime.timedelta], reason: Optional[str], active: bool) -> None:
+        # Deactivating the user's previous bans happens in the same statement, and so the same transaction.
         await conn.execute(
-            '''INSERT INTO bans (user_id, user_name, user_avatar, guild_id, banned_by, ts, duration, reason, active)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9);''',
+            f'''WITH deactivated AS (
+                UPDATE bans SET active=false WHERE user_id=$1 AND guild_id=$4 AND active
+            )
+            INSERT INTO bans ({_BAN_INSERT_LIST}) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9);''',
             user.id, str(user), user.display_avatar.url, guild.id,
             banner.id if banner is not None else banner, utcnow(), duration, reason, active
         )
 
-    @pooled_query
-    async def insert_multi(self, conn: Connection, users: List[User], guild: Guild, banner: User = None, duration: Optional[datetime.timedelta] = None,
-                     reason: Optional[str] = None, active: bool = True) -> None:
-        await self.deactivate_all_for_users_in_guild(users=users, guild=guild)
+    async def insert_multi(self, users: List[User], guild: Guild, banner: User = None, duration: Optional[datetime.timedelta] = None,
+                           reason: Optional[str] = None, active: bool = True) -> None:
+        """Bans many users at once, deactivating their previous bans.
+
+        The new bans are copied into a staging table, then applied with a single set-based statement.
+        """
+        await self._insert_multi(users, guild, banner, duration, reason, active)
+        for user in users:
+            self._update_active_name(guild.id, user.id, str(user) if active else None)
 
+    @pooled_query
+    async def _insert_multi(self, conn: Connection, users: List[User], guild: Guild, banner: Optional[User],
+                            duration: Optional[datetime.timedelta], reason: Optional[str], active: bool) -> None:
         banner_id = banner.id if banner is not None else banner
         dt = utcnow()
 
-        await conn.executemany(
-            '''INSERT INTO bans (user_id, user_name, user_avatar, guild_id, banned_by, ts, duration, reason, active)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9);''',
-            [(user.id, str(user), user.display_avatar.url, guild.id,
-            banner_id, dt, duration, reason, active) for user in users]
+        staging = await stage_records(
+            conn, 'bans', BAN_INSERT_COLUMNS,
+            ((user.id, str(user), user.display_avatar.url, guild.id, banner_id, dt, duration, reason, active)
+             for user in users)
+        )
+        await conn.execute(
+            f'''WITH deactivated AS (
+                UPDATE bans SET active=false
+                WHERE guild_id=$1 AND active AND user_id IN (SELECT user_id FROM {staging})
+            )
+            INSERT INTO bans ({_BAN_INSERT_LIST}) SELECT {_BAN_INSERT_LIST} FROM {staging};''',
+            guild.id
         )
 
-    @pooled_query
+    @pooled_read
     async def get_all_active(self, conn: Connection) -> List[Ban]:
-        res = await conn.fetch('''SELECT * FROM bans WHERE active=$1;''', True)
-        return [Ban(**b) for b in res]
+        res = await conn.fetch(f'''SELECT {BAN.select} FROM bans WHERE active=$1;''', True)
+        return BAN.many(res)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_all_active_for_guild(self, conn: Connection, guild: Guild) -> List[Ban]:
-        res = await conn.fetch('''SELECT * FROM bans WHERE guild_id=$1 AND active=$2;''', guild.id, True)
-        return [Ban(**b) for b in res]
+        res = await conn.fetch(f'''SELECT {BAN.select} FROM bans WHERE guild_id=$1 AND active=$2;''', guild.id, True)
+        return BAN.many(res)
 
-    @pooled_query
-    async def get_all_active_ban_users_for_guild(self, conn: Connection, guild: Guild, query: str) -> List[Ban]:
+    @pooled_replica_read
+    async def count_active_for_guild(self, conn: Connection, guild: Guild) -> int:
+        return await conn.fetchval('''SELECT COUNT(*) FROM bans WHERE guild_id=$1 AND active;''', guild.id)
+
+    @pooled_replica_read
+    async def get_active_page_for_guild(
+            self, conn: Connection, guild: Guild, after_id: Optional[int], limit: int
+    ) -> List[Ban]:
+        """Gets up to `limit` active bans in ID order, starting after the ban `after_id` (keyset pagination)."""
         res = await conn.fetch(
-            '''SELECT * FROM bans WHERE guild_id=$1 AND active=$2 AND LOWER(user_name) LIKE LOWER($3) LIMIT $4;''',
-            guild.id, True, f'%{query}%', 25
+            f'''SELECT {BAN.select} FROM bans WHERE guild_id=$1 AND active AND id > $2 ORDER BY id LIMIT $3;''',
+            guild.id, after_id or 0, limit
         )
-        return [Ban(**b) for b in res]
+        return BAN.many(res)
 
-    @pooled_query
+    @pooled_replica_read
+    async def get_active_cursor_for_guild(self, conn: Connection, guild: Guild, offset: int) -> Optional[int]:
+        """Gets the ID of the active ban at `offset` in ID order, for jumping straight to a page."""
+        return await conn.fetchval(
+            '''SELECT id FROM bans WHERE guild_id=$1 AND active ORDER BY id OFFSET $2 LIMIT 1;''',
+            guild.id, offset
+        )
+
+    @pooled_replica_read
+    async def get_all_active_ban_users_for_guild(
+            self, conn: Connection, guild: Guild, query: str, limit: int = 25
+    ) -> List[Ban]:
+        # `LOWER(user_name) LIKE` with `active` matches the partial trigram index.
+        res = await conn.fetch(
+            f'''SELECT {BAN.select} FROM bans
+            WHERE guild_id=$1 AND active AND LOWER(user_name) LIKE LOWER($2) LIMIT $3;''',
+            guild.id, f'%{escape_like(query)}%', limit
+        )
+        return BAN.many(res)
+
+    @pooled_read
+    async def get_active_names_for_guild(self, conn: Connection, guild_id: int) -> List[asyncpg.Record]:
+        return await conn.fetch('''SELECT user_id, user_name FROM bans WHERE guild_id=$1 AND active;''', guild_id)
+
+    @pooled_read
     async def get_active_for_user_in_guild(self, conn: Connection, user: User, guild: Guild) -> Ban:
         res = await conn.fetchrow(
-            '''SELECT * FROM bans WHERE user_id=$1 AND guild_id=$2 AND active=$3;''',
+            f'''SELECT {BAN.select} FROM bans WHERE user_id=$1 AND guild_id=$2 AND active=$3;''',
             user.id, guild.id, True
         )
-        return Ban(**res) if res else res
+        return BAN.one(res)
 
-    @pooled_query
+    @pooled_read
     async def get_active_for_username_in_guild(self, conn: Connection, user: str, guild: Guild) -> Ban:
         res = await conn.fetchrow(
-            '''SELECT * FROM bans WHERE user_name=$1 AND guild_id=$2 AND active=$3;''',
+            f'''SELECT {BAN.select} FROM bans WHERE user_name=$1 AND guild_id=$2 AND active=$3;''',
             user, guild.id, True
         )
-        return Ban(**res) if res else res
+        return BAN.one(res)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_all_for_user_in_guild(self, conn: Connection, user: User, guild: Guild) -> List[Ban]:
-        res = await conn.fetch('''SELECT * FROM bans WHERE user_id=$1 AND guild_id=$2;''', user.id, guild.id)
-        return [Ban(**b) for b in res]
+        res = await conn.fetch(
+            f'''SELECT {BAN.select} FROM bans WHERE user_id=$1 AND guild_id=$2;''',
+            user.id, guild.id
+        )
+        return BAN.many(res)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_all_for_user(self, conn: Connection, user: User) -> List[Ban]:
-        res = await conn.fetch('''SELECT * FROM bans WHERE user_id=$1;''', user.id)
-        return [Ban(**b) for b in res]
+        res = await conn.fetch(f'''SELECT {BAN.select} FROM bans WHERE user_id=$1;''', user.id)
+        return BAN.many(res)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_most_recent_for_user(self, conn: Connection, user: User) -> Optional[Ban]:
         return await conn.fetchval(
-            '''SELECT ban_ts FROM bans WHERE user_id=$1 ORDER BY ts DESC LIMIT 1;''',
+            '''SELECT ts FROM bans WHERE user_id=$1 ORDER BY ts DESC LIMIT 1;''',
             user.id
         )
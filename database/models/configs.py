@@ -1,10 +1,130 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from typing import Optional, Any, TYPE_CHECKING
+
+import asyncpg
+from asyncpg import Connection
+
+from ..utils import pooled_query, pooled_read, RowDecoder
+
+if TYPE_CHECKING:
+    from ..client import ChangeEvent
 
 
 @dataclass
 class GuildConfig:
-    id: int
+    guild_id: int
+    # Raid detection: a raid is `raid_join_threshold` joins, or `raid_young_threshold` joins by accounts younger than
+    # `raid_account_age` seconds, within `raid_window` seconds.
+    raid_enabled: bool = False
+    raid_window: int = 10
+    raid_join_threshold: int = 10
+    raid_young_threshold: int = 5
+    raid_account_age: int = 7 * 24 * 60 * 60
+    raid_action: str = 'lockdown'
+    raid_duration: int = 10 * 60
+    # The verification level to restore once a raid lockdown ends, set only while the guild is locked down.
+    raid_lockdown_level: Optional[int] = None
+    # Spam filtering: members may send `spam_messages` messages per `spam_interval` seconds, with at most
+    # `spam_mentions` mentions each, and `spam_duplicates` near-identical messages are allowed within
+    # `spam_duplicate_window` seconds. `spam_strikes` violations in a row earn a timeout of `spam_timeout` seconds.
+    spam_enabled: bool = False
+    spam_messages: int = 5
+    spam_interval: int = 5
+    spam_mentions: int = 5
+    spam_duplicates: int = 4
+    spam_duplicate_window: int = 30
+    spam_strikes: int = 3
+    spam_timeout: int = 10 * 60
 
     @staticmethod
     def schema() -> str:
-        return ''''''
+        return '''CREATE TABLE IF NOT EXISTS guild_configs (
+            guild_id bigint PRIMARY KEY,
+            raid_enabled boolean DEFAULT false NOT NULL,
+            raid_window integer DEFAULT 10 NOT NULL,
+            raid_join_threshold integer DEFAULT 10 NOT NULL,
+            raid_young_threshold integer DEFAULT 5 NOT NULL,
+            raid_account_age integer DEFAULT 604800 NOT NULL,
+            raid_action text DEFAULT 'lockdown' NOT NULL,
+            raid_duration integer DEFAULT 600 NOT NULL,
+            raid_lockdown_level integer,
+            spam_enabled boolean DEFAULT false NOT NULL,
+            spam_messages integer DEFAULT 5 NOT NULL,
+            spam_interval integer DEFAULT 5 NOT NULL,
+            spam_mentions integer DEFAULT 5 NOT NULL,
+            spam_duplicates integer DEFAULT 4 NOT NULL,
+            spam_duplicate_window integer DEFAULT 30 NOT NULL,
+            spam_strikes integer DEFAULT 3 NOT NULL,
+            spam_timeout integer DEFAULT 600 NOT NULL
+        );
+        '''
+
+
+GUILD_CONFIG = RowDecoder(GuildConfig)
+GUILD_CONFIG_COLUMNS = frozenset(f.name for f in fields(GuildConfig)) - {'guild_id'}
+
+
+class GuildConfigs:
+    """Per-guild settings, read on hot paths such as message and join events.
+
+    Every guild's config is held in memory, loaded once on startup and kept up to date through change notifications,
+    so `get` never touches the database. Guilds without a row use the defaults.
+    """
+    def __init__(self, pool: asyncpg.Pool, read_pool: Optional[asyncpg.Pool] = None):
+        self.pool = pool
+        self.read_pool = read_pool or pool
+
+        self._configs: dict[int, GuildConfig] = {}
+
+    @pooled_query
+    async def create(self, conn: Connection) -> None:
+        await conn.execute(GuildConfig.schema())
+
+    def get(self, guild_id: int) -> GuildConfig:
+        config = self._configs.get(guild_id)
+        if config is None:
+            config = GuildConfig(guild_id)
+        return config
+
+    @pooled_read
+    async def load(self, conn: Connection) -> None:
+        res = await conn.fetch(f'''SELECT {GUILD_CONFIG.select} FROM guild_configs;''')
+        self._configs = {c.guild_id: c for c in GUILD_CONFIG.many(res)}
+
+    @pooled_read
+    async def refresh(self, conn: Connection, guild_id: int) -> None:
+        res = await conn.fetchrow(f'''SELECT {GUILD_CONFIG.select} FROM guild_configs WHERE guild_id=$1;''', guild_id)
+        if res is None:
+            self._configs.pop(guild_id, None)
+        else:
+            self._configs[guild_id] = GUILD_CONFIG.one(res)
+
+    @pooled_query
+    async def update(self, conn: Connection, guild_id: int, **values: Any) -> GuildConfig:
+        """Sets some of a guild's settings, leaving the rest as they are."""
+        unknown = set(values) - GUILD_CONFIG_COLUMNS
+        if unknown:
+            raise KeyError(f'Unknown guild config columns: {", ".join(sorted(unknown))}')
+        if not values:
+            return self.get(guild_id)
+
+        columns = list(values)
+        res = await conn.fetchrow(
+            f'''INSERT INTO guild_configs (guild_id, {", ".join(columns)})
+            VALUES ($1, {", ".join(f"${i}" for i in range(2, len(columns) + 2))})
+            ON CONFLICT (guild_id) DO UPDATE SET {", ".join(f"{c}=EXCLUDED.{c}" for c in columns)}
+            RETURNING {GUILD_CONFIG.select};''',
+            guild_id, *values.values()
+        )
+        config = GUILD_CONFIG.one(res)
+        self._configs[guild_id] = config
+        return config
+
+    async def on_change(self, event: 'ChangeEvent') -> None:
+        """Applies config changes from any process to the in-memory configs."""
+        if event.op == 'RESYNC':
+            await self.load()
+        elif event.op == 'DELETE':
+            self._configs.pop(event.row['guild_id'], None)
+        else:
+            await self.refresh(event.row['guild_id'])
@@ -0,0 +1,225 @@
+import datetime
+import json
+from dataclasses import dataclass
+from typing import Optional, Any
+
+import asyncpg
+from asyncpg import Connection
+
+from ..utils import pooled_query, RowDecoder
+
+
+@dataclass
+class Job:
+    id: int
+    type: str
+    payload: dict[str, Any]
+    run_at: datetime.datetime
+    status: str
+    attempts: int
+    max_attempts: int
+    dedupe_key: Optional[str]
+    locked_by: Optional[str]
+    locked_until: Optional[datetime.datetime]
+    last_error: Optional[str]
+    created_at: datetime.datetime
+
+    def __post_init__(self):
+        # jsonb is returned as text unless a codec is registered on the connection.
+        if isinstance(self.payload, str):
+            self.payload = json.loads(self.payload)
+
+    @staticmethod
+    def schema() -> str:
+        return '''CREATE TABLE IF NOT EXISTS jobs (
+            id bigserial PRIMARY KEY,
+            type text NOT NULL,
+            payload jsonb DEFAULT '{}' NOT NULL,
+            run_at timestamp with time zone NOT NULL,
+            status text DEFAULT 'pending' NOT NULL,
+            attempts integer DEFAULT 0 NOT NULL,
+            max_attempts integer DEFAULT 5 NOT NULL,
+            dedupe_key text,
+            locked_by text,
+            locked_until timestamp with time zone,
+            last_error text,
+            created_at timestamp with time zone DEFAULT now() NOT NULL
+        );
+        '''
+
+
+JOB = RowDecoder(Job)
+
+
+class Jobs:
+    """Jobs are `pending` until claimed by a worker, which holds a lease on them while `running`.
+
+    A job whose lease has run out is claimed again by any worker, so jobs survive a worker stopping mid-job.
+    """
+    def __init__(self, pool: asyncpg.Pool, read_pool: Optional[asyncpg.Pool] = None):
+        self.pool = pool
+        self.read_pool = read_pool or pool
+
+    @pooled_query
+    async def create(self, conn: Connection) -> None:
+        await conn.execute(Job.schema())
+
+    @pooled_query
+    async def enqueue(
+            self,
+            conn: Connection,
+            type: str,
+            payload: dict[str, Any],
+            run_at: datetime.datetime,
+            dedupe_key: Optional[str] = None,
+            max_attempts: int = 5
+    ) -> Job:
+        """Adds a job, or replaces the unfinished job with the same `dedupe_key` if there is one.
+
+        A replaced job that was claimed is released, so that the worker holding it can neither run nor complete it.
+        """
+        row = await conn.fetchrow(
+            f'''INSERT INTO jobs (type, payload, run_at, dedupe_key, max_attempts) VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (dedupe_key) WHERE status IN ('pending', 'running')
+            DO UPDATE SET payload=EXCLUDED.payload, run_at=EXCLUDED.run_at, max_attempts=EXCLUDED.max_attempts,
+                status='pending', attempts=0, locked_by=NULL, locked_until=NULL
+            RETURNING {JOB.select};''',
+            type, json.dumps(payload), run_at, dedupe_key, max_attempts
+        )
+        return JOB.one(row)
+
+    @pooled_query
+    async def enqueue_many(
+            self,
+            conn: Connection,
+            type: str,
+            jobs: list[tuple[dict[str, Any], datetime.datetime, Optional[str]]],
+            max_attempts: int = 5
+    ) -> list[Job]:
+        """Adds many jobs of one type at once, given as (payload, run_at, dedupe_key), as `enqueue` does.
+
+        Dedupe keys must be distinct within a call.
+        """
+        rows = await conn.fetch(
+            f'''INSERT INTO jobs (type, payload, run_at, dedupe_key, max_attempts)
+            SELECT $1, j.payload::jsonb, j.run_at, j.dedupe_key, $5
+            FROM unnest($2::text[], $3::timestamptz[], $4::text[]) AS j (payload, run_at, dedupe_key)
+            ON CONFLICT (dedupe_key) WHERE status IN ('pending', 'running')
+            DO UPDATE SET payload=EXCLUDED.payload, run_at=EXCLUDED.run_at, max_attempts=EXCLUDED.max_attempts,
+                status='pending', attempts=0, locked_by=NULL, locked_until=NULL
+            RETURNING {JOB.select};''',
+            type,
+            [json.dumps(payload) for payload, _, _ in jobs],
+            [run_at for _, run_at, _ in jobs],
+            [dedupe_key for _, _, dedupe_key in jobs],
+            max_attempts
+        )
+        return JOB.many(rows)
+
+    @pooled_query
+    async def cancel(self, conn: Connection, dedupe_key: str) -> list[int]:
+        """Deletes the pending or running jobs with a dedupe key, returning their IDs."""
+        rows = await conn.fetch(
+            '''DELETE FROM jobs WHERE dedupe_key=$1 AND status IN ('pending', 'running') RETURNING id;''',
+            dedupe_key
+        )
+        return [r['id'] for r in rows]
+
+    @pooled_query
+    async def claim(
+            self,
+            conn: Connection,
+            worker: str,
+            types: list[str],
+            horizon: datetime.timedelta,
+            lease: datetime.timedelta,
+            limit: int = 100
+    ) -> list[Job]:
+        """Claims jobs due within `horizon`, along with any whose lease has run out.
+
+        Each job is leased until `lease` after it is due. Rows locked by another worker's claim are skipped, so
+        workers never claim the same job. Jobs whose lease ran out during their last allowed attempt are failed.
+        """
+        await conn.execute(
+            '''UPDATE jobs SET status='failed', locked_by=NULL, locked_until=NULL,
+                last_error=COALESCE(last_error, 'Lease ran out during the last attempt.')
+            WHERE id IN (
+                SELECT id FROM jobs WHERE type = ANY($1::text[])
+                    AND status = 'running' AND locked_until < now() AND attempts >= max_attempts
+                FOR UPDATE SKIP LOCKED
+            );''',
+            types
+        )
+        rows = await conn.fetch(
+            f'''UPDATE jobs SET status='running', locked_by=$1, locked_until=GREATEST(run_at, now()) + $4
+            WHERE id IN (
+                SELECT id FROM jobs WHERE type = ANY($2::text[]) AND (
+                    (status = 'pending' AND run_at <= now() + $3)
+                    OR (status = 'running' AND locked_until < now() AND attempts < max_attempts)
+                )
+                ORDER BY run_at LIMIT $5 FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {JOB.select};''',
+            worker, types, horizon, lease, limit
+        )
+        return JOB.many(rows)
+
+    @pooled_query
+    async def start(self, conn: Connection, id: int, worker: str, lease: datetime.timedelta) -> bool:
+        """Marks an attempt at a claimed job, returning False if the job was cancelled or claimed by another worker."""
+        return await conn.fetchval(
+            '''UPDATE jobs SET attempts=attempts + 1, locked_until=now() + $3
+            WHERE id=$1 AND locked_by=$2 AND status = 'running' RETURNING true;''',
+            id, worker, lease
+        ) or False
+
+    @pooled_query
+    async def renew(self, conn: Connection, id: int, worker: str, lease: datetime.timedelta) -> bool:
+        """Extends a running job's lease, returning False if the worker no longer holds it."""
+        return await conn.fetchval(
+            '''UPDATE jobs SET locked_until=now() + $3
+            WHERE id=$1 AND locked_by=$2 AND status = 'running' RETURNING true;''',
+            id, worker, lease
+        ) or False
+
+    @pooled_query
+    async def checkpoint(
+            self,
+            conn: Connection,
+            id: int,
+            worker: str,
+            payload: dict[str, Any],
+            lease: datetime.timedelta
+    ) -> bool:
+        """Saves a running job's progress and renews its lease, returning False if the worker no longer holds it."""
+        return await conn.fetchval(
+            '''UPDATE jobs SET payload=$3, locked_until=now() + $4
+            WHERE id=$1 AND locked_by=$2 AND status = 'running' RETURNING true;''',
+            id, worker, json.dumps(payload), lease
+        ) or False
+
+    @pooled_query
+    async def complete(self, conn: Connection, id: int, worker: str) -> None:
+        await conn.execute('''DELETE FROM jobs WHERE id=$1 AND locked_by=$2;''', id, worker)
+
+    @pooled_query
+    async def fail(self, conn: Connection, id: int, worker: str, error: str, retry_at: datetime.datetime) -> bool:
+        """Records a failed attempt, returning True if the job will be retried at `retry_at`."""
+        status = await conn.fetchval(
+            '''UPDATE jobs SET
+                status=CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                run_at=$4, last_error=$3, locked_by=NULL, locked_until=NULL
+            WHERE id=$1 AND locked_by=$2 RETURNING status;''',
+            id, worker, error, retry_at
+        )
+        return status == 'pending'
+
+    @pooled_query
+    async def release(self, conn: Connection, ids: list[int], worker: str) -> None:
+        """Returns claimed jobs that have not started to the pending jobs, for another worker to claim."""
+        await conn.execute(
+            '''UPDATE jobs SET status='pending', locked_by=NULL, locked_until=NULL
+            WHERE id = ANY($1::bigint[]) AND locked_by=$2 AND status = 'running';''',
+            ids, worker
+        )
+
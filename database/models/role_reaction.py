@@ -4,7 +4,7 @@ from dataclasses import dataclass
 import asyncpg
 import discord
 
-from ..utils import pooled_query, pooled_with_new_id_safe
+from ..utils import pooled_query, pooled_with_new_id_safe, pooled_read, RowDecoder
 
 if TYPE_CHECKING:
     from templates import Emoji, Interaction
@@ -47,9 +47,14 @@ class RoleReaction:
             self.emoji = self.emoji_name
 
 
+# `role` and `emoji` are filled in by `populate`, so they are left out of the columns.
+ROLE_REACTION = RowDecoder(RoleReaction, ('id', 'role_reaction_message_id', 'role_id', 'emoji_name', 'emoji_id'))
+
+
 class RoleReactions:
-    def __init__(self, pool: asyncpg.Pool) -> None:
+    def __init__(self, pool: asyncpg.Pool, read_pool: Optional[asyncpg.Pool] = None) -> None:
         self.pool = pool
+        self.read_pool = read_pool or pool
 
     @pooled_query
     async def create(self, conn: asyncpg.Connection) -> None:
@@ -72,16 +77,38 @@ class RoleReactions:
         )
         return id
 
-    @pooled_query
+    @pooled_read
     async def get_by_id(self, conn: asyncpg.Connection, id: int) -> Optional[RoleReaction]:
-        row = await conn.fetchrow('''SELECT * FROM role_reactions WHERE id=$1;''', id)
-        if row:
-            return RoleReaction(**row)
+        row = await conn.fetchrow(f'''SELECT {ROLE_REACTION.select} FROM role_reactions WHERE id=$1;''', id)
+        return ROLE_REACTION.one(row)
 
-    @pooled_query
+    @pooled_read
     async def get_by_role_reaction_message_id(self, conn: asyncpg.Connection, id: int) -> list[RoleReaction]:
-        rows = await conn.fetch('''SELECT * FROM role_reactions WHERE role_reaction_message_id=$1;''', id)
-        return [RoleReaction(**r) for r in rows]
+        rows = await conn.fetch(
+            f'''SELECT {ROLE_REACTION.select} FROM role_reactions WHERE role_reaction_message_id=$1;''',
+            id
+        )
+        return ROLE_REACTION.many(rows)
+
+    @pooled_read
+    async def get_all_routes(self, conn: asyncpg.Connection) -> list[asyncpg.Record]:
+        """Gets a row for each role reaction on any role reaction message, along with the Discord message ID.
+
+        Messages with no role reactions are returned once, with a null `role_id`.
+        """
+        return await conn.fetch(
+            '''SELECT m.id AS role_reaction_message_id, m.message_id, r.role_id, r.emoji_id, r.emoji_name
+            FROM role_reaction_messages m LEFT JOIN role_reactions r ON r.role_reaction_message_id = m.id;'''
+        )
+
+    @pooled_read
+    async def get_routes_for_role_reaction_message(self, conn: asyncpg.Connection, id: int) -> list[asyncpg.Record]:
+        return await conn.fetch(
+            '''SELECT m.id AS role_reaction_message_id, m.message_id, r.role_id, r.emoji_id, r.emoji_name
+            FROM role_reaction_messages m LEFT JOIN role_reactions r ON r.role_reaction_message_id = m.id
+            WHERE m.id=$1;''',
+            id
+        )
 
     @pooled_query
     async def delete_by_id(self, conn: asyncpg.Connection, id: int) -> None:
@@ -4,7 +4,7 @@ from typing import TYPE_CHECKING, Optional
 from asyncpg import Connection, Pool
 import discord
 
-from ..utils import pooled_query, pooled_with_new_id_safe
+from ..utils import pooled_query, pooled_with_new_id_safe, pooled_read, pooled_replica_read, RowDecoder
 
 
 @dataclass
@@ -26,9 +26,13 @@ class RoleReactionMessage:
         );'''
 
 
+ROLE_REACTION_MESSAGE = RowDecoder(RoleReactionMessage)
+
+
 class RoleReactionMessages:
-    def __init__(self, pool: Pool) -> None:
+    def __init__(self, pool: Pool, read_pool: Optional[Pool] = None) -> None:
         self.pool = pool
+        self.read_pool = read_pool or pool
 
     @pooled_query
     async def create(self, conn: Connection) -> None:
@@ -58,25 +62,29 @@ class RoleReactionMessages:
         )
         return id
 
-    @pooled_query
+    @pooled_read
     async def get_by_id(self, conn: Connection, id: int) -> Optional[RoleReactionMessage]:
-        row = await conn.fetchrow('''SELECT * FROM role_reaction_messages WHERE id=$1;''', id)
-        if row:
-            return RoleReactionMessage(**row)
+        row = await conn.fetchrow(
+            f'''SELECT {ROLE_REACTION_MESSAGE.select} FROM role_reaction_messages WHERE id=$1;''',
+            id
+        )
+        return ROLE_REACTION_MESSAGE.one(row)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_active_by_guild(self, conn: Connection, guild: discord.Guild) -> list[RoleReactionMessage]:
         rows = await conn.fetch(
-            '''SELECT * FROM role_reaction_messages WHERE guild_id=$1 AND active=$2;''',
+            f'''SELECT {ROLE_REACTION_MESSAGE.select} FROM role_reaction_messages WHERE guild_id=$1 AND active=$2;''',
             guild.id, True
         )
-        return [RoleReactionMessage(**r) for r in rows]
+        return ROLE_REACTION_MESSAGE.many(rows)
 
-    @pooled_query
+    @pooled_read
     async def get_by_message_id(self, conn: Connection, id: int) -> Optional[RoleReactionMessage]:
-        row = await conn.fetchrow('''SELECT * FROM role_reaction_messages WHERE message_id=$1;''', id)
-        if row:
-            return RoleReactionMessage(**row)
+        row = await conn.fetchrow(
+            f'''SELECT {ROLE_REACTION_MESSAGE.select} FROM role_reaction_messages WHERE message_id=$1;''',
+            id
+        )
+        return ROLE_REACTION_MESSAGE.one(row)
 
     @pooled_query
     async def delete_by_id(self, conn: Connection, id: int) -> None:
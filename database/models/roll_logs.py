@@ -0,0 +1,93 @@
+import datetime
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+import asyncpg
+from asyncpg import Connection
+from discord.utils import utcnow
+
+from ..utils import pooled_query, pooled_read, RowDecoder
+
+if TYPE_CHECKING:
+    from ..queue import WriteBehindQueue
+
+
+@dataclass
+class RollLog:
+    id: int
+    guild_id: Optional[int]
+    user_id: int
+    query: str
+    count: int
+    seed: int
+    seed_offset: int
+    results: list[int]
+    ts: datetime.datetime
+    # How the roll was made, which decides how it is replayed. `roll` logs each roll's value, and `batch` logs the
+    # totals of `count` repetitions.
+    mode: str
+
+    @staticmethod
+    def schema() -> str:
+        return '''CREATE TABLE IF NOT EXISTS roll_logs (
+            id serial PRIMARY KEY,
+            guild_id bigint,
+            user_id bigint NOT NULL,
+            query text NOT NULL,
+            count integer DEFAULT 1 NOT NULL,
+            seed bigint NOT NULL,
+            seed_offset bigint NOT NULL,
+            results integer[] NOT NULL,
+            ts timestamp with time zone NOT NULL,
+            mode text DEFAULT 'roll' NOT NULL,
+            UNIQUE (seed, seed_offset)
+        );
+        '''
+
+
+ROLL_LOG = RowDecoder(RollLog)
+ROLL_LOG_INSERT_COLUMNS = ('guild_id', 'user_id', 'query', 'count', 'seed', 'seed_offset', 'results', 'ts', 'mode')
+
+
+class RollLogs:
+    def __init__(self, pool: asyncpg.Pool, write_queue: 'WriteBehindQueue', read_pool: Optional[asyncpg.Pool] = None):
+        self.pool = pool
+        self.read_pool = read_pool or pool
+        self.write_queue = write_queue
+        self.write_queue.register('roll_logs', ROLL_LOG_INSERT_COLUMNS)
+
+    @pooled_query
+    async def create(self, conn: Connection) -> None:
+        await conn.execute(RollLog.schema())
+
+    async def log(
+            self,
+            guild_id: Optional[int],
+            user_id: int,
+            query: str,
+            seed: int,
+            seed_offset: int,
+            results: list[int],
+            count: int = 1,
+            mode: str = 'roll'
+    ) -> None:
+        """Queues a roll to be written in the background, so rolling never waits on the database."""
+        await self.write_queue.put(
+            'roll_logs',
+            (guild_id, user_id, query, count, seed, seed_offset, results, utcnow(), mode)
+        )
+
+    async def flush(self) -> None:
+        await self.write_queue.flush('roll_logs')
+
+    @pooled_read
+    async def get_by_seed(
+            self, conn: Connection, seed: int, seed_offset: int, guild_id: Optional[int], user_id: int
+    ) -> Optional[RollLog]:
+        """Gets a roll made in the given guild, or, outside of a guild, one made by the given user."""
+        res = await conn.fetchrow(
+            f'''SELECT {ROLL_LOG.select} FROM roll_logs WHERE seed=$1 AND seed_offset=$2
+            AND (guild_id=$3 OR ($3::bigint IS NULL AND guild_id IS NULL AND user_id=$4));''',
+            seed, seed_offset, guild_id, user_id
+        )
+        return ROLL_LOG.one(res)
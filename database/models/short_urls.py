@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+import datetime
+from typing import Optional
+
+import asyncpg
+from asyncpg import Connection
+from discord.utils import utcnow
+
+from ..utils import pooled_query, pooled_replica_read
+
+
+@dataclass
+class ShortURL:
+    backend: str
+    long_url: str
+    short_url: str
+    ts: datetime.datetime
+
+    @staticmethod
+    def schema() -> str:
+        return '''CREATE TABLE IF NOT EXISTS short_urls (
+            backend text NOT NULL,
+            long_url text NOT NULL,
+            short_url text NOT NULL,
+            ts timestamp with time zone NOT NULL,
+            PRIMARY KEY (backend, long_url)
+        );
+        '''
+
+
+class ShortURLs:
+    def __init__(self, pool: asyncpg.Pool, read_pool: Optional[asyncpg.Pool] = None):
+        self.pool = pool
+        self.read_pool = read_pool or pool
+
+    @pooled_query
+    async def create(self, conn: Connection) -> None:
+        await conn.execute(ShortURL.schema())
+
+    @pooled_query
+    async def insert(self, conn: Connection, backend: str, long_url: str, short_url: str) -> None:
+        await conn.execute(
+            '''INSERT INTO short_urls (backend, long_url, short_url, ts) VALUES ($1, $2, $3, $4)
+            ON CONFLICT (backend, long_url) DO UPDATE SET short_url=EXCLUDED.short_url, ts=EXCLUDED.ts;''',
+            backend, long_url, short_url, utcnow()
+        )
+
+    @pooled_replica_read
+    async def get_short_url(self, conn: Connection, backend: str, long_url: str) -> Optional[str]:
+        return await conn.fetchval(
+            '''SELECT short_url FROM short_urls WHERE backend=$1 AND long_url=$2;''',
+            backend, long_url
+        )
@@ -5,7 +5,7 @@ from typing import Optional
 import asyncpg
 import discord
 
-from ..utils import pooled_query, pooled_with_new_id_safe
+from ..utils import pooled_query, pooled_with_new_id_safe, pooled_read, pooled_replica_read, RowDecoder
 
 p = re.compile(r"^from:(?P<user_id>\d+)\s*?(?P<noretweets>-is:retweet)?\s*?(?P<noreplies>-is:reply)?\s*?(?P<noquotes>-is:quote)?\s*?(OR\s*?retweets_of:(?P<retweetsof>\d+))?\s*?(OR\s*?to:(?P<repliesof>\d+))?$")
 
@@ -89,9 +89,13 @@ class TwitterMonitor:
         return self.__str__()
 
 
+TWITTER_MONITOR = RowDecoder(TwitterMonitor)
+
+
 class TwitterMonitors:
-    def __init__(self, pool: asyncpg.Pool) -> None:
+    def __init__(self, pool: asyncpg.Pool, read_pool: Optional[asyncpg.Pool] = None) -> None:
         self.pool = pool
+        self.read_pool = read_pool or pool
 
     @pooled_query
     async def create(self, conn: asyncpg.Connection) -> None:
@@ -120,21 +124,23 @@ class TwitterMonitors:
 
         return id
 
-    @pooled_query
+    @pooled_read
     async def get_all(self, conn: asyncpg.Connection) -> list[TwitterMonitor]:
-        rows = await conn.fetch('''SELECT * FROM twitter_monitors;''')
-        return [TwitterMonitor(**r) for r in rows]
+        rows = await conn.fetch(f'''SELECT {TWITTER_MONITOR.select} FROM twitter_monitors;''')
+        return TWITTER_MONITOR.many(rows)
 
-    @pooled_query
+    @pooled_read
     async def get_by_id(self, conn: asyncpg.Connection, id: int) -> Optional[TwitterMonitor]:
-        row = await conn.fetchrow('''SELECT * FROM twitter_monitors WHERE id=$1;''', id)
-        if row:
-            return TwitterMonitor(**row)
+        row = await conn.fetchrow(f'''SELECT {TWITTER_MONITOR.select} FROM twitter_monitors WHERE id=$1;''', id)
+        return TWITTER_MONITOR.one(row)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_by_guild(self, conn: asyncpg.Connection, guild: discord.Guild) -> list[TwitterMonitor]:
-        rows = await conn.fetch('''SELECT * FROM twitter_monitors WHERE guild_id=$1;''', guild.id)
-        return [TwitterMonitor(**r) for r in rows]
+        rows = await conn.fetch(
+            f'''SELECT {TWITTER_MONITOR.select} FROM twitter_monitors WHERE guild_id=$1;''',
+            guild.id
+        )
+        return TWITTER_MONITOR.many(rows)
 
     @pooled_query
     async def update(
@@ -188,7 +194,7 @@ class TwitterMonitors:
         await conn.execute(f'''UPDATE twitter_monitors SET {", ".join(updates)} WHERE id=${i};''', *values, monitor.id)
         return True
 
-    @pooled_query
+    @pooled_read
     async def check_exists(self, conn: asyncpg.Connection, user_id: int, channel: discord.TextChannel) -> bool:
         return await conn.fetchval(
             '''SELECT EXISTS(SELECT 1 FROM twitter_monitors WHERE twitter_user_id=$1 AND guild_id=$2 AND channel_id=$3);''',
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+import asyncpg
+from asyncpg import Connection
+
+from ..utils import pooled_query, pooled_read, RowDecoder
+
+if TYPE_CHECKING:
+    from ..client import ChangeEvent
+
+
+@dataclass
+class WarnPolicy:
+    """Reaching `warn_count` warnings within `period` seconds earns `action`, lasting `duration` seconds if set."""
+    id: int
+    guild_id: int
+    warn_count: int
+    period: int
+    action: str
+    duration: Optional[int]
+
+    @staticmethod
+    def schema() -> str:
+        return '''CREATE TABLE IF NOT EXISTS warn_policies (
+            id serial PRIMARY KEY,
+            guild_id bigint NOT NULL,
+            warn_count integer NOT NULL,
+            period integer NOT NULL,
+            action text NOT NULL,
+            duration integer
+        );
+        '''
+
+
+WARN_POLICY = RowDecoder(WarnPolicy)
+
+
+class WarnPolicies:
+    """Every guild's warning escalation policies, held in memory and kept up to date through change notifications."""
+    def __init__(self, pool: asyncpg.Pool, read_pool: Optional[asyncpg.Pool] = None):
+        self.pool = pool
+        self.read_pool = read_pool or pool
+
+        self._policies: dict[int, list[WarnPolicy]] = {}
+
+    @pooled_query
+    async def create(self, conn: Connection) -> None:
+        await conn.execute(WarnPolicy.schema())
+
+    def get(self, guild_id: int) -> list[WarnPolicy]:
+        return self._policies.get(guild_id, [])
+
+    @pooled_read
+    async def load(self, conn: Connection) -> None:
+        res = await conn.fetch(f'''SELECT {WARN_POLICY.select} FROM warn_policies ORDER BY id;''')
+        policies: dict[int, list[WarnPolicy]] = {}
+        for policy in WARN_POLICY.many(res):
+            policies.setdefault(policy.guild_id, []).append(policy)
+        self._policies = policies
+
+    @pooled_read
+    async def refresh(self, conn: Connection, guild_id: int) -> None:
+        res = await conn.fetch(
+            f'''SELECT {WARN_POLICY.select} FROM warn_policies WHERE guild_id=$1 ORDER BY id;''',
+            guild_id
+        )
+        if res:
+            self._policies[guild_id] = WARN_POLICY.many(res)
+        else:
+            self._policies.pop(guild_id, None)
+
+    @pooled_query
+    async def insert(
+            self,
+            conn: Connection,
+            guild_id: int,
+            warn_count: int,
+            period: int,
+            action: str,
+            duration: Optional[int] = None
+    ) -> WarnPolicy:
+        res = await conn.fetchrow(
+            f'''INSERT INTO warn_policies (guild_id, warn_count, period, action, duration)
+            VALUES ($1, $2, $3, $4, $5) RETURNING {WARN_POLICY.select};''',
+            guild_id, warn_count, period, action, duration
+        )
+        policy = WARN_POLICY.one(res)
+        self._policies.setdefault(guild_id, []).append(policy)
+        return policy
+
+    @pooled_query
+    async def delete(self, conn: Connection, guild_id: int, id: int) -> bool:
+        deleted = await conn.fetchval(
+            '''DELETE FROM warn_policies WHERE guild_id=$1 AND id=$2 RETURNING id;''',
+            guild_id, id
+        )
+        if deleted is None:
+            return False
+
+        remaining = [p for p in self.get(guild_id) if p.id != id]
+        if remaining:
+            self._policies[guild_id] = remaining
+        else:
+            self._policies.pop(guild_id, None)
+        return True
+
+    async def on_change(self, event: 'ChangeEvent') -> None:
+        """Applies policy changes from any process to the in-memory policies."""
+        if event.op == 'RESYNC':
+            await self.load()
+        else:
+            await self.refresh(event.row['guild_id'])
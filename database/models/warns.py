@@ -1,13 +1,18 @@
+from bisect import bisect_left, insort
 from dataclasses import dataclass
 import datetime
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 import asyncpg
 from asyncpg import Connection
 from discord import User, Guild
 from discord.utils import utcnow
 
-from ..utils import pooled_query
+from ..utils import pooled_query, pooled_read, pooled_replica_read, RowDecoder
+
+if TYPE_CHECKING:
+    from ..client import ChangeEvent
+    from ..queue import WriteBehindQueue
 
 
 @dataclass
@@ -40,9 +45,29 @@ class Warn:
         '''
 
 
+WARN = RowDecoder(Warn)
+WARN_INSERT_COLUMNS = (
+    'user_id', 'user_name', 'user_avatar', 'guild_id', 'warned_by_id', 'warned_by_name', 'warned_by_avatar', 'ts',
+    'reason'
+)
+
+
 class Warns:
-    def __init__(self, pool: asyncpg.Pool):
+    """Warnings, with an in-memory record of recent warnings for counting them against escalation policies.
+
+    The record is loaded per guild with `load_recent`, covering warnings up to a given age, and is then kept up to date
+    by this model's own writes and by change notifications, which also cover queued writes and other processes.
+    """
+    def __init__(self, pool: asyncpg.Pool, write_queue: 'WriteBehindQueue', read_pool: Optional[asyncpg.Pool] = None):
         self.pool = pool
+        self.read_pool = read_pool or pool
+        self.write_queue = write_queue
+        self.write_queue.register('warns', WARN_INSERT_COLUMNS)
+
+        # Guild ID -> user ID -> (timestamp, warning ID) of their recent warnings, in time order.
+        self._recent: dict[int, dict[int, list[tuple[float, int]]]] = {}
+        # Guild ID -> the age in seconds of the oldest warnings held for the guild.
+        self._recent_ages: dict[int, float] = {}
 
     @pooled_query
     async def create(self, conn: Connection) -> None:
@@ -50,31 +75,147 @@ class Warns:
 
     @pooled_query
     async def insert(self, conn: Connection, user: User, guild: Guild, warner: User, reason: str = None) -> int:
-        return await conn.fetchval(
+        ts = utcnow()
+        id = await conn.fetchval(
             '''INSERT INTO warns (user_id, user_name, user_avatar, guild_id, warned_by_id, warned_by_name, warned_by_avatar, ts, reason)
             VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) RETURNING id;''',
-            user.id, str(user), user.display_avatar.url, guild.id, warner.id, str(warner), warner.display_avatar.url, utcnow(), reason
+            user.id, str(user), user.display_avatar.url, guild.id, warner.id, str(warner), warner.display_avatar.url, ts, reason
         )
+        self._add_recent(guild.id, user.id, ts.timestamp(), id)
+        return id
 
-    @pooled_query
+    async def log(self, user: User, guild: Guild, warner: User, reason: str = None) -> None:
+        """Queues a warning to be written in the background, for automatic warnings that don't need its ID."""
+        await self.write_queue.put(
+            'warns',
+            (user.id, str(user), user.display_avatar.url, guild.id, warner.id, str(warner), warner.display_avatar.url,
+             utcnow(), reason)
+        )
+
+    @pooled_read
     async def get_by_id(self, conn: Connection, id: int) -> Optional[Warn]:
-        res = await conn.fetchrow('''SELECT * FROM warns WHERE id=$1;''', id)
-        if res:
-            return Warn(**res)
+        res = await conn.fetchrow(f'''SELECT {WARN.select} FROM warns WHERE id=$1;''', id)
+        return WARN.one(res)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_all_for_guild(self, conn: Connection, guild: Guild) -> list[Warn]:
-        res = await conn.fetch('''SELECT * FROM warns WHERE guild_id=$1;''', guild.id)
-        return [Warn(**w) for w in res]
+        res = await conn.fetch(f'''SELECT {WARN.select} FROM warns WHERE guild_id=$1;''', guild.id)
+        return WARN.many(res)
 
-    @pooled_query
+    @pooled_replica_read
     async def get_all_for_user_in_guild(self, conn: Connection, user: User, guild: Guild) -> list[Warn]:
-        res = await conn.fetch('''SELECT * FROM warns WHERE user_id=$1 AND guild_id=$2;''', user.id, guild.id)
-        return [Warn(**w) for w in res]
+        res = await conn.fetch(
+            f'''SELECT {WARN.select} FROM warns WHERE user_id=$1 AND guild_id=$2;''',
+            user.id, guild.id
+        )
+        return WARN.many(res)
+
+    @pooled_replica_read
+    async def count(self, conn: Connection, guild: Guild, user: Optional[User] = None) -> int:
+        if user:
+            return await conn.fetchval(
+                '''SELECT COUNT(*) FROM warns WHERE guild_id=$1 AND user_id=$2;''',
+                guild.id, user.id
+            )
+        return await conn.fetchval('''SELECT COUNT(*) FROM warns WHERE guild_id=$1;''', guild.id)
+
+    @pooled_replica_read
+    async def get_page(
+            self, conn: Connection, guild: Guild, after_id: Optional[int], limit: int, user: Optional[User] = None
+    ) -> list[Warn]:
+        """Gets up to `limit` warnings in ID order, starting after the warning `after_id` (keyset pagination)."""
+        if user:
+            res = await conn.fetch(
+                f'''SELECT {WARN.select} FROM warns WHERE guild_id=$1 AND user_id=$2 AND id > $3
+                ORDER BY id LIMIT $4;''',
+                guild.id, user.id, after_id or 0, limit
+            )
+        else:
+            res = await conn.fetch(
+                f'''SELECT {WARN.select} FROM warns WHERE guild_id=$1 AND id > $2 ORDER BY id LIMIT $3;''',
+                guild.id, after_id or 0, limit
+            )
+        return WARN.many(res)
+
+    @pooled_replica_read
+    async def get_cursor(
+            self, conn: Connection, guild: Guild, offset: int, user: Optional[User] = None
+    ) -> Optional[int]:
+        """Gets the ID of the warning at `offset` in ID order, for jumping straight to a page."""
+        if user:
+            return await conn.fetchval(
+                '''SELECT id FROM warns WHERE guild_id=$1 AND user_id=$2 ORDER BY id OFFSET $3 LIMIT 1;''',
+                guild.id, user.id, offset
+            )
+        return await conn.fetchval(
+            '''SELECT id FROM warns WHERE guild_id=$1 ORDER BY id OFFSET $2 LIMIT 1;''',
+            guild.id, offset
+        )
 
     @pooled_query
     async def delete_by_id(self, conn: Connection, id: int) -> bool:
-        if await conn.fetchval('''SELECT EXISTS(SELECT 1 FROM warns WHERE id=$1);''', id):
-            await conn.execute('''DELETE FROM warns WHERE id=$1;''', id)
-            return True
-        return False
+        res = await conn.fetchrow('''DELETE FROM warns WHERE id=$1 RETURNING guild_id, user_id;''', id)
+        if res is None:
+            return False
+        self._remove_recent(res['guild_id'], res['user_id'], id)
+        return True
+
+    # ---------- Recent warnings ----------
+    def has_recent(self, guild_id: int, age: datetime.timedelta) -> bool:
+        """Whether the guild's warnings up to `age` old are held in memory."""
+        return self._recent_ages.get(guild_id, -1) >= age.total_seconds()
+
+    @pooled_read
+    async def load_recent(self, conn: Connection, guild_id: int, age: datetime.timedelta) -> None:
+        """Loads every user's warnings in a guild up to `age` old, with one aggregate query over the guild's recent
+        warnings."""
+        rows = await conn.fetch(
+            '''SELECT user_id, array_agg(ts ORDER BY ts, id) AS ts, array_agg(id ORDER BY ts, id) AS ids
+            FROM warns WHERE guild_id=$1 AND ts > $2 GROUP BY user_id;''',
+            guild_id, utcnow() - age
+        )
+        self._recent[guild_id] = {
+            r['user_id']: [(ts.timestamp(), id) for ts, id in zip(r['ts'], r['ids'])]
+            for r in rows
+        }
+        self._recent_ages[guild_id] = age.total_seconds()
+
+    def count_recent(self, guild_id: int, user_id: int, period: datetime.timedelta) -> int:
+        """Counts a user's warnings within `period`, which must be no longer than the age loaded for the guild."""
+        warns = self._recent.get(guild_id, {}).get(user_id)
+        if not warns:
+            return 0
+        return len(warns) - bisect_left(warns, ((utcnow() - period).timestamp(),))
+
+    def _add_recent(self, guild_id: int, user_id: int, ts: float, id: int) -> None:
+        users = self._recent.get(guild_id)
+        if users is None:
+            return
+
+        warns = users.setdefault(user_id, [])
+        # A warning made by this process is also seen through its change notification.
+        if any(i == id for _, i in warns):
+            return
+        insort(warns, (ts, id))
+
+        # Drop warnings that have aged out of what is held for the guild.
+        cutoff = utcnow().timestamp() - self._recent_ages[guild_id]
+        del warns[:bisect_left(warns, (cutoff,))]
+
+    def _remove_recent(self, guild_id: int, user_id: int, id: int) -> None:
+        warns = self._recent.get(guild_id, {}).get(user_id)
+        if warns:
+            warns[:] = [w for w in warns if w[1] != id]
+
+    async def on_change(self, event: 'ChangeEvent') -> None:
+        """Applies warning changes from any process to the recent warnings held in memory."""
+        if event.op == 'RESYNC':
+            self._recent.clear()
+            self._recent_ages.clear()
+            return
+
+        row = event.row
+        self._remove_recent(row['guild_id'], row['user_id'], row['id'])
+        if event.op != 'DELETE':
+            ts = datetime.datetime.fromisoformat(row['ts']).timestamp()
+            self._add_recent(row['guild_id'], row['user_id'], ts, row['id'])
@@ -0,0 +1,155 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional, Callable, Awaitable, Sequence
+
+import asyncpg
+
+from .bulk import copy_insert
+
+FlushFunc = Callable[[asyncpg.Connection, list[tuple]], Awaitable[None]]
+
+
+@dataclass
+class _TableBuffer:
+    table: str
+    columns: tuple[str, ...]
+    flush: Optional[FlushFunc]
+    batch_size: int
+    rows: list[tuple] = field(default_factory=list)
+    failing: bool = False
+    # Held while a batch is written, so that a flush also waits for a batch already being written.
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class WriteBehindQueue:
+    """Buffers non-critical inserts and writes them in batches, so that callers never wait on the database.
+
+    Each table is registered with its columns, and optionally with a function to write a batch of rows, which runs in a
+    transaction. Tables without one are written with a single COPY. A table's rows are written once `batch_size` of them
+    are buffered, or every `interval` seconds otherwise.
+
+    Once `max_size` rows are queued or buffered (for example while the database is unavailable), `put` waits until
+    they are written. Rows that fail to be written are kept and retried on the next interval.
+    """
+    def __init__(
+            self,
+            pool: asyncpg.Pool,
+            max_size: int = 10_000,
+            batch_size: int = 500,
+            interval: float = 5.0,
+            on_error: Optional[Callable[[str, Exception], None]] = None
+    ) -> None:
+        self.pool = pool
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_error = on_error
+
+        self._tables: dict[str, _TableBuffer] = {}
+        self._queue: asyncio.Queue[tuple[str, tuple]] = asyncio.Queue(max_size)
+        self._worker: Optional[asyncio.Task] = None
+
+    def register(
+            self,
+            table: str,
+            columns: Sequence[str],
+            flush: Optional[FlushFunc] = None,
+            batch_size: Optional[int] = None
+    ) -> None:
+        self._tables[table] = _TableBuffer(table, tuple(columns), flush, batch_size or self.batch_size)
+
+    @property
+    def buffered(self) -> int:
+        return sum(len(t.rows) for t in self._tables.values())
+
+    async def put(self, table: str, row: tuple) -> None:
+        if table not in self._tables:
+            raise KeyError(f'Table "{table}" is not registered with the write-behind queue.')
+        await self._queue.put((table, row))
+
+    async def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def flush(self, table: Optional[str] = None) -> None:
+        """Writes every buffered row, or only those for `table`, including rows still waiting in the queue.
+
+        Returns once those rows, and any batch of the same tables already being written, are committed.
+        """
+        self._drain_queue()
+        tables = [self._tables[table]] if table else list(self._tables.values())
+        for buffer in tables:
+            await self._flush_table(buffer)
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        self._drain_queue()
+        for buffer in self._tables.values():
+            try:
+                await self._flush_table(buffer, raise_errors=True)
+            except Exception as e:
+                self._report(buffer.table, e)
+
+    def _drain_queue(self) -> None:
+        while not self._queue.empty():
+            table, row = self._queue.get_nowait()
+            self._tables[table].rows.append(row)
+
+    async def _flush_table(self, buffer: _TableBuffer, raise_errors: bool = False) -> None:
+        async with buffer.lock:
+            if not buffer.rows:
+                return
+
+            rows, buffer.rows = buffer.rows, []
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        if buffer.flush is not None:
+                            await buffer.flush(conn, rows)
+                        else:
+                            await copy_insert(conn, buffer.table, buffer.columns, rows)
+                buffer.failing = False
+            except BaseException as e:
+                # Nothing in the batch was committed, so keep it to retry.
+                buffer.rows = rows + buffer.rows
+                buffer.failing = True
+                if raise_errors or not isinstance(e, Exception):
+                    raise
+                self._report(buffer.table, e)
+
+    def _report(self, table: str, error: Exception) -> None:
+        if self.on_error is None:
+            raise error
+        self.on_error(table, error)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.interval
+        while True:
+            timeout = deadline - loop.time()
+            # Stop taking rows from the queue while too many are buffered, so that `put` applies backpressure.
+            if timeout > 0 and self.buffered < self.max_size:
+                try:
+                    table, row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    continue
+
+                buffer = self._tables[table]
+                buffer.rows.append(row)
+                # After a failed write, only retry on the interval rather than on every new row.
+                if len(buffer.rows) >= buffer.batch_size and not buffer.failing:
+                    await self._flush_table(buffer)
+                continue
+
+            if timeout > 0:
+                await asyncio.sleep(timeout)
+            for buffer in self._tables.values():
+                await self._flush_table(buffer)
+            deadline = loop.time() + self.interval
@@ -1,12 +1,61 @@
+from dataclasses import fields
 from functools import wraps
-from secrets import SystemRandom
+from operator import itemgetter
+from typing import Optional, Sequence, Callable, Generic, Type, TypeVar
 
 import asyncpg
 
-_id_gen = SystemRandom()
+T = TypeVar('T')
+
+# Number of IDs reserved by each `nextval` on an ID sequence. Must match the sequence's `INCREMENT BY`.
+ID_BLOCK_SIZE = 100
+
+
+class RowDecoder(Generic[T]):
+    """Builds model dataclasses from records positionally, rather than unpacking every record as keyword arguments.
+
+    `select` is the model's explicit column list, in field order, for use in queries. Selecting explicit columns keeps
+    each query's text, and so asyncpg's per-connection prepared statement for it, stable as tables gain columns.
+    A constructor is picked once per row shape: records in field order are passed straight through, while records with
+    their columns in another order are reordered by name.
+    """
+    def __init__(self, cls: Type[T], columns: Optional[Sequence[str]] = None) -> None:
+        self.cls = cls
+        self.columns = tuple(columns or (f.name for f in fields(cls)))
+        self.select = ', '.join(self.columns)
+
+        self._constructors: dict[tuple[str, ...], Callable[[asyncpg.Record], T]] = {}
+
+    def _constructor(self, record: asyncpg.Record) -> Callable[[asyncpg.Record], T]:
+        shape = tuple(record.keys())
+        constructor = self._constructors.get(shape)
+        if constructor is None:
+            cls = self.cls
+            if shape == self.columns:
+                def constructor(r: asyncpg.Record) -> T:
+                    return cls(*r)
+            else:
+                order = itemgetter(*self.columns)
+
+                def constructor(r: asyncpg.Record) -> T:
+                    return cls(*order(r))
+            self._constructors[shape] = constructor
+        return constructor
+
+    def one(self, record: Optional[asyncpg.Record]) -> Optional[T]:
+        if record is None:
+            return None
+        return self._constructor(record)(record)
+
+    def many(self, records: list[asyncpg.Record]) -> list[T]:
+        if not records:
+            return []
+        constructor = self._constructor(records[0])
+        return [constructor(r) for r in records]
 
 
 def pooled_query(method):
+    """Runs the method inside a transaction on a connection from the primary pool. Use this for writes."""
     @wraps(method)
     async def decorator(self, *args, **kwargs):
         async with self.pool.acquire() as conn:
@@ -16,25 +65,91 @@ def pooled_query(method):
     return decorator
 
 
+def pooled_read(method):
+    """Runs the method on a connection from the primary pool without opening a transaction.
+
+    Use this for reads that must see the latest writes, such as reading back a row that was just inserted.
+    """
+    @wraps(method)
+    async def decorator(self, *args, **kwargs):
+        async with self.pool.acquire() as conn:
+            return await method(self, conn, *args, **kwargs)
+
+    return decorator
+
+
+def pooled_replica_read(method):
+    """Runs the method without a transaction on the read pool, which may be a replica lagging behind the primary."""
+    @wraps(method)
+    async def decorator(self, *args, **kwargs):
+        async with self.read_pool.acquire() as conn:
+            return await method(self, conn, *args, **kwargs)
+
+    return decorator
+
+
+class IdAllocator:
+    """Hands out unique IDs from blocks reserved on a Postgres sequence.
+
+    The sequence increments by `block_size`, so each `nextval` reserves a whole block of IDs for this process. Only one
+    in every `block_size` IDs costs a round trip, and that round trip is made on the connection already in use.
+    """
+    def __init__(self, sequence: str, block_size: int = ID_BLOCK_SIZE) -> None:
+        self.sequence = sequence
+        self.block_size = block_size
+
+        self._next = 0
+        self._end = 0
+
+    def _take(self, n: int) -> list[int]:
+        count = min(n, self._end - self._next)
+        ids = list(range(self._next, self._next + count))
+        self._next += count
+        return ids
+
+    async def next(self, conn: asyncpg.Connection) -> int:
+        return (await self.allocate(conn, 1))[0]
+
+    async def allocate(self, conn: asyncpg.Connection, n: int) -> list[int]:
+        """Gets `n` unique IDs, reserving all of the blocks needed in a single round trip."""
+        ids = self._take(n)
+        if len(ids) == n:
+            return ids
+
+        blocks = -(-(n - len(ids)) // self.block_size)
+        starts = await conn.fetch(
+            '''SELECT nextval($1::regclass) FROM generate_series(1, $2);''',
+            self.sequence, blocks
+        )
+        for (start,) in starts:
+            self._next, self._end = start, start + self.block_size
+            ids += self._take(n - len(ids))
+
+        return ids
+
+
+_id_allocators: dict[str, IdAllocator] = {}
+
+
+def get_id_allocator(table: str) -> IdAllocator:
+    """Gets the ID allocator for a table, which reserves IDs from the `<table>_id_blocks` sequence."""
+    allocator = _id_allocators.get(table)
+    if allocator is None:
+        allocator = _id_allocators[table] = IdAllocator(f'{table}_id_blocks')
+    return allocator
+
+
 def pooled_with_new_id_safe(table: str):
+    """Runs the method like `pooled_query`, passing it a new unique ID for a row in `table`."""
+    allocator = get_id_allocator(table)
+
     def inner(func):
         @wraps(func)
         @pooled_query
         async def decorator(wrapped_self, conn: asyncpg.Connection, *args, **kwargs):
-            id = get_random_bigint()
-            while await id_is_taken(conn, id, table):
-                id = get_random_bigint()
-
+            id = await allocator.next(conn)
             return await func(wrapped_self, conn, id, *args, **kwargs)
 
         return decorator
 
     return inner
-
-
-async def id_is_taken(conn: asyncpg.Connection, id: int, table: str) -> bool:
-    return await conn.fetchval(f'''SELECT EXISTS(SELECT 1 FROM {table} WHERE id=$1);''', id)
-
-
-def get_random_bigint() -> int:
-    return _id_gen.randint(0, 9223372036854775807)
\ No newline at end of file
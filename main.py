@@ -5,6 +5,7 @@ import discord
 import dotenv
 
 from templates import Bot
+from templates.bot import LocalShortenerBackend
 from utils import EmbedFactory
 
 
@@ -31,11 +32,16 @@ if __name__ == "__main__":
         db_name=os.getenv('POSTGRES_DB_NAME'),
         db_user=os.getenv('POSTGRES_DB_USER'),
         db_pass=os.getenv('POSTGRES_DB_PASS'),
+        db_replica_host=os.getenv('POSTGRES_DB_REPLICA_HOST'),
+        db_replica_port=os.getenv('POSTGRES_DB_REPLICA_PORT'),
 
         embed_factory=EmbedFactory(
             color=discord.Colour.from_str(os.getenv('BOT_COLOR'))
         ),
 
+        # Shorten URLs locally, without calling an external service, when testing.
+        shortener_backend=LocalShortenerBackend() if os.getenv('URL_SHORTENER_BACKEND') == 'local' else None,
+
         cogs=cogs,
         cog_params={
             "Twitter": {
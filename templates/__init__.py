@@ -2,8 +2,8 @@ from .bot import Bot, Cog, Interaction, GroupCog
 
 from .commands import Command, Group
 
-from .types import Emoji, Permission, RoleSortOption, BulkRoleTargetOption, Message, TwitterUserField, \
-    TwitterTweetField, TwitterMediaField
+from .types import Emoji, Permission, RoleSortOption, BulkRoleTargetOption, RaidActionOption, WarnActionOption, \
+    Message, TwitterUserField, TwitterTweetField, TwitterMediaField
 
 from .sub import decorators, checks, transformers, helpcommand as helpmenu
 
@@ -12,6 +12,8 @@ debug = Bot.debug
 __all__ = [
     'Bot',
     'BulkRoleTargetOption',
+    'RaidActionOption',
+    'WarnActionOption',
     'Cog',
     'Interaction',
     'Command',
@@ -1,19 +1,24 @@
+from abc import ABC, abstractmethod
 import asyncio
+from collections import OrderedDict
+from hashlib import sha256
 import traceback
 from typing import Optional, Any, Type, Union, List, Dict, Mapping, TypeVar, Generator, ClassVar, TYPE_CHECKING
 
+import aiohttp
 import asyncpg
 import discord
 from discord import app_commands
 from discord.ext import commands
 from discord.utils import MISSING
-from pyshorteners import Shortener
 
 import database
 from database.models.twitter_monitors import TwitterMonitor
 from utils import LogType, EmbedFactory, log, command_name, TermColor as color
 from .commands import Command, Group
-from .errors import TransformerError
+from .errors import TransformerError, ShortenerError
+from .http import HTTPClientManager
+from .scheduler import Scheduler
 
 if TYPE_CHECKING:
     from tweepy.asynchronous import AsyncClient
@@ -300,8 +305,83 @@ class CommandTree(app_commands.CommandTree):
                     yield command
 
 
+class ShortenerBackend(ABC):
+    """A service that turns long URLs into short ones."""
+    name: str
+
+    @abstractmethod
+    async def shorten(self, session: aiohttp.ClientSession, url: str, timeout: aiohttp.ClientTimeout) -> str:
+        ...
+
+
+class TinyURLBackend(ShortenerBackend):
+    name = 'tinyurl'
+    api_url = 'https://tinyurl.com/api-create.php'
+
+    async def shorten(self, session: aiohttp.ClientSession, url: str, timeout: aiohttp.ClientTimeout) -> str:
+        async with session.get(self.api_url, params={'url': url}, timeout=timeout) as r:
+            r.raise_for_status()
+            return (await r.text()).strip()
+
+
+class LocalShortenerBackend(ShortenerBackend):
+    """A stand-in backend that never touches the network, for testing."""
+    name = 'local'
+
+    def __init__(self, base_url: str = 'https://short.local/') -> None:
+        self.base_url = base_url
+
+    async def shorten(self, session: aiohttp.ClientSession, url: str, timeout: aiohttp.ClientTimeout) -> str:
+        return self.base_url + sha256(url.encode()).hexdigest()[:8]
+
+
+class URLShortener:
+    """Shortens URLs without blocking the event loop.
+
+    Results are cached in memory, and persisted in the database so that a URL is only ever sent to the backend once.
+    """
+    def __init__(
+            self,
+            bot: 'Bot',
+            backend: ShortenerBackend = None,
+            timeout: float = 5.0,
+            cache_size: int = 1024
+    ) -> None:
+        self.bot = bot
+        self.backend = backend or TinyURLBackend()
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, str] = OrderedDict()
+
+    def _remember(self, url: str, short: str) -> None:
+        self._cache[url] = short
+        self._cache.move_to_end(url)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def short(self, url: str) -> str:
+        short = self._cache.get(url)
+        if short:
+            self._cache.move_to_end(url)
+            return short
+
+        short = await self.bot.db.short_urls.get_short_url(self.backend.name, url)
+        if not short:
+            try:
+                short = await self.backend.shorten(self.bot.http_clients.session(), url, self.timeout)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise ShortenerError(url, self.backend.name) from e
+            await self.bot.db.short_urls.insert(self.backend.name, url, short)
+
+        self._remember(url, short)
+        return short
+
+
 class Bot(commands.Bot):
     db: Optional[database.Client]
+    scheduler: Scheduler
+    http_clients: HTTPClientManager
+    url_shortener: URLShortener
     command_autocomplete_list: Dict[str, Union[Cog, Command, Group]]
     cogs: Mapping[str, Cog]
     tree: CommandTree
@@ -323,16 +403,21 @@ class Bot(commands.Bot):
             db_port: Union[str, int],
             db_user: str,
             db_pass: str,
+            db_replica_host: Optional[str] = None,
+            db_replica_port: Optional[Union[str, int]] = None,
             tree_cls: Type[app_commands.CommandTree] = CommandTree,
             embed_factory: EmbedFactory = EmbedFactory(),
             cogs: list[str] = None,
             cog_params: dict[str, dict[str, str]] = None,
+            shortener_backend: ShortenerBackend = None,
     ) -> None:
         intents = Intents.default()
         intents.update(
             members=True,
             presences=True,
-            reactions=True
+            reactions=True,
+            # The spam filter and purge filters read message text.
+            message_content=True
         )
 
         # Register internal constants
@@ -347,12 +432,21 @@ class Bot(commands.Bot):
         self._db_port = db_port
         self._db_user = db_user
         self._db_pass = db_pass
+        self._db_replica_host = db_replica_host
+        self._db_replica_port = db_replica_port or db_port
+        self.db = None
+
+        # Register the scheduler for timed jobs, which is started once the database is connected.
+        self.scheduler = Scheduler(self)
 
         # Register embed factory.
         self.embeds = embed_factory
 
-        # Register URL shortener
-        self.url_shorter = Shortener()
+        # Register the outbound HTTP client manager, shared by every API client.
+        self.http_clients = HTTPClientManager()
+
+        # Register URL shortener.
+        self.url_shortener = URLShortener(self, shortener_backend)
 
         super().__init__(
             command_prefix=command_prefix,
@@ -371,10 +465,25 @@ class Bot(commands.Bot):
             user=self._db_user,
             password=self._db_pass
         )
-        self.db = database.Client(pool)
+        read_pool = None
+        if self._db_replica_host:
+            self.log('Connecting to PostgreSQL read replica...')
+            read_pool = await asyncpg.create_pool(
+                host=self._db_replica_host,
+                port=self._db_replica_port,
+                database=self._db_name,
+                user=self._db_user,
+                password=self._db_pass
+            )
+        self.db = database.Client(pool, read_pool)
+        self.db.notifications.on_error = self.on_change_event_error
+        self.db.write_queue.on_error = self.on_write_queue_error
+        self.db.bans.on_error = self.on_ban_name_load_error
         self.log('Initializing database...')
-        await self.db.initialize()
+        for migration in await self.db.initialize():
+            self.log(f'Applied database migration {migration.version}: {migration.name}', nest=1)
         self.log('Database connected and loaded.', log_type=LogType.ok, divider=True)
+        await self.scheduler.start()
 
         # Register Cog extensions.
         self.log('Loading cogs...')
@@ -388,6 +497,37 @@ class Bot(commands.Bot):
         # Generate embeds for the help command.
         self.command_autocomplete_list = self.get_command_autocomplete_list()
 
+    async def close(self) -> None:
+        await super().close()
+        await self.http_clients.close()
+        if self.db:
+            await self.scheduler.close()
+            await self.db.close()
+
+    def on_write_queue_error(self, table: str, error: Exception) -> None:
+        self.log(
+            f'Unhandled "{type(error).__name__}" writing queued rows to "{table}"',
+            log_type=LogType.error,
+            error=error,
+            divider=True
+        )
+
+    def on_ban_name_load_error(self, error: Exception) -> None:
+        self.log(
+            f'Unhandled "{type(error).__name__}" in background task "load active ban names"',
+            log_type=LogType.error,
+            error=error,
+            divider=True
+        )
+
+    def on_change_event_error(self, event: database.ChangeEvent, error: Exception) -> None:
+        self.log(
+            f'Unhandled "{type(error).__name__}" handling {event.op} change event for "{event.table}"',
+            log_type=LogType.error,
+            error=error,
+            divider=True
+        )
+
     async def on_ready(self):
         self.log(
             f'Bot logged in as {self.user} (ID: {self.user.id})',
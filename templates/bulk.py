@@ -0,0 +1,178 @@
+import time
+from typing import Optional, Any, TYPE_CHECKING
+
+import discord
+
+from database.models.jobs import Job
+from utils import run_bounded, chunked
+from .types import BulkRoleTargetOption
+
+if TYPE_CHECKING:
+    from .bot import Bot, Interaction
+
+# Role changes for members of a guild share a rate limit bucket, which discord.py already waits on. A few requests in
+# flight are enough to keep the bucket busy, and more would only queue up behind it.
+BULK_ROLE_CONCURRENCY = 5
+# Members changed between checkpoints. A restarted operation redoes at most this many.
+BULK_ROLE_CHECKPOINT_SIZE = 25
+# Minimum seconds between edits of the progress message.
+BULK_ROLE_PROGRESS_INTERVAL = 5.0
+
+
+class BulkRoleOperations:
+    """Gives a role to, or takes a role from, many members of a guild at once.
+
+    Each operation runs as a scheduled job, so it is not bound to the interaction that started it and continues after a
+    restart. Members are changed in ID order, with the last one changed checkpointed in the job, so a resumed operation
+    picks up where it left off. Progress is shown by editing the interaction's ephemeral followup message, or by a
+    direct message to the member who started it once the interaction has expired, so that it is never made public.
+    """
+    JOB_TYPE = 'bulk_role'
+
+    def __init__(self, bot: 'Bot') -> None:
+        self.bot = bot
+        # Followup messages of operations started by this process, by job dedupe key.
+        self.progress: dict[str, discord.WebhookMessage] = {}
+
+    @staticmethod
+    def job_key(guild_id: int, role_id: int) -> str:
+        return f'{BulkRoleOperations.JOB_TYPE}:{guild_id}:{role_id}'
+
+    @staticmethod
+    def targets(
+            guild: discord.Guild,
+            role: discord.Role,
+            give: bool,
+            target: BulkRoleTargetOption,
+            after: int = 0
+    ) -> list[discord.Member]:
+        """Gets the members that still need the role given or taken, in ID order, skipping any up to `after`."""
+        members = (
+            m for m in guild.members
+            if m.id > after
+            and (target == BulkRoleTargetOption.all_users or m.bot == (target == BulkRoleTargetOption.bots))
+            and (m.get_role(role.id) is None) == give
+        )
+        return sorted(members, key=lambda m: m.id)
+
+    async def start(
+            self,
+            interaction: 'Interaction',
+            role: discord.Role,
+            give: bool,
+            target: BulkRoleTargetOption
+    ) -> int:
+        """Starts an operation, returning the number of members it will change.
+
+        The interaction must already be deferred. Starting an operation for a role with one already running replaces it.
+        """
+        count = len(self.targets(interaction.guild, role, give, target))
+        if count == 0:
+            return 0
+
+        payload = {
+            'guild_id': interaction.guild.id,
+            'role_id': role.id,
+            'give': give,
+            'target': target.value,
+            'user_id': interaction.user.id,
+            'message_id': None,
+            'after': 0,
+            'total': count,
+            'succeeded': 0,
+            'failed': 0,
+        }
+        key = self.job_key(interaction.guild.id, role.id)
+        self.progress[key] = await interaction.followup.send(
+            embed=self.progress_embed(role, payload), ephemeral=True, wait=True
+        )
+        await self.bot.scheduler.schedule(self.JOB_TYPE, payload, discord.utils.utcnow(), dedupe_key=key)
+        return count
+
+    async def run(self, job: Job) -> None:
+        await self.bot.wait_until_ready()
+        payload = dict(job.payload)
+        key = self.job_key(payload['guild_id'], payload['role_id'])
+
+        guild = self.bot.get_guild(payload['guild_id'])
+        role = guild.get_role(payload['role_id']) if guild else None
+        if role is None:
+            self.progress.pop(key, None)
+            return
+
+        give = payload['give']
+        targets = self.targets(guild, role, give, BulkRoleTargetOption(payload['target']), payload['after'])
+        reason = 'Bulk role give.' if give else 'Bulk role take.'
+
+        async def apply(member: discord.Member) -> None:
+            if give:
+                await member.add_roles(role, reason=reason)
+            else:
+                await member.remove_roles(role, reason=reason)
+
+        def record(member: discord.Member, error: Optional[Exception]) -> None:
+            if error is None:
+                payload['succeeded'] += 1
+            elif isinstance(error, discord.HTTPException):
+                payload['failed'] += 1
+            else:
+                raise error
+
+        last_report = time.monotonic()
+        for chunk in chunked(targets, BULK_ROLE_CHECKPOINT_SIZE):
+            await run_bounded(apply, chunk, BULK_ROLE_CONCURRENCY, record)
+            payload['after'] = chunk[-1].id
+
+            if time.monotonic() - last_report >= BULK_ROLE_PROGRESS_INTERVAL:
+                await self.report(key, role, payload)
+                last_report = time.monotonic()
+            if not await self.bot.scheduler.checkpoint(job, payload):
+                # Cancelled, or replaced by a newer operation for the same role.
+                self.progress.pop(key, None)
+                return
+
+        await self.report(key, role, payload, finished=True)
+        self.progress.pop(key, None)
+
+    def progress_embed(self, role: discord.Role, payload: dict[str, Any], finished: bool = False) -> discord.Embed:
+        give = payload['give']
+        done = payload['succeeded'] + payload['failed']
+        if finished:
+            description = f'{"Gave" if give else "Took"} {role.mention} {"to" if give else "from"} ' \
+                          f'{payload["succeeded"]} members.'
+        else:
+            description = f'{"Giving" if give else "Taking"} {role.mention} {"to" if give else "from"} members: ' \
+                          f'`{done}/{payload["total"]}`'
+        if payload['failed']:
+            description += f'\n\nFailed to {"give" if give else "take"} the role for {payload["failed"]} members.'
+        return self.bot.embeds.get(description=description)
+
+    async def report(self, key: str, role: discord.Role, payload: dict[str, Any], finished: bool = False) -> None:
+        emb = self.progress_embed(role, payload, finished)
+
+        message = self.progress.get(key)
+        if message is not None:
+            try:
+                await message.edit(embed=emb)
+                return
+            except discord.HTTPException:
+                # The interaction token has expired, so fall back to a direct message.
+                self.progress.pop(key, None)
+
+        # Operations started before progress moved to direct messages have no user to report to.
+        if payload.get('user_id') is None:
+            return
+        try:
+            user = self.bot.get_user(payload['user_id']) or await self.bot.fetch_user(payload['user_id'])
+            channel = user.dm_channel or await user.create_dm()
+            # Role mentions don't render outside of the guild, so name them in the title.
+            emb.title = f'Bulk Role: {role.name} in {role.guild.name}'
+            if payload['message_id'] is not None:
+                try:
+                    await channel.get_partial_message(payload['message_id']).edit(embed=emb)
+                    return
+                except discord.NotFound:
+                    pass
+            payload['message_id'] = (await channel.send(embed=emb)).id
+        except discord.HTTPException:
+            pass
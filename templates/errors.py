@@ -36,6 +36,15 @@ class TwitterError(Exception):
         super().__init__(msg)
 
 
+# ---------- URL Shortener Error ----------
+class ShortenerError(Exception):
+    def __init__(self, url: str, backend: str) -> None:
+        self.url = url
+        self.backend = backend
+
+        super().__init__(f"Failed to shorten `{url}` using `{backend}`")
+
+
 # ---------- DnD Errors ----------
 class SchemaError(Exception):
     def __init__(self, *, endpoint: str = None, index: str = None) -> None:
@@ -0,0 +1,143 @@
+import asyncio
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Optional, Any
+
+import aiohttp
+
+# Connector settings for each kind of outbound traffic. API clients share the `default` connector, while long-lived
+# streaming connections get their own so that they can never starve regular requests of connections.
+CONNECTOR_PROFILES: dict[str, dict[str, Any]] = {
+    'default': {
+        'limit': 100,
+        'limit_per_host': 10,
+        'keepalive_timeout': 30,
+        'ttl_dns_cache': 300,
+    },
+    'streaming': {
+        'limit': 10,
+        'limit_per_host': 2,
+        'keepalive_timeout': 90,
+        'ttl_dns_cache': 300,
+        'enable_cleanup_closed': True,
+    },
+}
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    errors: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    @property
+    def average_latency(self) -> float:
+        return self.total_latency / self.requests if self.requests else 0.0
+
+    @property
+    def reuse_rate(self) -> float:
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+
+class HTTPClientManager:
+    """Owns the connectors and sessions used for every outbound HTTP request the bot makes.
+
+    Connectors are tuned per profile (see `CONNECTOR_PROFILES`), resolve DNS through `aiodns` with caching, and keep
+    connections alive between requests. Every session is traced, so connection reuse and latency can be inspected
+    per host through `stats`.
+    """
+    def __init__(self, profiles: dict[str, dict[str, Any]] = None) -> None:
+        self.profiles = profiles or CONNECTOR_PROFILES
+        self.stats: dict[str, HostStats] = {}
+
+        self._connectors: dict[str, aiohttp.TCPConnector] = {}
+        self._sessions: dict[str, aiohttp.ClientSession] = {}
+        self._trace_config = self._build_trace_config()
+
+    def connector(self, profile: str = 'default') -> aiohttp.TCPConnector:
+        """Gets the shared connector for a profile. Must be called while the event loop is running."""
+        connector = self._connectors.get(profile)
+        if connector is None or connector.closed:
+            connector = aiohttp.TCPConnector(resolver=aiohttp.AsyncResolver(), **self.profiles[profile])
+            self._connectors[profile] = connector
+        return connector
+
+    def session_kwargs(self, profile: str = 'default') -> dict[str, Any]:
+        """The arguments needed to build a `ClientSession` (or subclass) on top of a shared connector."""
+        return {
+            'connector': self.connector(profile),
+            'connector_owner': False,
+            'trace_configs': [self._trace_config],
+        }
+
+    def session(self, name: str = 'default', profile: str = 'default', **kwargs) -> aiohttp.ClientSession:
+        """Gets the named session, creating it on the given connector profile if needed."""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(**self.session_kwargs(profile), **kwargs)
+            self._sessions[name] = session
+        return session
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        for connector in self._connectors.values():
+            if not connector.closed:
+                await connector.close()
+
+        self._sessions.clear()
+        self._connectors.clear()
+
+    def _host_stats(self, host: Optional[str]) -> HostStats:
+        host = host or 'unknown'
+        stats = self.stats.get(host)
+        if stats is None:
+            stats = self.stats[host] = HostStats()
+        return stats
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(
+                session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceRequestStartParams
+        ) -> None:
+            ctx.host = params.url.host
+            ctx.start = asyncio.get_running_loop().time()
+
+        async def on_request_end(
+                session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceRequestEndParams
+        ) -> None:
+            latency = asyncio.get_running_loop().time() - ctx.start
+            stats = self._host_stats(ctx.host)
+            stats.requests += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+        async def on_request_exception(
+                session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceRequestExceptionParams
+        ) -> None:
+            self._host_stats(ctx.host).errors += 1
+
+        async def on_connection_create_end(
+                session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceConnectionCreateEndParams
+        ) -> None:
+            self._host_stats(ctx.host).connections_created += 1
+
+        async def on_connection_reuseconn(
+                session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceConnectionReuseconnParams
+        ) -> None:
+            self._host_stats(ctx.host).connections_reused += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.freeze()
+
+        return trace_config
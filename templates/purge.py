@@ -0,0 +1,136 @@
+import re
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional, Callable, Awaitable, Union
+
+import discord
+
+from utils import run_bounded
+
+# Discord only bulk deletes messages younger than 14 days. The margin covers the time taken to scan and delete.
+PURGE_BULK_MAX_AGE = timedelta(days=14) - timedelta(minutes=10)
+# The most messages a single bulk delete request takes.
+PURGE_BULK_SIZE = 100
+# Older messages are deleted one request at a time, sharing a per-channel rate limit bucket that discord.py waits on.
+PURGE_CONCURRENCY = 3
+# Minimum seconds between progress reports.
+PURGE_PROGRESS_INTERVAL = 5.0
+
+URL_PATTERN = re.compile(r'https?://\S+', re.IGNORECASE)
+
+PurgeChannel = Union[discord.TextChannel, discord.Thread, discord.VoiceChannel]
+
+
+@dataclass
+class PurgeFilter:
+    """Which messages to purge. Every filter that is set must match, and pinned messages are always kept."""
+    user_id: Optional[int] = None
+    pattern: Optional[re.Pattern] = None
+    contains: Optional[str] = None
+    links: bool = False
+    attachments: bool = False
+    bots: bool = False
+
+    def __call__(self, message: discord.Message) -> bool:
+        return not (
+            message.pinned
+            or (self.user_id is not None and message.author.id != self.user_id)
+            or (self.bots and not message.author.bot)
+            or (self.attachments and not message.attachments)
+            or (self.contains is not None and self.contains not in message.content.lower())
+            or (self.links and not URL_PATTERN.search(message.content))
+            or (self.pattern is not None and not self.pattern.search(message.content))
+        )
+
+
+class MessagePurge:
+    """Deletes the messages matching a filter from a channel's recent history.
+
+    History is scanned newest first, a page of 100 messages per request. Matches younger than 14 days are deleted in
+    bulk, up to 100 per request, and older matches are deleted individually with bounded concurrency. Matches are
+    deleted as each batch fills, so memory stays bounded however much history is scanned. In a dry run, matches are
+    only counted.
+    """
+    def __init__(
+            self,
+            channel: PurgeChannel,
+            predicate: Callable[[discord.Message], bool],
+            limit: int,
+            before: Optional[discord.abc.Snowflake] = None,
+            reason: Optional[str] = None,
+            dry_run: bool = False
+    ) -> None:
+        self.channel = channel
+        self.predicate = predicate
+        self.limit = limit
+        self.before = before
+        self.reason = reason
+        self.dry_run = dry_run
+
+        self.scanned = 0
+        self.matched = 0
+        self.matched_old = 0
+        self.deleted = 0
+        self.failed = 0
+        self.finished = False
+
+    async def run(self, on_progress: Optional[Callable[['MessagePurge'], Awaitable[None]]] = None) -> None:
+        cutoff = discord.utils.utcnow() - PURGE_BULK_MAX_AGE
+        recent: list[discord.Message] = []
+        old: list[discord.Message] = []
+        last_report = time.monotonic()
+
+        async for message in self.channel.history(limit=self.limit, before=self.before):
+            self.scanned += 1
+            if self.predicate(message):
+                self.matched += 1
+                is_old = message.created_at < cutoff
+                self.matched_old += is_old
+                # A dry run only counts, so it keeps no messages at all.
+                if not self.dry_run:
+                    (old if is_old else recent).append(message)
+
+            if not self.dry_run:
+                if len(recent) >= PURGE_BULK_SIZE:
+                    await self.delete_recent(recent)
+                    recent = []
+                if len(old) >= PURGE_BULK_SIZE:
+                    await self.delete_old(old)
+                    old = []
+
+            if on_progress is not None and time.monotonic() - last_report >= PURGE_PROGRESS_INTERVAL:
+                await on_progress(self)
+                last_report = time.monotonic()
+
+        if not self.dry_run:
+            await self.delete_recent(recent)
+            await self.delete_old(old)
+
+        self.finished = True
+        if on_progress is not None:
+            await on_progress(self)
+
+    async def delete_recent(self, messages: list[discord.Message]) -> None:
+        if not messages:
+            return
+        try:
+            await self.channel.delete_messages(messages, reason=self.reason)
+            self.deleted += len(messages)
+        except discord.HTTPException:
+            # A message deleted by someone else fails the whole batch, so fall back to deleting them one by one.
+            await self.delete_old(messages)
+
+    async def delete_old(self, messages: list[discord.Message]) -> None:
+        if not messages:
+            return
+
+        def record(message: discord.Message, error: Optional[Exception]) -> None:
+            if error is None or isinstance(error, discord.NotFound):
+                self.deleted += 1
+            elif isinstance(error, discord.HTTPException):
+                self.failed += 1
+            else:
+                raise error
+
+        await run_bounded(lambda m: m.delete(), messages, PURGE_CONCURRENCY, record)
@@ -0,0 +1,6 @@
+from .scheduler import Scheduler, JobHandler
+
+__all__ = [
+    'Scheduler',
+    'JobHandler',
+]
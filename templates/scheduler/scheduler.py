@@ -0,0 +1,210 @@
+import asyncio
+import datetime
+import os
+import secrets
+import socket
+from typing import Optional, Any, Callable, Awaitable, TYPE_CHECKING
+
+from discord.utils import utcnow
+
+from database.models.jobs import Job
+from utils import LogType, TimerHeap
+
+if TYPE_CHECKING:
+    from templates import Bot
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class Scheduler:
+    """Runs timed jobs stored in the `jobs` table, shared safely by any number of bot processes.
+
+    Jobs due within `horizon` are claimed with a lease and held in an in-memory due-queue until their time comes, so a
+    job runs on time without polling the table for it. The table is only polled every `poll_interval` to pick up jobs
+    scheduled by other processes, or whose lease ran out because the process holding them stopped.
+
+    A job runs the handler registered for its type. A handler that raises is retried with exponential backoff, up to
+    the job's `max_attempts`. A running job's lease is renewed in the background for as long as its handler runs, so it
+    is only claimed again if this process stops. Long-running handlers should call `checkpoint` periodically, which
+    saves their progress for a retry to resume from.
+    """
+    def __init__(
+            self,
+            bot: 'Bot',
+            poll_interval: float = 30.0,
+            horizon: float = 60.0,
+            lease: float = 60.0,
+            base_backoff: float = 10.0,
+            max_backoff: float = 3600.0
+    ) -> None:
+        self.bot = bot
+        self.poll_interval = poll_interval
+        self.horizon = datetime.timedelta(seconds=horizon)
+        self.lease = datetime.timedelta(seconds=lease)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        # Identifies this process's leases.
+        self.worker = f'{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}'
+
+        self._handlers: dict[str, JobHandler] = {}
+        self._due: TimerHeap[int] = TimerHeap()
+        self._claimed: dict[int, Job] = {}
+        self._running: set[asyncio.Task] = set()
+        self._poll_now = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def register(self, type: str, handler: JobHandler) -> None:
+        self._handlers[type] = handler
+        self._poll_now.set()
+
+    def unregister(self, type: str) -> None:
+        self._handlers.pop(type, None)
+
+    async def schedule(
+            self,
+            type: str,
+            payload: dict[str, Any],
+            run_at: datetime.datetime,
+            dedupe_key: Optional[str] = None,
+            max_attempts: int = 5
+    ) -> Job:
+        """Schedules a job. Scheduling with the `dedupe_key` of an unfinished job replaces that job."""
+        job = await self.bot.db.jobs.enqueue(type, payload, run_at, dedupe_key, max_attempts)
+        self._forget(job.id)
+        if run_at - utcnow() <= self.horizon:
+            self._poll_now.set()
+        return job
+
+    async def schedule_many(
+            self,
+            type: str,
+            jobs: list[tuple[dict[str, Any], datetime.datetime, Optional[str]]],
+            max_attempts: int = 5
+    ) -> list[Job]:
+        """Schedules many jobs of one type in a single query, given as (payload, run_at, dedupe_key)."""
+        if not jobs:
+            return []
+
+        scheduled = await self.bot.db.jobs.enqueue_many(type, jobs, max_attempts)
+        for job in scheduled:
+            self._forget(job.id)
+        if min(run_at for _, run_at, _ in jobs) - utcnow() <= self.horizon:
+            self._poll_now.set()
+        return scheduled
+
+    async def cancel(self, dedupe_key: str) -> bool:
+        ids = await self.bot.db.jobs.cancel(dedupe_key)
+        for id in ids:
+            self._forget(id)
+        return bool(ids)
+
+    async def checkpoint(self, job: Job, payload: dict[str, Any]) -> bool:
+        """Saves a running job's payload, returning False if the job was cancelled or replaced and should stop."""
+        if not await self.bot.db.jobs.checkpoint(job.id, self.worker, payload, self.lease):
+            return False
+        job.payload = payload
+        return True
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._poll()), asyncio.create_task(self._dispatch())]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Hand back claimed jobs that have not started, so that another process doesn't have to wait out the lease.
+        if self._claimed:
+            ids = list(self._claimed)
+            self._claimed.clear()
+            self._due.clear()
+            try:
+                await self.bot.db.jobs.release(ids, self.worker)
+            except Exception as error:
+                self._log_error('releasing claimed jobs', error)
+
+    def _forget(self, id: int) -> None:
+        self._claimed.pop(id, None)
+        self._due.cancel(id)
+
+    def _backoff(self, attempts: int) -> datetime.timedelta:
+        return datetime.timedelta(seconds=min(self.base_backoff * 2 ** max(attempts - 1, 0), self.max_backoff))
+
+    def _log_error(self, action: str, error: Exception) -> None:
+        self.bot.log(
+            f'Unhandled "{type(error).__name__}" in scheduler {action}',
+            log_type=LogType.error,
+            error=error,
+            divider=True
+        )
+
+    async def _poll(self) -> None:
+        while True:
+            self._poll_now.clear()
+            if self._handlers:
+                try:
+                    jobs = await self.bot.db.jobs.claim(self.worker, list(self._handlers), self.horizon, self.lease)
+                except Exception as error:
+                    self._log_error('claiming jobs', error)
+                else:
+                    for job in jobs:
+                        self._claimed[job.id] = job
+                        self._due.schedule(job.id, job.run_at)
+
+            try:
+                await asyncio.wait_for(self._poll_now.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self) -> None:
+        while True:
+            id = await self._due.wait()
+            job = self._claimed.pop(id, None)
+            if job is not None:
+                task = asyncio.create_task(self._run(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _run(self, job: Job) -> None:
+        handler = self._handlers.get(job.type)
+        try:
+            # The job may have been cancelled or replaced since it was claimed.
+            if handler is None or not await self.bot.db.jobs.start(job.id, self.worker, self.lease):
+                return
+        except Exception as error:
+            self._log_error(f'starting job {job.id} ({job.type})', error)
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await handler(job)
+        except Exception as error:
+            self._log_error(f'running job {job.id} ({job.type})', error)
+            try:
+                await self.bot.db.jobs.fail(
+                    job.id, self.worker, f'{type(error).__name__}: {error}',
+                    utcnow() + self._backoff(job.attempts + 1)
+                )
+            except Exception as e:
+                self._log_error(f'recording failure of job {job.id} ({job.type})', e)
+        else:
+            try:
+                await self.bot.db.jobs.complete(job.id, self.worker)
+            except Exception as error:
+                self._log_error(f'completing job {job.id} ({job.type})', error)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: Job) -> None:
+        # Renew well before the lease runs out, so that one slow or failed renewal doesn't lose it.
+        interval = self.lease.total_seconds() / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.bot.db.jobs.renew(job.id, self.worker, self.lease):
+                    return
+            except Exception as error:
+                self._log_error(f'renewing the lease of job {job.id} ({job.type})', error)
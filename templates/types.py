@@ -1,6 +1,9 @@
 import re
 from enum import Enum, Flag, auto
+from functools import lru_cache
+from math import comb, sqrt
 import random
+import secrets
 from typing import Optional, NamedTuple, List, Dict, Callable, TYPE_CHECKING, Union, Tuple
 
 import discord
@@ -219,6 +222,22 @@ class BulkRoleTargetOption(Enum):
     humans = 2
 
 
+# ---------- Raid Action Options ----------
+class RaidActionOption(Enum):
+    """The response to a detected raid."""
+    lockdown = 0
+    timeout = 1
+    ban = 2
+
+
+# ---------- Warn Action Options ----------
+class WarnActionOption(Enum):
+    """The action taken once a warning policy is reached, in order of severity."""
+    timeout = 0
+    kick = 1
+    ban = 2
+
+
 # ---------- Types ----------
 class Emoji(NamedTuple):
     """Represents an emoji found from a string.
@@ -317,6 +336,8 @@ DICE_ROLL_PATTERN = re.compile(
     r"(?P<num_die>\d+)?d(?P<num_sides>\d+)(?:\s?kh\s?(?P<kh>\d+)|\s?kl\s?(?P<kl>\d+))?(?:\s?\+\s?(?P<add>\d+)|\s?-\s?(?P<sub>\d+))?",
     re.IGNORECASE
 )
+# The largest amount of work (roughly, inner loop steps) an exact dice distribution is allowed to take.
+DICE_DISTRIBUTION_MAX_COMPLEXITY = 2_000_000
 
 
 class DiceRoll:
@@ -355,7 +376,7 @@ class DiceRoll:
         elif num_dice < 1:
             raise ValueError("num_dice cannot be less than 1.")
 
-        elif keep_lowest and keep_lowest:
+        elif keep_highest and keep_lowest:
             raise ValueError("keep_highest and keep_lowest cannot be defined together, only one or the other.")
         elif keep_highest > num_dice or keep_highest < 0:
             raise ValueError("keep_highest must be between 0 and the number of dice rolled.")
@@ -377,12 +398,87 @@ class DiceRoll:
     def __repr__(self) -> str:
         return self.__str__()
 
-    def roll(self) -> None:
-        self.value, self.rolls, self.rolls_kept = self._roll()
+    def roll(self, rng: Optional[random.Random] = None) -> None:
+        self.value, self.rolls, self.rolls_kept = self._roll(rng or random)
+
+    def roll_many(self, count: int, rng: Optional[random.Random] = None) -> list[int]:
+        """Rolls `count` independent copies of this roll at once, returning only the totals."""
+        faces = range(1, self.num_sides + 1)
+        dice = (rng or random).choices(faces, k=self.num_dice * count)
+        modifier = self.add - self.subtract
+
+        totals = []
+        for i in range(0, len(dice), self.num_dice):
+            rolls = dice[i:i + self.num_dice]
+            if self.keep_highest:
+                rolls = sorted(rolls)[-self.keep_highest:]
+            elif self.keep_lowest:
+                rolls = sorted(rolls)[:self.keep_lowest]
+            totals.append(sum(rolls) + modifier)
+        return totals
+
+    @property
+    def distribution_complexity(self) -> int:
+        if self.keep_highest or self.keep_lowest:
+            keep = self.keep_highest or self.keep_lowest
+            return self.num_sides ** 2 * self.num_dice ** 2 * keep // 2
+        return self.num_dice ** 2 * self.num_sides
+
+    @property
+    def distribution_size(self) -> int:
+        """The number of distinct totals in this roll's distribution."""
+        return (self.keep_highest or self.keep_lowest or self.num_dice) * (self.num_sides - 1) + 1
+
+    def distribution(self) -> 'DiceDistribution':
+        if self.distribution_complexity > DICE_DISTRIBUTION_MAX_COMPLEXITY:
+            raise ValueError(f"The distribution of {self.query} is too expensive to compute exactly.")
 
-    def _roll(self) -> Tuple[int, list[int], list[int]]:
+        if self.keep_highest or self.keep_lowest:
+            dist = self._kept_distribution()
+        else:
+            # Repeatedly convolve with a single die, using a sliding window sum over the previous counts.
+            counts = [1]
+            for _ in range(self.num_dice):
+                new = [0] * (len(counts) + self.num_sides - 1)
+                window = 0
+                for i in range(len(new)):
+                    if i < len(counts):
+                        window += counts[i]
+                    if i >= self.num_sides:
+                        window -= counts[i - self.num_sides]
+                    new[i] = window
+                counts = new
+            dist = DiceDistribution(self.num_dice, counts, self.num_sides ** self.num_dice)
+
+        return dist.shift(self.add - self.subtract)
+
+    def _kept_distribution(self) -> 'DiceDistribution':
+        # Dynamic programming over order statistics: faces are assigned from the most to the least preferred value,
+        # and the first `keep` dice assigned are the ones kept. `ways[used][total]` counts the arrangements of `used`
+        # dice whose kept dice sum to `total`.
+        keep = self.keep_highest or self.keep_lowest
+        faces = range(self.num_sides, 0, -1) if self.keep_highest else range(1, self.num_sides + 1)
+        max_total = keep * self.num_sides
+
+        ways = [[0] * (max_total + 1) for _ in range(self.num_dice + 1)]
+        ways[0][0] = 1
+        for face in faces:
+            new = [[0] * (max_total + 1) for _ in range(self.num_dice + 1)]
+            for used, totals in enumerate(ways):
+                remaining = self.num_dice - used
+                for total, count in enumerate(totals):
+                    if not count:
+                        continue
+                    for j in range(remaining + 1):
+                        kept = min(j, max(keep - used, 0))
+                        new[used + j][total + kept * face] += count * comb(remaining, j)
+            ways = new
+
+        return DiceDistribution(keep, ways[self.num_dice][keep:], self.num_sides ** self.num_dice)
+
+    def _roll(self, rng: random.Random) -> Tuple[int, list[int], list[int]]:
         # Roll all of the dice.
-        rolls = sorted([random.randint(1, self.num_sides) for i in range(self.num_dice)])
+        rolls = sorted([rng.randint(1, self.num_sides) for i in range(self.num_dice)])
 
         # Handle keeping the highest/lowest rolls.
         rolls_kept = None
@@ -419,6 +515,12 @@ class DiceRoll:
             res += f' -{self.subtract}'
         return res
 
+    @staticmethod
+    def normalize_query(rolls: Union[list['DiceRoll'], 'DiceRoll']) -> str:
+        if isinstance(rolls, list):
+            return ' '.join(r.query for r in rolls)
+        return rolls.query
+
     @classmethod
     def from_query(cls, query: str) -> Union[list['DiceRoll'], 'DiceRoll']:
         matches = DICE_ROLL_PATTERN.findall(query)
@@ -447,3 +549,121 @@ class DiceRoll:
         if len(rolls) == 1:
             return rolls[0]
         return rolls
+
+
+class RollStream:
+    """A seeded, reproducible stream of random number generators for dice rolls.
+
+    Each draw from the stream gets its own generator, derived from the stream's seed and the draw's offset in the
+    stream, so any single draw can be replayed exactly from just its `(seed, offset)` pair.
+    """
+    seed: int
+    offset: int
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed if seed is not None else secrets.randbits(63)
+        self.offset = 0
+
+    def __repr__(self) -> str:
+        return f'<RollStream seed={self.seed:x} offset={self.offset}>'
+
+    @staticmethod
+    def generator(seed: int, offset: int) -> random.Random:
+        return random.Random(seed << 64 | offset)
+
+    @staticmethod
+    def reference(seed: int, offset: int) -> str:
+        return f'{seed:x}-{offset}'
+
+    @staticmethod
+    def parse_reference(reference: str) -> Tuple[int, int]:
+        seed, offset = reference.strip().split('-')
+        return int(seed, 16), int(offset)
+
+    def next(self) -> Tuple[int, random.Random]:
+        offset = self.offset
+        self.offset += 1
+        return offset, self.generator(self.seed, offset)
+
+
+class DiceDistribution:
+    """The exact distribution of the totals of one or more dice rolls.
+
+    `counts[i]` is the number of ways to get a total of `minimum + i`, out of `outcomes` equally likely ways
+    for every die to land.
+    """
+    minimum: int
+    counts: list[int]
+    outcomes: int
+
+    def __init__(self, minimum: int, counts: list[int], outcomes: int):
+        self.minimum = minimum
+        self.counts = counts
+        self.outcomes = outcomes
+
+    def __repr__(self) -> str:
+        return f'<DiceDistribution minimum={self.minimum} maximum={self.maximum} mean={self.mean:.2f}>'
+
+    @property
+    def maximum(self) -> int:
+        return self.minimum + len(self.counts) - 1
+
+    @property
+    def mean(self) -> float:
+        return sum((self.minimum + i) * c for i, c in enumerate(self.counts)) / self.outcomes
+
+    @property
+    def stdev(self) -> float:
+        mean = self.mean
+        return sqrt(sum(c * (self.minimum + i - mean) ** 2 for i, c in enumerate(self.counts)) / self.outcomes)
+
+    def percentile(self, percent: float) -> int:
+        """The smallest total that is rolled at or below `percent` percent of the time."""
+        target = self.outcomes * percent / 100
+        running = 0
+        for i, c in enumerate(self.counts):
+            running += c
+            if running >= target:
+                return self.minimum + i
+        return self.maximum
+
+    def at_least(self, value: int) -> float:
+        """The probability of rolling a total greater than or equal to `value`."""
+        start = max(value - self.minimum, 0)
+        return sum(self.counts[start:]) / self.outcomes
+
+    def shift(self, amount: int) -> 'DiceDistribution':
+        return DiceDistribution(self.minimum + amount, self.counts, self.outcomes)
+
+    def combine(self, other: 'DiceDistribution') -> 'DiceDistribution':
+        """The distribution of the sum of this distribution and another independent one."""
+        counts = [0] * (len(self.counts) + len(other.counts) - 1)
+        for i, a in enumerate(self.counts):
+            if a:
+                for j, b in enumerate(other.counts):
+                    counts[i + j] += a * b
+        return DiceDistribution(self.minimum + other.minimum, counts, self.outcomes * other.outcomes)
+
+
+@lru_cache(maxsize=256)
+def get_dice_distribution(query: str) -> DiceDistribution:
+    """Gets the distribution for a normalized query (see `DiceRoll.normalize_query`), memoized per query."""
+    rolls = DiceRoll.from_query(query)
+    if not isinstance(rolls, list):
+        rolls = [rolls]
+    if not rolls:
+        raise ValueError(f"No dice rolls found in \"{query}\".")
+
+    # Bound the work for the whole query up front, since combining is a convolution of every roll's totals.
+    complexity = sum(roll.distribution_complexity for roll in rolls)
+    size = rolls[0].distribution_size
+    for roll in rolls[1:]:
+        complexity += size * roll.distribution_size
+        size += roll.distribution_size - 1
+    if complexity > DICE_DISTRIBUTION_MAX_COMPLEXITY:
+        raise ValueError(f"The distribution of {query} is too expensive to compute exactly.")
+
+    dist = rolls[0].distribution()
+    for roll in rolls[1:]:
+        dist = dist.combine(roll.distribution())
+    return dist
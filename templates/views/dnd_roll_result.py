@@ -23,9 +23,10 @@ class DiceRollPage(MenuPage):
     image: Optional['BytesIO']
     initial: bool
 
-    def __init__(self, rolls: list[DiceRoll], embed_factory: EmbedFactory):
+    def __init__(self, rolls: list[DiceRoll], embed_factory: EmbedFactory, reference: Optional[str] = None):
         self.rolls = rolls
         self.embed_factory = embed_factory
+        self.reference = reference
 
         self.image = None
         self.initial = True
@@ -72,7 +73,8 @@ class DiceRollPage(MenuPage):
                 for r in self.rolls
             ),
             thumbnail="attachment://image.png",
-            fields=fields
+            fields=fields,
+            footer=f"Roll {self.reference}" if self.reference else None
         )
         if self.is_paginating():
             emb.title += f' [{self.index}/{self.get_max_pages()}]'
@@ -1,4 +1,8 @@
 from .embeds import *
 from .general import *
 from .logger import *
-from .pagination import *
\ No newline at end of file
+from .pagination import *
+from .timers import *
+from .concurrency import *
+from .ratelimit import *
+from .members import *
@@ -0,0 +1,42 @@
+import asyncio
+from typing import TypeVar, Iterable, Callable, Awaitable, Optional
+
+T = TypeVar('T')
+
+
+async def run_bounded(
+        func: Callable[[T], Awaitable[object]],
+        items: Iterable[T],
+        limit: int,
+        on_result: Optional[Callable[[T, Optional[Exception]], None]] = None
+) -> None:
+    """Calls `func` on every item, with at most `limit` calls running at once.
+
+    `on_result` is called with each item as its call finishes, along with the exception it raised, or None. Without
+    `on_result`, the first exception is raised. Either way, an exception raised here cancels the remaining calls.
+    """
+    iterator = iter(items)
+
+    async def worker() -> None:
+        # Workers share the iterator, so each item is taken by exactly one of them.
+        for item in iterator:
+            try:
+                await func(item)
+            except Exception as e:
+                if on_result is None:
+                    raise
+                on_result(item, e)
+            else:
+                if on_result is not None:
+                    on_result(item, None)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(limit, 1))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+def chunked(items: list[T], size: int) -> list[list[T]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
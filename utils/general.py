@@ -1,3 +1,4 @@
+import re
 from datetime import timedelta
 from typing import Union
 
@@ -5,6 +6,8 @@ from discord import app_commands
 from discord.ext import commands
 import pytimeparse
 
+WORD_PATTERN = re.compile(r'\w+')
+
 
 def clamp(num: Union[int, float], min_val: Union[int, float] = None, max_val: Union[int, float] = None) -> Union[int, float]:
     if max_val and min_val:
@@ -52,3 +55,23 @@ def command_name(com: Union[str, app_commands.Group, commands.GroupCog]) -> str:
         return com.app_command.qualified_name
     else:
         return com
+
+
+def simhash(text: str) -> int:
+    """Gets a 64-bit SimHash of the words in some text, where similar texts have hashes differing in few bits.
+
+    Unrelated texts differ in about 32 bits. Python's string hashing is randomised per process, so hashes can only be
+    compared within the same process.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return 0
+
+    # Each bit of the result is the majority vote of that bit across the word hashes.
+    columns = zip(*(format(hash(w) & 0xFFFFFFFFFFFFFFFF, '064b') for w in words))
+    threshold = len(words) / 2
+    return int(''.join('1' if col.count('1') > threshold else '0' for col in columns), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
@@ -1,7 +1,8 @@
 from copy import copy
 from importlib.resources import path
+from collections import Counter
 from io import BytesIO
-from typing import Any
+from typing import Any, Iterable
 
 from PIL import Image, ImageDraw, ImageFont
 
@@ -28,3 +29,39 @@ def get_roll_text(value: Any) -> BytesIO:
     img.save(res, 'PNG')
 
     return res
+
+
+histogram_size = (800, 400)
+histogram_margin = 40
+histogram_font = ImageFont.truetype(dnd_roll_font.path, 24)
+
+
+def get_roll_histogram(values: Iterable[int]) -> BytesIO:
+    """Draws a bar chart of how often each value appears. This is CPU bound, so run it off of the event loop."""
+    counts = Counter(values)
+    low, high = min(counts), max(counts)
+    tallest = max(counts.values())
+
+    width, height = histogram_size
+    img = copy(dnd_roll_image).resize(histogram_size)
+    draw = ImageDraw.Draw(img)
+
+    bar_width = (width - histogram_margin * 2) / (high - low + 1)
+    chart_height = height - histogram_margin * 2
+    for value in range(low, high + 1):
+        if not counts[value]:
+            continue
+        x = histogram_margin + (value - low) * bar_width
+        bar_height = chart_height * counts[value] / tallest
+        draw.rectangle(
+            (x + 1, height - histogram_margin - bar_height, x + bar_width - 1, height - histogram_margin),
+            fill='black'
+        )
+
+    draw.text((histogram_margin, height - histogram_margin + 5), str(low), font=histogram_font, fill='black')
+    draw.text((width - histogram_margin * 2, height - histogram_margin + 5), str(high), font=histogram_font, fill='black')
+
+    res = BytesIO()
+    img.save(res, 'PNG')
+
+    return res
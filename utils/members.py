@@ -0,0 +1,155 @@
+import datetime
+from bisect import bisect_left, insort
+from typing import Optional
+
+import discord
+
+
+class JoinOrderIndex:
+    """Members of each guild in the order they joined, for finding the newest members without sorting the guild.
+
+    A guild is indexed from the member cache the first time it is queried once fully chunked, then kept up to date
+    through `add` and `remove`, which do nothing for guilds not yet indexed. Until then, each query sorts the cache.
+    Members are kept as sorted (join timestamp, ID) keys, so the newest K members, or those who joined since a given
+    time, are found in O(K) after a binary search.
+    """
+    def __init__(self) -> None:
+        self._keys: dict[int, list[tuple[float, int]]] = {}
+        self._joined: dict[int, dict[int, float]] = {}
+
+    @staticmethod
+    def _timestamp(member: discord.Member) -> float:
+        return (member.joined_at or member.guild.created_at).timestamp()
+
+    def _index(self, guild: discord.Guild) -> list[tuple[float, int]]:
+        keys = self._keys.get(guild.id)
+        if keys is None:
+            joined = {m.id: self._timestamp(m) for m in guild.members}
+            keys = sorted((ts, id) for id, ts in joined.items())
+            # Members still arriving through chunking fire no join events, so only keep the index of a complete cache.
+            if guild.chunked:
+                self._keys[guild.id] = keys
+                self._joined[guild.id] = joined
+        return keys
+
+    def add(self, member: discord.Member) -> None:
+        keys = self._keys.get(member.guild.id)
+        if keys is None:
+            return
+
+        self.remove(member)
+        ts = self._timestamp(member)
+        self._joined[member.guild.id][member.id] = ts
+        # New members almost always join after everyone indexed, which makes this an append.
+        insort(keys, (ts, member.id))
+
+    def remove(self, member: discord.Member) -> None:
+        keys = self._keys.get(member.guild.id)
+        if keys is None:
+            return
+
+        ts = self._joined[member.guild.id].pop(member.id, None)
+        if ts is not None:
+            i = bisect_left(keys, (ts, member.id))
+            if i < len(keys) and keys[i] == (ts, member.id):
+                del keys[i]
+
+    def forget(self, guild_id: int) -> None:
+        """Drops a guild's index, to be rebuilt from the member cache when next queried."""
+        self._keys.pop(guild_id, None)
+        self._joined.pop(guild_id, None)
+
+    def _members(self, guild: discord.Guild, keys: list[tuple[float, int]]) -> list[discord.Member]:
+        res = []
+        for _, id in reversed(keys):
+            member = guild.get_member(id)
+            if member is not None:
+                res.append(member)
+        return res
+
+    def newest(self, guild: discord.Guild, count: int) -> list[discord.Member]:
+        """Gets the `count` most recently joined members, newest first."""
+        keys = self._index(guild)
+        return self._members(guild, keys[-count:] if count > 0 else [])
+
+    def joined_since(
+            self,
+            guild: discord.Guild,
+            since: datetime.datetime,
+            limit: Optional[int] = None
+    ) -> tuple[int, list[discord.Member]]:
+        """Counts the members who joined after `since`, and gets up to `limit` of them, newest first."""
+        keys = self._index(guild)
+        i = bisect_left(keys, (since.timestamp(), 0))
+        total = len(keys) - i
+        if limit is not None:
+            i = max(i, len(keys) - limit)
+        return total, self._members(guild, keys[i:])
+
+
+class RoleMemberCounter:
+    """The number of members with each role in each guild, so that roles can be listed by size in O(roles).
+
+    A guild is counted from the member cache the first time it is queried once fully chunked, then kept up to date
+    through `add`, `remove` and `update`, which do nothing for guilds not yet counted. Until then, each query counts the
+    cache. The default role is never counted, since every member has it.
+    """
+    def __init__(self) -> None:
+        self._counts: dict[int, dict[int, int]] = {}
+
+    @staticmethod
+    def _role_ids(member: discord.Member) -> set[int]:
+        return {r.id for r in member.roles if not r.is_default()}
+
+    def _guild_counts(self, guild: discord.Guild) -> dict[int, int]:
+        counts = self._counts.get(guild.id)
+        if counts is None:
+            counts = {}
+            for member in guild.members:
+                for id in self._role_ids(member):
+                    counts[id] = counts.get(id, 0) + 1
+            # Members still arriving through chunking fire no join events, so only keep the counts of a complete cache.
+            if guild.chunked:
+                self._counts[guild.id] = counts
+        return counts
+
+    def _apply(self, guild_id: int, role_ids: set[int], change: int) -> None:
+        counts = self._counts.get(guild_id)
+        if counts is None:
+            return
+        for id in role_ids:
+            counts[id] = counts.get(id, 0) + change
+
+    def add(self, member: discord.Member) -> None:
+        self._apply(member.guild.id, self._role_ids(member), 1)
+
+    def remove(self, member: discord.Member) -> None:
+        self._apply(member.guild.id, self._role_ids(member), -1)
+
+    def update(self, before: discord.Member, after: discord.Member) -> None:
+        if before.guild.id not in self._counts:
+            return
+        old, new = self._role_ids(before), self._role_ids(after)
+        if old != new:
+            self._apply(after.guild.id, new - old, 1)
+            self._apply(after.guild.id, old - new, -1)
+
+    def remove_role(self, role: discord.Role) -> None:
+        counts = self._counts.get(role.guild.id)
+        if counts is not None:
+            counts.pop(role.id, None)
+
+    def forget(self, guild_id: int) -> None:
+        """Drops a guild's counts, to be recounted from the member cache when next queried."""
+        self._counts.pop(guild_id, None)
+
+    def counts(self, guild: discord.Guild) -> dict[int, int]:
+        """Gets the member count of every role in a guild, by role ID."""
+        counts = dict(self._guild_counts(guild))
+        counts[guild.default_role.id] = guild.member_count or 0
+        return counts
+
+    def count(self, role: discord.Role) -> int:
+        if role.is_default():
+            return role.guild.member_count or 0
+        return self._guild_counts(role.guild).get(role.id, 0)
@@ -1,5 +1,5 @@
 from math import ceil
-from typing import TypeVar, Any, Optional, Dict, List
+from typing import TypeVar, Any, Optional, Dict, List, Callable, Awaitable
 
 import discord
 
@@ -81,6 +81,67 @@ class MenuPageList(MenuPage):
             return self.items
 
 
+class KeysetMenuPage(MenuPageList):
+    """A `MenuPageList` that fetches only the items for the page being shown.
+
+    Items are fetched with `fetch(after, limit)`, which returns up to `limit` items ordered by key, starting after the
+    key `after` (or from the start when `after` is None). The key to start each page after is remembered once seen, so
+    moving to an adjacent page is a single indexed query. Pages that have not been reached yet are found with
+    `seek(offset)`, which returns the key of the item at an offset.
+    """
+    def __init__(
+            self,
+            factory: EmbedFactory,
+            fetch: Callable[[Optional[Any], int], Awaitable[List[Any]]],
+            seek: Callable[[int], Awaitable[Optional[Any]]],
+            key: Callable[[Any], Any],
+            total: int,
+            title: str,
+            format_item: Callable[[Any], str] = str,
+            url: str = None,
+            per_page: int = 25,
+            show_page: bool = True,
+            number_items: bool = False,
+            code: bool = True
+    ):
+        super().__init__(factory, [], title, url, per_page, show_page, number_items, code)
+        self.fetch = fetch
+        self.seek = seek
+        self.key = key
+        self.total = total
+        self.format_item = format_item
+
+        # Page number -> key to start the page after.
+        self._cursors: Dict[int, Optional[Any]] = {1: None}
+
+    def is_paginating(self) -> bool:
+        return self.total > self.per_page
+
+    def get_max_pages(self) -> int:
+        return max(1, ceil(self.total / self.per_page))
+
+    async def get_page(self, page_number: int) -> Any:
+        self.index = page_number
+        if page_number in self._cursors:
+            after = self._cursors[page_number]
+        else:
+            after = await self.seek((page_number - 1) * self.per_page - 1)
+            if after is None:
+                # Items were removed since the total was counted, so the page no longer exists. A None key would
+                # fetch from the start, so show the page empty instead.
+                self.items = []
+                return self
+
+        self.items = await self.fetch(after, self.per_page)
+        if self.items:
+            self._cursors[page_number] = after
+            self._cursors[page_number + 1] = self.key(self.items[-1])
+        return self
+
+    def get_list_frame(self, start: int) -> Optional[List[Any]]:
+        return [self.format_item(item) for item in self.items]
+
+
 class MenuCategory:
     page_count: int
     current_page: int
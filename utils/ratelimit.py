@@ -0,0 +1,70 @@
+from collections import deque
+from typing import Generic, TypeVar, Optional, Iterator
+
+T = TypeVar('T')
+
+
+class SlidingWindow(Generic[T]):
+    """Events within the last `window` seconds, each with an optional item, in the order they happened.
+
+    Events are evicted from the front as they fall out of the window, so adding one and counting the window are O(1)
+    amortised. At most `max_size` events are kept, which bounds memory however fast events arrive, and caps the counts
+    at `max_size`. Timestamps should come from a monotonic clock, such as `time.monotonic()`.
+    """
+    def __init__(self, window: float, max_size: int) -> None:
+        self.window = window
+        self._events: deque[tuple[float, Optional[T]]] = deque(maxlen=max_size)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[Optional[T]]:
+        return (item for _, item in self._events)
+
+    def _evict(self, now: float) -> None:
+        cutoff = now - self.window
+        events = self._events
+        while events and events[0][0] <= cutoff:
+            events.popleft()
+
+    def add(self, now: float, item: Optional[T] = None) -> int:
+        """Adds an event, returning the number of events now within the window."""
+        self._evict(now)
+        self._events.append((now, item))
+        return len(self._events)
+
+    @property
+    def last(self) -> Optional[float]:
+        """The timestamp of the latest event, if there is one."""
+        return self._events[-1][0] if self._events else None
+
+    def count(self, now: float) -> int:
+        self._evict(now)
+        return len(self._events)
+
+    def clear(self) -> None:
+        self._events.clear()
+
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` events, refilled continuously at `rate` events per second.
+
+    Tokens are refilled lazily when taken, so an idle bucket costs nothing. Timestamps should come from a monotonic
+    clock, such as `time.monotonic()`.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float, tokens: float = 1.0) -> bool:
+        """Takes tokens if there are enough, returning False if the event is over the limit."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
@@ -0,0 +1,75 @@
+import asyncio
+import datetime
+import heapq
+from itertools import count
+from typing import Generic, TypeVar, Optional, Hashable
+
+from discord.utils import utcnow
+
+K = TypeVar('K', bound=Hashable)
+
+
+class TimerHeap(Generic[K]):
+    """A min-heap of deadlines, each identified by a key, that can be waited on until the next one is due.
+
+    Scheduling a key again replaces its deadline, and cancelling a key removes it. Replaced and cancelled entries are
+    left in the heap and skipped when they reach the top, so every operation is O(log n).
+    """
+    def __init__(self) -> None:
+        self._heap: list[tuple[datetime.datetime, int, K]] = []
+        self._deadlines: dict[K, datetime.datetime] = {}
+        self._counter = count()
+        self._wake = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: K, deadline: datetime.datetime) -> None:
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+        self._wake.set()
+
+    def cancel(self, key: K) -> None:
+        if self._deadlines.pop(key, None) is not None:
+            self._wake.set()
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._deadlines.clear()
+        self._wake.set()
+
+    def peek(self) -> Optional[tuple[datetime.datetime, K]]:
+        """Gets the next deadline and its key, discarding any stale entries on top of the heap."""
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            if self._deadlines.get(key) == deadline:
+                return deadline, key
+            heapq.heappop(self._heap)
+        return None
+
+    async def wait(self) -> K:
+        """Sleeps until the next deadline is due, then removes and returns its key.
+
+        Scheduling an earlier deadline or cancelling the next one while waiting is picked up immediately.
+        """
+        while True:
+            self._wake.clear()
+            nxt = self.peek()
+            if nxt is None:
+                await self._wake.wait()
+                continue
+
+            deadline, key = nxt
+            delay = (deadline - utcnow()).total_seconds()
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                del self._deadlines[key]
+                return key
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass